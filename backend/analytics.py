@@ -0,0 +1,264 @@
+# Columnar spending analytics: trends, category time series, merchant rankings
+# and an end-of-month projection.
+# A user's expenses are loaded once into compact NumPy arrays (expense month,
+# amount, merchant code; item price, category code and owning expense) and
+# every statistic is a vectorized group-by (np.bincount) over them. Ledgers are
+# cached per user and new expenses are appended in place, so a write does not
+# force a reload.
+import calendar
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+import numpy as np
+
+LEDGER_FIELDS = {"created_at": 1, "total_amount": 1, "store_name": 1, "items.price": 1, "items.category": 1}
+TOP_MERCHANTS = 10
+# Full months of history blended into the projection's daily rate
+PROJECTION_HISTORY = 3
+
+
+def month_index(moment):
+    return moment.year * 12 + moment.month - 1
+
+
+class Ledger:
+    """One user's expenses as parallel arrays; rows are appended, never updated."""
+
+    def __init__(self):
+        self.merchants = []
+        self.categories = []
+        self._merchant_codes = {}
+        self._category_codes = {}
+        self._lock = threading.Lock()
+        self._arrays = None
+        self._pending_expenses = []
+        self._pending_items = []
+        self._count = 0
+        self.revision = 0
+
+    @classmethod
+    def from_documents(cls, docs):
+        # One pass with local bindings; append() would take the lock per row
+        ledger = cls()
+        expenses, items = ledger._pending_expenses, ledger._pending_items
+        merchant_codes, category_codes = ledger._merchant_codes, ledger._category_codes
+        for doc in docs:
+            created_at = doc.get("created_at")
+            if not isinstance(created_at, datetime):
+                continue
+            name = doc.get("store_name") or "Unknown"
+            merchant = merchant_codes.get(name)
+            if merchant is None:
+                merchant = ledger._code(merchant_codes, ledger.merchants, name)
+            index = len(expenses)
+            expenses.append((created_at.year * 12 + created_at.month - 1, float(doc.get("total_amount") or 0), merchant))
+            for item in doc.get("items") or ():
+                category = category_codes.get(item.get("category") or "Other")
+                if category is None:
+                    category = ledger._code(category_codes, ledger.categories, item.get("category") or "Other")
+                items.append((index, float(item.get("price") or 0), category))
+        ledger._count = ledger.revision = len(expenses)
+        return ledger
+
+    def append(self, expense):
+        created_at = expense.get("created_at")
+        if not isinstance(created_at, datetime):
+            return
+        with self._lock:
+            index = self._count
+            self._count += 1
+            self._pending_expenses.append((
+                month_index(created_at),
+                float(expense.get("total_amount") or 0),
+                self._code(self._merchant_codes, self.merchants, expense.get("store_name") or "Unknown")
+            ))
+            for item in expense.get("items") or []:
+                self._pending_items.append((
+                    index,
+                    float(item.get("price") or 0),
+                    self._code(self._category_codes, self.categories, item.get("category") or "Other")
+                ))
+            self.revision += 1
+
+    def arrays(self):
+        """Return the column arrays, folding in rows appended since the last call."""
+        with self._lock:
+            if self._arrays is None or self._pending_expenses or self._pending_items:
+                expenses = np.array(self._pending_expenses, dtype=np.float64).reshape(-1, 3)
+                items = np.array(self._pending_items, dtype=np.float64).reshape(-1, 3)
+                new = {
+                    "month": expenses[:, 0].astype(np.int32),
+                    "amount": expenses[:, 1],
+                    "merchant": expenses[:, 2].astype(np.int32),
+                    "item_expense": items[:, 0].astype(np.int32),
+                    "item_price": items[:, 1],
+                    "item_category": items[:, 2].astype(np.int16),
+                }
+                if self._arrays is not None:
+                    new = {key: np.concatenate([self._arrays[key], values]) for key, values in new.items()}
+                self._arrays = new
+                self._pending_expenses = []
+                self._pending_items = []
+            return self._arrays, len(self.merchants), len(self.categories)
+
+    @staticmethod
+    def _code(codes, names, name):
+        code = codes.get(name)
+        if code is None:
+            code = codes[name] = len(names)
+            names.append(name)
+        return code
+
+
+def summarize(ledger, now=None, months=6, income=0):
+    now = now or datetime.utcnow()
+    columns, n_merchants, n_categories = ledger.arrays()
+    current = month_index(now)
+    first = current - months + 1
+
+    month = columns["month"]
+    amount = columns["amount"]
+    in_window = (month >= first) & (month <= current)
+    slot = month[in_window] - first
+    monthly = np.bincount(slot, weights=amount[in_window], minlength=months)
+    counts = np.bincount(slot, minlength=months)
+
+    # Category x month matrix from the items of expenses inside the window
+    item_month = month[columns["item_expense"]]
+    item_in_window = (item_month >= first) & (item_month <= current)
+    cells = (item_month[item_in_window] - first) * n_categories + columns["item_category"][item_in_window]
+    by_category = np.bincount(
+        cells, weights=columns["item_price"][item_in_window], minlength=months * n_categories
+    ).reshape(months, n_categories)
+
+    merchant = columns["merchant"][in_window]
+    merchant_spend = np.bincount(merchant, weights=amount[in_window], minlength=n_merchants)
+    merchant_count = np.bincount(merchant, minlength=n_merchants)
+    ranked = np.argsort(-merchant_spend, kind="stable")[:TOP_MERCHANTS]
+
+    previous = monthly[-2] if months > 1 else 0.0
+    change = monthly[-1] - previous
+    return {
+        "months": [f"{(first + offset) // 12}-{(first + offset) % 12 + 1:02d}" for offset in range(months)],
+        "monthly_totals": [round(value, 2) for value in monthly.tolist()],
+        "monthly_counts": counts.tolist(),
+        "month_over_month": {
+            "change": round(float(change), 2),
+            "change_pct": round(float(change / previous * 100), 1) if previous else None
+        },
+        "categories": {
+            ledger.categories[code]: [round(value, 2) for value in by_category[:, code].tolist()]
+            for code in range(n_categories) if by_category[:, code].any()
+        },
+        "top_merchants": [
+            {
+                "store_name": ledger.merchants[code],
+                "total": round(float(merchant_spend[code]), 2),
+                "count": int(merchant_count[code]),
+                "average": round(float(merchant_spend[code] / merchant_count[code]), 2)
+            }
+            for code in ranked.tolist() if merchant_count[code]
+        ],
+        "projection": project_month(monthly, now, income)
+    }
+
+
+def project_month(monthly, now, income=0):
+    """Project the month-end total from this month's pace blended with recent months."""
+    days_in_month = calendar.monthrange(now.year, now.month)[1]
+    # Today counts as elapsed, so the projection only changes once a day
+    elapsed = now.day
+    days_left = days_in_month - elapsed
+    spent = float(monthly[-1])
+    current_rate = spent / elapsed
+
+    history = monthly[-1 - PROJECTION_HISTORY:-1]
+    history_days = sum(
+        calendar.monthrange(*divmod_month(month_index(now) - offset))[1] for offset in range(len(history), 0, -1)
+    )
+    # Early in the month the current pace is noisy, so recent months weigh more
+    weight = elapsed / days_in_month
+    if history_days and history.any():
+        rate = weight * current_rate + (1 - weight) * float(history.sum()) / history_days
+    else:
+        rate = current_rate
+    projected = spent + rate * days_left
+    return {
+        "spent_to_date": round(spent, 2),
+        "daily_rate": round(rate, 2),
+        "days_left": days_left,
+        "projected_total": round(projected, 2),
+        "income": income,
+        "projected_remaining": round(income - projected, 2),
+        "on_track": projected <= income if income else None
+    }
+
+
+def divmod_month(index):
+    year, month = divmod(index, 12)
+    return year, month + 1
+
+
+class AnalyticsCache:
+    def __init__(self, collection, ttl=300, max_entries=1000):
+        self.collection = collection
+        # The TTL bounds staleness for writes handled by other worker processes
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._ledgers = OrderedDict()
+        self._versions = {}
+        self._summaries = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id, months=6, income=0, now=None):
+        now = now or datetime.utcnow()
+        ledger = self._ledger(user_id)
+        key = (user_id, months, income, month_index(now), now.day)
+        with self._lock:
+            cached = self._summaries.get(key)
+            if cached and cached[0] is ledger and cached[1] == ledger.revision:
+                return cached[2]
+        summary = summarize(ledger, now, months, income)
+        with self._lock:
+            # One summary per user is enough; drop the others
+            for stale in [k for k in self._summaries if k[0] == user_id]:
+                del self._summaries[stale]
+            self._summaries[key] = (ledger, ledger.revision, summary)
+        return summary
+
+    def add_expense(self, expense):
+        """Append a newly stored expense to the user's cached ledger, if there is one."""
+        user_id = expense.get("user_id")
+        with self._lock:
+            entry = self._ledgers.get(user_id)
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+        if entry:
+            entry[0].append(expense)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+            self._ledgers.pop(user_id, None)
+
+    def _ledger(self, user_id):
+        with self._lock:
+            version = self._versions.get(user_id, 0)
+            entry = self._ledgers.get(user_id)
+            if entry and time.monotonic() - entry[1] < self.ttl:
+                self._ledgers.move_to_end(user_id)
+                return entry[0]
+
+        docs = self.collection.find({"user_id": user_id}, LEDGER_FIELDS)
+        ledger = Ledger.from_documents(docs)
+        with self._lock:
+            # A write that raced with the load may be missing from it; use it once, don't cache it
+            if self._versions.get(user_id, 0) == version:
+                self._ledgers[user_id] = (ledger, time.monotonic())
+                self._ledgers.move_to_end(user_id)
+                while len(self._ledgers) > self.max_entries:
+                    evicted, _ = self._ledgers.popitem(last=False)
+                    for stale in [k for k in self._summaries if k[0] == evicted]:
+                        del self._summaries[stale]
+        return ledger
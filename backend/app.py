@@ -1,50 +1,80 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Blueprint, Flask, Response, g, request, jsonify, send_from_directory, stream_with_context
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
-from werkzeug.security import generate_password_hash, check_password_hash
 from pymongo import MongoClient
+from pymongo.errors import DuplicateKeyError
 from bson import ObjectId
 import re
-import requests
-import base64
 import random
 import os
 import tempfile
+import shutil
 import json
+import logging
 from datetime import datetime, timedelta
 import uuid
-from llama_index.llms.groq import Groq
-import pytesseract
-from PIL import Image
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.local import LocalProxy
+from analytics import AnalyticsCache
+from cache import ReceiptCache, hash_files, hash_text
+from bulk_import import BulkImporter
+from captcha_store import CaptchaStore
+from chat_context import SnapshotCache
+from extractor import extract_invoice
+from geocoding import Geocoder
+from gstin import GstinCache
+from http_client import http_client
+from jobs import JobQueue, LocalBroker, MongoJobStore, QueueFullError, UserLimitError
+from llm_gateway import ExtractionBatcher, LLMGateway, create_backend
+from mapdata import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, CLUSTER_MAX_ZOOM, cluster_points, find_page, find_points, parse_bbox, parse_cursor, to_geojson
+from observability import REGISTRY, MongoCommandTimer, configure_logging, instrument, stage
+from queries import ensure_indexes, recent_expenses
+from resources import Resource, preload
+from responses import DataVersions, cache_headers, dumps, encode_json, is_not_modified, validators
+from rollups import apply_expense, get_rollup, normalize_items
+from spam import SpamScorer, load_phishing_index, load_spam_model
+from streaming import stream_completion
+from users import HasherBusy, PasswordHasher, UserCache
 
 # Configure Tesseract path for Windows
-pytesseract.pytesseract.tesseract_cmd = r'C:\Users\ganes\AppData\Local\Programs\Tesseract-OCR\tesseract.exe'
+TESSERACT_CMD = os.getenv("TESSERACT_CMD", r'C:\Users\ganes\AppData\Local\Programs\Tesseract-OCR\tesseract.exe')
 
-app = Flask(__name__)
-CORS(app)
+log = logging.getLogger(__name__)
 
-# Configuration
-app.config['JWT_SECRET_KEY'] = 'your-secret-key-change-this'
-app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(days=7)
-
-jwt = JWTManager(app)
+# Routes are registered on the blueprint; create_app() (bottom of the file) builds the app
+api = Blueprint("api", __name__)
 
 # MongoDB Configuration
-MONGO_URI = "mongodb://localhost:27017/"
-client = MongoClient(MONGO_URI)
-db = client.expense_tracker
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
+MONGO_DB = os.getenv("MONGO_DB", "expense_tracker")
+
+def connect_mongo():
+    client = MongoClient(MONGO_URI, event_listeners=[MongoCommandTimer()])
+    database = client[MONGO_DB]
+    ensure_indexes(database)
+    return database
+
+# Connected on first use in each process (MongoClient is not fork-safe)
+mongo = Resource("mongo", connect_mongo)
+db = LocalProxy(mongo.get)
 
 # Collections
-users_collection = db.users
-expenses_collection = db.expenses
-gst_details_collection = db.gst_details
+users_collection = LocalProxy(lambda: mongo.get().users)
+expenses_collection = LocalProxy(lambda: mongo.get().expenses)
+gst_details_collection = LocalProxy(lambda: mongo.get().gst_details)
+geocode_cache_collection = LocalProxy(lambda: mongo.get().geocode_cache)
+receipt_cache_collection = LocalProxy(lambda: mongo.get().receipt_cache)
+monthly_rollups_collection = LocalProxy(lambda: mongo.get().monthly_rollups)
+imports_collection = LocalProxy(lambda: mongo.get().imports)
 
 # Constants for GST API
 class CONSTANTS:
     GST_REGEX = re.compile(r'[0-9]{2}[a-zA-Z]{5}[0-9]{4}[a-zA-Z]{1}[1-9A-Za-z]{1}[Zz1-9A-Ja-j]{1}[0-9a-zA-Z]{1}')
     CAPTCHA_REGEX = re.compile(r'^([0-9]){6}$')
-    GST_DETAILS_URL = "https://services.gst.gov.in/services/api/search/taxpayerDetails"
-    GST_CAPTCHA_URL = "https://services.gst.gov.in/services/captcha?rnd="
+    # GST_PORTAL_URL can point at a local stub for load tests
+    GST_PORTAL_URL = os.getenv("GST_PORTAL_URL", "https://services.gst.gov.in")
+    GST_DETAILS_URL = f"{GST_PORTAL_URL}/services/api/search/taxpayerDetails"
+    GST_CAPTCHA_URL = f"{GST_PORTAL_URL}/services/captcha?rnd="
     INVALID_GST_CODE = "SWEB_9035"
     INVALID_CAPTCHA_CODE = "SWEB_9000"
     CAPTCHA_COOKIE_STRING = "CaptchaCookie"
@@ -52,42 +82,76 @@ class CONSTANTS:
 # API Keys
 GROQ_API_KEY = ""
 
-# Initialize Groq client
+# Groq client behind the LLM gateway (LLM_BACKEND=stub for offline runs); the
+# client itself is created on the first completion in each process
 class GroqChatBot:
     def __init__(self):
-        self.llm = Groq(
-            model="llama3-70b-8192",
-            api_key=GROQ_API_KEY,
-            temperature=0.7
+        self.llm = LLMGateway(
+            create_backend("llama3-70b-8192", GROQ_API_KEY, temperature=0.7),
+            max_concurrency=int(os.getenv("LLM_CONCURRENCY", 8)),
+            max_queue=int(os.getenv("LLM_QUEUE", 32)),
+            timeout=float(os.getenv("LLM_DEADLINE", 20)),
+            retries=int(os.getenv("LLM_RETRIES", 2)),
+            max_async_concurrency=int(os.getenv("LLM_ASYNC_CONCURRENCY", 1000)),
+            stream_timeout=float(os.getenv("LLM_STREAM_DEADLINE", 60))
         )
 
 groq_bot = GroqChatBot()
 
-# Ensure uploads directory exists
+# Photon geocoder over the shared pooled HTTP client
+geocoder = Geocoder(geocode_cache_collection)
+
+# Validated GSTINs shared across users, refreshed after the TTL
+gstin_cache = GstinCache(gst_details_collection)
+
+# OCR text keyed by image hash, AI extraction keyed by normalized text hash
+receipt_cache = ReceiptCache(receipt_cache_collection)
+
+def create_ocr_engine():
+    # pytesseract and PIL are only imported by processes that OCR something
+    from ocr import OCREngine
+    return OCREngine(workers=int(os.getenv("OCR_WORKERS", os.cpu_count() or 1)), tesseract_cmd=TESSERACT_CMD)
+
+ocr = Resource("ocr", create_ocr_engine)
+ocr_engine = LocalProxy(ocr.get)
+
+# Spam classifier and phishing feed are read-only (and memory-mapped when
+# built offline), so they may be loaded before forking and shared
+spam_assets = Resource("spam", lambda: SpamScorer(load_spam_model(), load_phishing_index()), fork_safe=True)
+spam_scorer = LocalProxy(spam_assets.get)
+
+# Captcha images live in memory for a few minutes instead of on disk
+captcha_store = CaptchaStore(ttl=int(os.getenv("CAPTCHA_TTL", 300)))
+captcha_prefetcher = ThreadPoolExecutor(max_workers=int(os.getenv("CAPTCHA_PREFETCH_WORKERS", 4)))
+
+# Profiles are read on most authenticated requests; cached per process
+user_cache = UserCache(users_collection, ttl=int(os.getenv("USER_CACHE_TTL", 60)),
+                       max_entries=int(os.getenv("USER_CACHE_SIZE", 10000)))
+
+# Columnar per-user ledgers for trends and projections; appended to on writes
+analytics_cache = AnalyticsCache(expenses_collection, ttl=int(os.getenv("ANALYTICS_TTL", 300)),
+                                 max_entries=int(os.getenv("ANALYTICS_CACHE_SIZE", 1000)))
+
+# Per-user data version behind the dashboard and map ETags; bumped on every write
+data_versions = DataVersions(LocalProxy(lambda: mongo.get().data_versions), ttl=int(os.getenv("DATA_VERSION_TTL", 5)),
+                             max_entries=int(os.getenv("DATA_VERSION_CACHE_SIZE", 10000)))
+
+# Password hashing runs on its own small pool (PASSWORD_HASH_METHOD sets the cost)
+password_hasher = PasswordHasher(
+    workers=int(os.getenv("PASSWORD_HASH_WORKERS", 2)),
+    max_pending=int(os.getenv("PASSWORD_HASH_QUEUE", 64))
+)
+
+# Created by create_app()
 UPLOADS_DIR = "uploads"
-if not os.path.exists(UPLOADS_DIR):
-    os.makedirs(UPLOADS_DIR)
 
 # Geocoding function to get coordinates from address
 def geocode_address(address):
-    try:
-        url = f"https://photon.komoot.io/api/?q={requests.utils.quote(address)}&limit=1"
-        response = requests.get(url)
-        data = response.json()
-        if data.get("features"):
-            coords = data["features"][0]["geometry"]["coordinates"]
-            return {
-                "lat": coords[1],
-                "lon": coords[0],
-                "display_name": data["features"][0]["properties"]["name"]
-            }
-        return None
-    except Exception as e:
-        print(f"Geocoding error: {e}")
-        return None
+    with stage("geocode"):
+        return geocoder.geocode(address)
 
 # Authentication Routes (same as before)
-@app.route("/api/signup", methods=["POST"])
+@api.route("/api/signup", methods=["POST"])
 def signup():
     data = request.json
     email = data.get("email")
@@ -96,10 +160,10 @@ def signup():
     if not email or not password:
         return jsonify({"error": "Email and password required"}), 400
     
-    if users_collection.find_one({"email": email}):
-        return jsonify({"error": "User already exists"}), 400
-    
-    hashed_password = generate_password_hash(password)
+    try:
+        hashed_password = password_hasher.hash(password)
+    except HasherBusy as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "2"}
     user_id = str(uuid.uuid4())
     
     user = {
@@ -110,7 +174,15 @@ def signup():
         "created_at": datetime.utcnow()
     }
     
-    users_collection.insert_one(user)
+    # One round-trip: inserts only if the email is new; the unique email index
+    # turns a concurrent signup with the same email into a DuplicateKeyError
+    try:
+        result = users_collection.update_one({"email": email}, {"$setOnInsert": user}, upsert=True)
+    except DuplicateKeyError:
+        result = None
+    if not result or result.upserted_id is None:
+        return jsonify({"error": "User already exists"}), 400
+    user_cache.put(user)
     access_token = create_access_token(identity=user_id)
     
     return jsonify({
@@ -122,7 +194,7 @@ def signup():
         }
     })
 
-@app.route("/api/login", methods=["POST"])
+@api.route("/api/login", methods=["POST"])
 def login():
     data = request.json
     email = data.get("email")
@@ -132,145 +204,320 @@ def login():
         return jsonify({"error": "Email and password required"}), 400
     
     user = users_collection.find_one({"email": email})
-    if not user or not check_password_hash(user["password"], password):
-        return jsonify({"error": "Invalid credentials"}), 401
+    try:
+        if not user or not password_hasher.verify(user["password"], password):
+            return jsonify({"error": "Invalid credentials"}), 401
+        # Hashes made with an older cost setting are upgraded on the next login
+        if password_hasher.needs_rehash(user["password"]):
+            users_collection.update_one({"_id": user["_id"]}, {"$set": {"password": password_hasher.hash(password)}})
+    except HasherBusy as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "2"}
+    user_cache.put(user)
     
     access_token = create_access_token(identity=user["_id"])
     
     return jsonify({
         "access_token": access_token,
-        "user": {
-            "id": user["_id"],
-            "email": user["email"],
-            "profile_completed": user.get("profile_completed", False),
-            "name": user.get("name"),
-            "age": user.get("age"),
-            "income": user.get("income")
-        }
+        "user": user_response(user)
     })
 
+def user_response(user):
+    return {
+        "id": user["_id"],
+        "email": user["email"],
+        "profile_completed": user.get("profile_completed", False),
+        "name": user.get("name"),
+        "age": user.get("age"),
+        "income": user.get("income")
+    }
+
+@api.route("/api/user", methods=["GET"])
+@jwt_required()
+def get_user():
+    user = user_cache.get(get_jwt_identity())
+    if not user:
+        return jsonify({"error": "User not found"}), 404
+    return jsonify(user_response(user))
+
+@api.route("/api/profile", methods=["POST"])
+@jwt_required()
+def update_profile():
+    user_id = get_jwt_identity()
+    data = request.json or {}
+    try:
+        profile = {"name": str(data["name"]), "age": int(data["age"]), "income": float(data["income"])}
+    except (KeyError, TypeError, ValueError):
+        return jsonify({"error": "Name, age and income required"}), 400
+
+    result = users_collection.update_one(
+        {"_id": user_id},
+        {"$set": dict(profile, profile_completed=True, updated_at=datetime.utcnow())}
+    )
+    if not result.matched_count:
+        return jsonify({"error": "User not found"}), 404
+    # Income feeds the dashboard and the assistant's context
+    user_cache.invalidate(user_id)
+    chat_context_cache.invalidate(user_id)
+    data_versions.bump(user_id)
+    return jsonify({"success": True})
+
 # Text extraction and processing functions
-def extract_text_from_image(image_path):
+def extract_text_from_image(image_path, timings=None):
+    # Accepts a single path or a list of page images / PDFs
     try:
-        print(f"Extracting text from image: {image_path}")
-        img = Image.open(image_path)
-        text = pytesseract.image_to_string(img)
-        print(f"Extracted text (first 100 chars): {text[:100]}...")
-        return text.strip()
+        log.debug("Extracting text from image: %s", image_path)
+        image_hash = hash_files(image_path)
+        cached_text = receipt_cache.get("ocr", image_hash)
+        if cached_text is not None:
+            return cached_text
+
+        with stage("ocr"):
+            text = ocr_engine.extract(image_path, timings)
+        log.debug("Extracted %d characters", len(text))
+        receipt_cache.set("ocr", image_hash, text)
+        return text
     except Exception as e:
-        print(f"Error in extract_text_from_image: {str(e)}")
+        log.error("Error in extract_text_from_image: %s", e)
         return None
 
 def get_gst_captcha_data():
     try:
         url = f"{CONSTANTS.GST_CAPTCHA_URL}{random.random()}"
-        captcha_response = requests.get(url, stream=True)
-        base64_image = base64.b64encode(captcha_response.content).decode('utf-8')
-
-        cookie_header = captcha_response.headers.get('Set-Cookie', '')
-        captcha_cookie = ""
-        for cookie in cookie_header.split(';'):
-            if CONSTANTS.CAPTCHA_COOKIE_STRING in cookie:
-                captcha_cookie = cookie.split('=')[1]
-                break
-
-        captcha_filename = f"captcha_{random.randint(1000, 9999)}.png"
-        captcha_filepath = os.path.join(UPLOADS_DIR, captcha_filename)
-        
-        with open(captcha_filepath, "wb") as f:
-            f.write(base64.b64decode(base64_image))
-
-        return {
-            "captcha_image": captcha_filename,
-            "captcha_cookie": captcha_cookie
-        }
+        with stage("gst_portal"):
+            captcha_response = http_client.get(url)
+            captcha_response.raise_for_status()
+        return store_captcha(captcha_response.content, captcha_response.headers)
     except Exception as error:
-        print(f"Error in get_gst_captcha_data: {str(error)}")
+        log.error("Error in get_gst_captcha_data: %s", error)
         return None
 
+def store_captcha(image, headers):
+    cookie_header = headers.get('Set-Cookie', '')
+    captcha_cookie = ""
+    for cookie in cookie_header.split(';'):
+        if CONSTANTS.CAPTCHA_COOKIE_STRING in cookie:
+            captcha_cookie = cookie.split('=')[1]
+            break
+
+    # Kept in memory only; the reaper drops it once it expires
+    content_type = headers.get('Content-Type', 'image/png').split(';')[0]
+    captcha_id = captcha_store.put(image, content_type)
+
+    return {
+        "captcha_image": f"captcha_{captcha_id}.png",
+        "captcha_image_data": captcha_store.data_uri(captcha_id),
+        "captcha_cookie": captcha_cookie
+    }
+
 def validate_gst_with_govt(gst_number, captcha, captcha_cookie):
     try:
         payload = {"gstin": gst_number, "captcha": captcha}
         headers = {"cookie": f"CaptchaCookie={captcha_cookie}"}
         
-        gst_response = requests.post(CONSTANTS.GST_DETAILS_URL, json=payload, headers=headers)
-        gst_data = gst_response.json()
-        
-        if gst_data.get("errorCode") == CONSTANTS.INVALID_GST_CODE:
-            return None, "Invalid GST number"
-        elif gst_data.get("errorCode") == CONSTANTS.INVALID_CAPTCHA_CODE:
-            return None, "Invalid captcha"
-
-        return gst_data, None
+        with stage("gst_portal"):
+            gst_response = http_client.post(CONSTANTS.GST_DETAILS_URL, json=payload, headers=headers)
+            gst_data = gst_response.json()
+        return check_gst_response(gst_data)
     except Exception as e:
-        print(f"Error validating GST: {str(e)}")
+        log.error("Error validating GST: %s", e)
         return None, "GST validation failed"
 
-def process_text_with_ai(text):
-    try:
-        prompt = f"""Analyze this invoice text and extract structured data. Follow these rules:
+def check_gst_response(gst_data):
+    if gst_data.get("errorCode") == CONSTANTS.INVALID_GST_CODE:
+        return None, "Invalid GST number"
+    elif gst_data.get("errorCode") == CONSTANTS.INVALID_CAPTCHA_CODE:
+        return None, "Invalid captcha"
+
+    return gst_data, None
+
+EXTRACTION_RULES = """Analyze this invoice text and extract structured data. Follow these rules:
         1. GST number must be in 22AAAAA0000A1Z5 format or null
         2. For categories, choose from: Food, Electronics, Clothing, Utilities, Transportation, Healthcare, Entertainment, Other
         3. Return ONLY valid JSON in this exact format:
-        {{
+        {
             "gst_number": "string or null",
             "total_amount": float,
             "store_name": "string",
             "date": "YYYY-MM-DD or null",
             "address": "string or null",
             "items": [
-                {{
+                {
                     "name": "string",
                     "price": float,
                     "category": "string (never null)"
-                }}
+                }
             ]
-        }}
+        }"""
+
+def build_extraction_prompt(text):
+    return f"""{EXTRACTION_RULES}
         
         Invoice Text:
         {text[:3000]}"""  # Truncate to avoid token limits
 
-        response = groq_bot.llm.complete(prompt)
-        response_text = response.text.strip()
-        
-        # Debugging
-        print(f"AI Raw Response:\n{response_text}")
+def build_batch_extraction_prompt(invoices):
+    sections = "\n".join(
+        f"""
+        Invoice ID: {invoice_id}
+        Invoice Text:
+        {text[:3000]}"""
+        for invoice_id, text in invoices
+    )
+    return f"""{EXTRACTION_RULES}
+        4. There are {len(invoices)} invoices below. Return ONLY a JSON array with one object per invoice,
+           each with an extra "invoice_id" field holding that invoice's Invoice ID.
+        {sections}"""
 
-        # Parse JSON with multiple fallbacks
-        try:
-            data = json.loads(response_text)
-        except json.JSONDecodeError:
-            try:
-                # Try extracting from markdown
-                json_str = re.search(r'```json\n(.*?)\n```', response_text, re.DOTALL).group(1)
-                data = json.loads(json_str)
-            except (AttributeError, json.JSONDecodeError):
-                # Final fallback - find first JSON object
-                json_str = re.search(r'\{.*\}', response_text, re.DOTALL).group(0)
-                data = json.loads(json_str)
-
-        # Ensure categories are never null
-        if 'items' in data:
-            for item in data['items']:
-                item['category'] = item.get('category', 'Other')
-                
+# Bursts of uploads are combined into one extraction prompt
+extraction_batcher = ExtractionBatcher(
+    groq_bot.llm,
+    build_extraction_prompt,
+    build_batch_extraction_prompt,
+    max_batch=int(os.getenv("LLM_BATCH_SIZE", 4)),
+    window=float(os.getenv("LLM_BATCH_WINDOW", 0.02))
+)
+
+RULES_MIN_CONFIDENCE = float(os.getenv("RULES_MIN_CONFIDENCE", 0.85))
+
+
+def process_text_with_ai(text):
+    text_hash = hash_text(text)
+    cached_data = receipt_cache.get("ai", text_hash)
+    if cached_data is not None:
+        return cached_data
+
+    # Standard-format receipts are handled by the rule engine without the LLM
+    with stage("rules"):
+        rule_data, confidence = extract_invoice(text)
+    if confidence >= RULES_MIN_CONFIDENCE:
+        log.debug("Rule-based extraction accepted (confidence %s)", confidence)
+        receipt_cache.set("ai", text_hash, rule_data)
+        return rule_data
+
+    try:
+        with stage("llm"):
+            response_text = extraction_batcher.extract(text)
+        data = parse_extraction_response(response_text)
+
+        # Only successful extractions are cached, never the regex fallback
+        receipt_cache.set("ai", text_hash, data)
         return data
 
     except Exception as e:
-        print(f"AI Processing Error: {str(e)}")
-        # Fallback to minimal data extraction
+        log.error("AI Processing Error: %s", e)
+        return extraction_fallback(text, rule_data)
+
+def parse_extraction_response(response_text):
+    response_text = response_text.strip()
+    log.debug("AI raw response: %s", response_text)
+
+    # Parse JSON with multiple fallbacks
+    try:
+        data = json.loads(response_text)
+    except json.JSONDecodeError:
+        try:
+            # Try extracting from markdown
+            json_str = re.search(r'```json\n(.*?)\n```', response_text, re.DOTALL).group(1)
+            data = json.loads(json_str)
+        except (AttributeError, json.JSONDecodeError):
+            # Final fallback - find first JSON object
+            json_str = re.search(r'\{.*\}', response_text, re.DOTALL).group(0)
+            data = json.loads(json_str)
+
+    # Ensure categories are never null
+    if 'items' in data:
+        for item in data['items']:
+            item['category'] = item.get('category', 'Other')
+    return data
+
+def extraction_fallback(text, rule_data):
+    # Fallback to whatever the rule engine found
+    if not rule_data["gst_number"]:
         gst_match = CONSTANTS.GST_REGEX.search(text)
-        return {
-            "gst_number": gst_match.group(0) if gst_match else None,
-            "total_amount": None,
-            "store_name": None,
-            "date": None,
-            "address": None,
-            "items": []
+        rule_data["gst_number"] = gst_match.group(0) if gst_match else None
+    return rule_data
+
+
+def run_bill_pipeline(file_paths):
+    # OCR -> AI -> captcha, shared by the sync route and the job workers
+    ocr_timings = {}
+    extracted_text = extract_text_from_image(file_paths, ocr_timings)
+
+    if not extracted_text:
+        return {"error": "Text extraction failed"}, 400
+
+    # Pre-warm the captcha while the LLM runs if the text has an uncached GSTIN
+    gst_match = CONSTANTS.GST_REGEX.search(extracted_text)
+    captcha_future = None
+    if gst_match and not gstin_cache.get(gst_match.group(0)):
+        captcha_future = captcha_prefetcher.submit(get_gst_captcha_data)
+
+    # Process with AI
+    ai_data = process_text_with_ai(extracted_text)
+
+    # Only include captcha data if GST number exists and is not cached yet
+    cached_gst = gstin_cache.get(ai_data.get('gst_number'))
+    captcha_data = None
+    if not cached_gst and ai_data.get('gst_number'):
+        captcha_data = captcha_future.result() if captcha_future else get_gst_captcha_data()
+
+    return bill_response(ai_data, ocr_timings, cached_gst, captcha_data), 200
+
+def bill_response(ai_data, ocr_timings, cached_gst, captcha_data):
+    response_data = {
+        "success": True,
+        "data": ai_data,
+        "ocr_timings": ocr_timings
+    }
+    if cached_gst:
+        response_data['gst_cached'] = True
+        response_data['gst_details'] = {
+            "business_name": cached_gst.get("business_name"),
+            "address": cached_gst.get("address"),
+            "location": cached_gst.get("location")
         }
+    elif ai_data.get('gst_number'):
+        if captcha_data:
+            response_data['captcha_data'] = captcha_data
+        else:
+            log.warning("GST found but captcha failed")
+    return response_data
+
+def save_uploads(files, temp_dir):
+    # Index prefix keeps pages with the same name from overwriting each other
+    file_paths = []
+    for index, (filename, content) in enumerate(files):
+        file_path = os.path.join(temp_dir, f"{index}_{os.path.basename(filename)}")
+        with open(file_path, "wb") as f:
+            f.write(content)
+        file_paths.append(file_path)
+    return file_paths
+
+def process_bill_job(payload):
+    try:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_paths = save_uploads(payload["files"], temp_dir)
+            response_data, _ = run_bill_pipeline(file_paths)
+            return response_data
+    except Exception as e:
+        log.exception("Process Bill Job Error: %s", e)
+        return {"error": "Processing failed"}
 
+# Status and results are shared through Mongo, so any worker can answer a poll
+JOB_RESULT_TTL = int(os.getenv("JOB_RESULT_TTL", 3600))
+job_store = MongoJobStore(LocalProxy(lambda: mongo.get().jobs), result_ttl=JOB_RESULT_TTL)
 
-@app.route('/api/process-bill', methods=['POST'])
+bill_jobs = JobQueue(
+    process_bill_job,
+    broker=LocalBroker(max_size=int(os.getenv("BILL_QUEUE_SIZE", 100))),
+    workers=int(os.getenv("BILL_WORKERS", 4)),
+    max_per_user=int(os.getenv("BILL_JOBS_PER_USER", 2)),
+    result_ttl=JOB_RESULT_TTL,
+    store=job_store,
+    name="bill"
+)
+
+@api.route('/api/process-bill', methods=['POST'])
 @jwt_required()
 def process_bill():
     user_id = get_jwt_identity()
@@ -278,92 +525,177 @@ def process_bill():
     if 'file' not in request.files:
         return jsonify({"error": "No file uploaded"}), 400
 
-    file = request.files['file']
-    if file.filename == '':
+    # Several files (or a multi-page PDF) are OCRed as pages of one bill
+    uploads = [file for file in request.files.getlist('file') if file.filename != '']
+    if not uploads:
         return jsonify({"error": "No file selected"}), 400
+    files = [(file.filename, file.read()) for file in uploads]
+
+    # Job mode: queue the upload and return a job id right away
+    if request.args.get("async") in ("1", "true"):
+        try:
+            job_id = bill_jobs.submit(user_id, {"files": files})
+        except UserLimitError as e:
+            return jsonify({"error": str(e)}), 429
+        except QueueFullError as e:
+            return jsonify({"error": str(e)}), 503, {"Retry-After": "5"}
+        return jsonify({"success": True, "job_id": job_id, "status": "queued"}), 202
 
     try:
         with tempfile.TemporaryDirectory() as temp_dir:
             # Save and process image
-            file_path = os.path.join(temp_dir, file.filename)
-            file.save(file_path)
-            extracted_text = extract_text_from_image(file_path)
-            
-            if not extracted_text:
-                return jsonify({"error": "Text extraction failed"}), 400
-
-            # Process with AI
-            ai_data = process_text_with_ai(extracted_text)
-            
-            # Prepare response
-            response_data = {
-                "success": True,
-                "data": ai_data
-            }
-
-            # Only include captcha data if GST number exists
-            if ai_data.get('gst_number'):
-                captcha_data = get_gst_captcha_data()
-                if captcha_data:
-                    response_data['captcha_data'] = captcha_data
-                else:
-                    print("Warning: GST found but captcha failed")
-
-            return jsonify(response_data)
+            file_paths = save_uploads(files, temp_dir)
+            response_data, status = run_bill_pipeline(file_paths)
+            return jsonify(response_data), status
 
     except Exception as e:
-        print(f"Process Bill Error: {str(e)}")
+        log.exception("Process Bill Error: %s", e)
         return jsonify({"error": "Processing failed"}), 500
 
+@api.route('/api/cache/stats', methods=['GET'])
+@jwt_required()
+def cache_stats():
+    return jsonify(receipt_cache.stats())
+
+@api.route('/api/llm/stats', methods=['GET'])
+@jwt_required()
+def llm_stats():
+    return jsonify(groq_bot.llm.get_stats())
+
+@api.route('/api/jobs/<job_id>', methods=['GET'])
+@jwt_required()
+def get_job(job_id):
+    user_id = get_jwt_identity()
+    # Optional long-poll, capped so a worker is never held for too long
+    try:
+        wait = min(max(float(request.args.get("wait", 0) or 0), 0), 30)
+    except ValueError:
+        return jsonify({"error": "wait must be a number of seconds"}), 400
+    job = bill_jobs.get(job_id, user_id=user_id, wait=wait) or import_jobs.get(job_id, user_id=user_id, wait=wait)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
+# Bulk import: historical receipts are imported without a captcha per receipt
+bulk_importer = BulkImporter(
+    expenses_collection,
+    monthly_rollups_collection,
+    imports_collection,
+    extract_text_from_image,
+    process_text_with_ai,
+    gst_lookup=gstin_cache.get,
+    workers=int(os.getenv("IMPORT_OCR_WORKERS", 4)),
+    batch_size=int(os.getenv("IMPORT_BATCH_SIZE", 50)),
+    on_batch=lambda user_id: expenses_changed(user_id)
+)
+
+def process_import_job(payload):
+    try:
+        counts = bulk_importer.run(payload["import_id"], payload["user_id"], payload["paths"])
+        return {"import_id": payload["import_id"], "counts": counts}
+    except Exception as e:
+        log.exception("Bulk Import Job Error: %s", e)
+        return {"error": "Import failed"}
+    finally:
+        shutil.rmtree(payload["temp_dir"], ignore_errors=True)
+
+import_jobs = JobQueue(
+    process_import_job,
+    broker=LocalBroker(max_size=int(os.getenv("IMPORT_QUEUE_SIZE", 10))),
+    workers=int(os.getenv("IMPORT_WORKERS", 1)),
+    max_per_user=1,
+    result_ttl=JOB_RESULT_TTL,
+    store=job_store,
+    name="import"
+)
+
+@api.route('/api/imports', methods=['POST'])
+@jwt_required()
+def create_import():
+    user_id = get_jwt_identity()
+    uploads = [file for file in request.files.getlist('file') if file.filename != '']
+    if not uploads:
+        return jsonify({"error": "No file uploaded"}), 400
+
+    # Resuming needs the same archive; members already committed are skipped
+    import_id = request.form.get("import_id")
+    if import_id and not bulk_importer.progress(import_id, user_id):
+        return jsonify({"error": "Import not found"}), 404
 
-@app.route("/api/validate-gst", methods=["POST"])
+    # Archives are saved as-is; members are read one at a time by the importer
+    temp_dir = tempfile.mkdtemp(prefix="import_")
+    paths = []
+    for index, file in enumerate(uploads):
+        path = os.path.join(temp_dir, f"{index}_{os.path.basename(file.filename)}")
+        file.save(path)
+        paths.append(path)
+
+    checkpoint = bulk_importer.create(user_id, ", ".join(file.filename for file in uploads), import_id)
+    payload = {"import_id": checkpoint["_id"], "user_id": user_id, "paths": paths, "temp_dir": temp_dir}
+    try:
+        job_id = import_jobs.submit(user_id, payload)
+    except (UserLimitError, QueueFullError) as e:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        status = 429 if isinstance(e, UserLimitError) else 503
+        return jsonify({"error": str(e), "import_id": checkpoint["_id"]}), status, {"Retry-After": "30"}
+
+    return jsonify({"success": True, "import_id": checkpoint["_id"], "job_id": job_id, "status": "queued"}), 202
+
+@api.route('/api/imports/<import_id>', methods=['GET'])
+@jwt_required()
+def get_import(import_id):
+    progress = bulk_importer.progress(import_id, get_jwt_identity())
+    if not progress:
+        return jsonify({"error": "Import not found"}), 404
+    return jsonify(progress)
+
+
+@api.route("/api/validate-gst", methods=["POST"])
 @jwt_required()
 def validate_gst():
     user_id = get_jwt_identity()
     data = request.json
     
-    gst_number = data.get("gst_number")
+    gst_number = (data.get("gst_number") or "").upper()
     captcha = data.get("captcha")
     captcha_cookie = data.get("captcha_cookie")
-    ai_data = data.get("ai_data")
+    ai_data = data.get("ai_data") or {}
+
+    if not gst_number:
+        return jsonify({"error": "Missing required fields"}), 400
 
-    if not all([gst_number, captcha, captcha_cookie]):
+    # Step 1: Validate with government API, unless the GSTIN is already cached
+    cached = gstin_cache.get(gst_number)
+    if not cached and not all([captcha, captcha_cookie]):
         return jsonify({"error": "Missing required fields"}), 400
 
-    # Step 1: Validate with government API
-    gst_data, error = validate_gst_with_govt(gst_number, captcha, captcha_cookie)
+    def fetch_gst_details():
+        gst_data, error = validate_gst_with_govt(gst_number, captcha, captcha_cookie)
+        if error:
+            return None, error
+
+        # Step 2: Geocode the registered address once per GSTIN
+        govt_address = gst_data.get("pradr", {}).get("adr", "")
+        return gst_details_from(gst_data, geocode_address(govt_address) if govt_address else None), None
+
+    gst_details, error = (cached, None) if cached else gstin_cache.lookup(gst_number, fetch_gst_details)
     if error:
         return jsonify({"error": error}), 400
 
-    # Step 2: Geocode address
-    address = gst_data.get("pradr", {}).get("adr", "") or ai_data.get("address")
-    location_data = geocode_address(address) if address else None
+    gst_data = gst_details["gst_data"]
+    address = gst_details.get("address") or ai_data.get("address")
+    location_data = gst_details.get("location")
+    if not gst_details.get("address") and address:
+        location_data = geocode_address(address)
 
-    # Step 3: Save GST details
-    gst_details = {
-        "user_id": user_id,
-        "gst_number": gst_number,
-        "business_name": gst_data.get("tradeNam", "") or ai_data.get("store_name"),
-        "address": address,
-        "location": location_data,
-        "created_at": datetime.utcnow()
-    }
-    gst_details_collection.insert_one(gst_details)
-
-    # Step 4: Save expense if we have AI data
+    # Step 3: Save expense if we have AI data
     if ai_data:
-        expense = {
-            "user_id": user_id,
-            "gst_number": gst_number,
-            "store_name": ai_data.get("store_name", ""),
-            "total_amount": float(ai_data.get("total_amount", 0)),
-            "items": ai_data.get("items", []),
-            "date": ai_data.get("date") or datetime.utcnow().isoformat(),
-            "address": address,
-            "location": location_data,
-            "created_at": datetime.utcnow()
-        }
+        expense = build_expense(user_id, gst_number, ai_data, address, location_data)
         expenses_collection.insert_one(expense)
+        apply_expense(monthly_rollups_collection, expense)
+        chat_context_cache.invalidate(user_id)
+        analytics_cache.add_expense(expense)
+        data_versions.bump(user_id)
 
     return jsonify({
         "success": True,
@@ -371,79 +703,126 @@ def validate_gst():
         "location_data": location_data,
         "expense_saved": bool(ai_data)
     })
+
+def gst_details_from(gst_data, location):
+    return {
+        "business_name": gst_data.get("tradeNam", ""),
+        "address": gst_data.get("pradr", {}).get("adr", ""),
+        "location": location,
+        "gst_data": gst_data
+    }
+
+def build_expense(user_id, gst_number, ai_data, address, location_data):
+    expense = {
+        "user_id": user_id,
+        "gst_number": gst_number,
+        "store_name": ai_data.get("store_name", ""),
+        "total_amount": float(ai_data.get("total_amount", 0)),
+        "items": normalize_items(ai_data.get("items", [])),
+        "date": ai_data.get("date") or datetime.utcnow().isoformat(),
+        "address": address,
+        "location": location_data,
+        "created_at": datetime.utcnow()
+    }
+    geo = to_geojson(location_data)
+    if geo:
+        expense["geo"] = geo
+    return expense
 # Dashboard Routes
-@app.route("/api/dashboard", methods=["GET"])
+@api.route("/api/dashboard", methods=["GET"])
 @jwt_required()
 def get_dashboard():
     user_id = get_jwt_identity()
-    user = users_collection.find_one({"_id": user_id})
+    # Polls that already have this version are answered before any query runs
+    view = dashboard_validators(user_id, data_versions.get(user_id))
+    if is_not_modified(request.headers, *view):
+        return not_modified(view)
+    user = user_cache.get(user_id)
     
-    # Get expenses for the current month
-    current_month = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    expenses = list(expenses_collection.find({
-        "user_id": user_id,
-        "created_at": {"$gte": current_month}
-    }))
+    # Current month totals come from the pre-aggregated rollup
+    rollup = get_rollup(monthly_rollups_collection, user_id)
+    
+    # Recent expenses
+    recent = recent_expenses(expenses_collection, user_id)
     
-    total_spent = sum(expense.get("total_amount", 0) for expense in expenses)
+    return json_response(dashboard_response(user, rollup, recent), view)
+
+def dashboard_validators(user_id, data_version, now=None):
+    # Totals are for the current month, so a new month is a new view
+    month_start = (now or datetime.utcnow()).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    return validators(user_id, data_version, "dashboard", month_start.strftime("%Y-%m"), not_before=month_start)
+
+def json_response(payload, view=None):
+    body, headers = encode_json(payload, request.headers, *(view or ()))
+    return Response(body, mimetype="application/json", headers=headers)
+
+def not_modified(view):
+    return Response(status=304, headers=cache_headers(*view))
+
+def dashboard_response(user, rollup, recent):
+    total_spent = rollup["total_spent"]
     income = user.get("income", 0)
     remaining_budget = income - total_spent
     
     # Category breakdown
-    category_totals = {}
-    for expense in expenses:
-        for item in expense.get("items", []):
-            category = item.get("category", "Other")
-            category_totals[category] = category_totals.get(category, 0) + float(item.get("price", 0))
-    
-    # Recent expenses
-    recent_expenses = list(expenses_collection.find(
-        {"user_id": user_id}
-    ).sort("created_at", -1).limit(10))
+    category_totals = rollup["categories"]
     
-    # Convert ObjectId to string for JSON serialization
-    for expense in recent_expenses:
-        expense["_id"] = str(expense["_id"])
-    
-    return jsonify({
+    # ObjectIds and datetimes in `recent` are left to responses.dumps
+    return {
         "total_spent": total_spent,
         "income": income,
         "remaining_budget": remaining_budget,
         "category_breakdown": category_totals,
-        "recent_expenses": recent_expenses,
-        "expense_count": len(expenses)
-    })
+        "recent_expenses": recent,
+        "expense_count": rollup["expense_count"]
+    }
 
 # Map Data Route
-@app.route("/api/map-data", methods=["GET"])
+@api.route("/api/map-data", methods=["GET"])
 @jwt_required()
 def get_map_data():
     user_id = get_jwt_identity()
-    
-    # Get all expenses with location data
-    expenses = list(expenses_collection.find({
-        "user_id": user_id,
-        "location": {"$ne": None}
-    }).sort("created_at", -1))
-    
-    # Format data for map
-    map_data = []
-    for expense in expenses:
-        if expense.get("location"):
-            map_data.append({
-                "id": str(expense["_id"]),
-                "store_name": expense.get("store_name", "Unknown Store"),
-                "date": expense.get("date"),
-                "total_amount": expense.get("total_amount", 0),
-                "address": expense.get("address", ""),
-                "location": expense.get("location"),
-                "items": expense.get("items", [])
-            })
-    print(map_data)
-    return jsonify(map_data)
+
+    # Optional viewport parameters; without them the full list is returned as before
+    try:
+        bbox = parse_bbox(request.args["bbox"]) if request.args.get("bbox") else None
+        zoom = int(request.args["zoom"]) if request.args.get("zoom") else None
+        cursor = parse_cursor(request.args["cursor"]) if request.args.get("cursor") else None
+        limit = min(int(request.args["limit"]), MAX_PAGE_SIZE) if request.args.get("limit") else None
+        if limit is not None and limit < 1:
+            raise ValueError("limit must be at least 1")
+    except ValueError as e:
+        return jsonify({"error": f"Invalid map query: {e}"}), 400
+    include_items = request.args.get("items", "1") not in ("0", "false")
+
+    # Every viewport/page is its own view of the same data version
+    view = validators(user_id, data_versions.get(user_id), "map", request.query_string.decode())
+    if is_not_modified(request.headers, *view):
+        return not_modified(view)
+
+    # Low zoom over a viewport: aggregate nearby points into clusters
+    if bbox and zoom is not None and zoom <= CLUSTER_MAX_ZOOM:
+        return json_response({"clusters": cluster_points(expenses_collection, user_id, bbox, zoom)}, view)
+
+    # NDJSON streaming: one point per line, never materialized as a list
+    if request.args.get("format") == "ndjson":
+        points = find_points(expenses_collection, user_id, bbox, cursor, limit, include_items)
+        return Response(
+            stream_with_context(dumps(point) + b"\n" for point in points),
+            mimetype="application/x-ndjson",
+            headers=cache_headers(*view)
+        )
+
+    if bbox or cursor or limit:
+        points, next_cursor = find_page(
+            expenses_collection, user_id, bbox, cursor, limit or DEFAULT_PAGE_SIZE, include_items
+        )
+        return json_response({"points": points, "next_cursor": next_cursor}, view)
+
+    return json_response(list(find_points(expenses_collection, user_id, include_items=include_items)), view)
 
 # Chatbot Routes
-@app.route("/api/chat/spam-check", methods=["POST"])
+@api.route("/api/chat/spam-check", methods=["POST"])
 def check_spam():
     data = request.json
     messages = data.get("messages", [])
@@ -451,68 +830,77 @@ def check_spam():
     if not messages or not isinstance(messages, list):
         return jsonify({"error": "Invalid input. Provide a list of messages."}), 400
 
-    results = []
-    for msg in messages:
-        if loaded_model:
-            spam_prediction = loaded_model.predict([msg])[0]
-            is_spam = "scam" if spam_prediction == "spam" else "safe"
-        else:
-            is_spam = "safe"  # Default if model not loaded
+    if not all(isinstance(msg, str) for msg in messages):
+        return jsonify({"error": "Invalid input. Messages must be strings."}), 400
 
-        extracted_links = extract_links(msg)
-        detected_links = []
-        
-        for link in extracted_links:
-            if link in phishing_urls:
-                detected_links.append("suspicious")
-            else:
-                detected_links.append("safe")
-
-        result = {
-            "message": is_spam,
-            "detected_links": detected_links if detected_links else "no links found"
-        }
-        results.append(result)
+    with stage("spam"):
+        return jsonify(spam_scorer.score(messages))
 
-    return jsonify(results)
+@api.route("/api/chat/phishing-index", methods=["GET"])
+def phishing_index_stats():
+    return jsonify(spam_scorer.phishing_index.stats())
 
-@app.route("/api/chat/assistant", methods=["POST"])
+def expenses_changed(user_id):
+    # Bulk writes: cached per-user views are rebuilt from the database
+    chat_context_cache.invalidate(user_id)
+    analytics_cache.invalidate(user_id)
+    data_versions.bump(user_id)
+
+@api.route("/api/analytics", methods=["GET"])
 @jwt_required()
-def chat_assistant():
+def get_analytics():
     user_id = get_jwt_identity()
-    data = request.json
-    message = data.get("message", "")
-    
-    if not message:
-        return jsonify({"error": "Message required"}), 400
-    
+    try:
+        months = min(max(int(request.args.get("months", 6)), 2), 36)
+    except ValueError:
+        return jsonify({"error": "months must be a number"}), 400
+    user = user_cache.get(user_id) or {}
+    with stage("analytics"):
+        return jsonify(analytics_cache.get(user_id, months, income=user.get("income", 0)))
+
+def build_financial_context(user_id):
     # Get user data for context
-    user = users_collection.find_one({"_id": user_id})
-    expenses = list(expenses_collection.find({"user_id": user_id}).sort("created_at", -1).limit(50))
-    
-    # Calculate financial metrics
-    current_month = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    monthly_expenses = list(expenses_collection.find({
-        "user_id": user_id,
-        "created_at": {"$gte": current_month}
-    }))
+    user = user_cache.get(user_id)
     
-    total_monthly_spent = sum(exp.get('total_amount', 0) for exp in monthly_expenses)
+    # Calculate financial metrics from the monthly rollup
+    rollup = get_rollup(monthly_rollups_collection, user_id)
+
+    # Trends and the month-end projection, shared with /api/analytics
+    with stage("analytics"):
+        analytics = analytics_cache.get(user_id, income=user.get('income', 0))
+    return format_financial_context(user, rollup, analytics)
+
+def format_trends(analytics):
+    if not analytics or not any(analytics["monthly_counts"]):
+        return "• Not enough history yet"
+    change_pct = analytics["month_over_month"]["change_pct"]
+    projection = analytics["projection"]
+    lines = [
+        "• Monthly totals: " + ", ".join(
+            f"{month} ${total:,.2f}" for month, total in zip(analytics["months"], analytics["monthly_totals"])
+        ),
+        f"• Month over month: {f'{change_pct:+.1f}%' if change_pct is not None else 'n/a'}",
+        f"• Projected month-end spend: ${projection['projected_total']:,.2f} (about ${projection['daily_rate']:,.2f}/day)",
+    ]
+    if analytics["top_merchants"]:
+        lines.append("• Top merchants: " + ", ".join(
+            f"{merchant['store_name']} (${merchant['total']:,.2f})" for merchant in analytics["top_merchants"][:3]
+        ))
+    return chr(10).join(lines)
+
+def format_financial_context(user, rollup, analytics=None):
+    total_monthly_spent = rollup["total_spent"]
     monthly_income = user.get('income', 0)
     remaining_budget = monthly_income - total_monthly_spent
     
     # Category breakdown
-    category_totals = {}
-    for expense in monthly_expenses:
-        for item in expense.get("items", []):
-            category = item.get("category", "Other")
-            category_totals[category] = category_totals.get(category, 0) + float(item.get("price", 0))
+    category_totals = rollup["categories"]
     
     # Top spending categories
     top_categories = sorted(category_totals.items(), key=lambda x: x[1], reverse=True)[:5]
     
-    # Recent transactions summary
-    recent_stores = [exp.get('store_name', 'Unknown') for exp in monthly_expenses[:10] if exp.get('store_name')]
+    # Recent transactions summary, newest first and in a stable order
+    recent_stores = list(dict.fromkeys(reversed(rollup["recent_stores"])))
     
     # Prepare enhanced context
     context = f"""
@@ -533,7 +921,7 @@ def chat_assistant():
 
     **CURRENT MONTH FINANCIAL SUMMARY:**
     📊 **Total Spent:** ${total_monthly_spent:,.2f}
-    💳 **Transactions:** {len(monthly_expenses)}
+    💳 **Transactions:** {rollup["expense_count"]}
     💵 **Remaining Budget:** ${remaining_budget:,.2f}
     📈 **Budget Usage:** {(total_monthly_spent/monthly_income*100) if monthly_income > 0 else 0:.1f}%
 
@@ -541,7 +929,10 @@ def chat_assistant():
     {chr(10).join([f"• **{cat}:** ${amount:,.2f}" for cat, amount in top_categories]) if top_categories else "• No spending data available"}
 
     **RECENT STORES:**
-    {chr(10).join([f"• {store}" for store in list(set(recent_stores))[:5]]) if recent_stores else "• No recent transactions"}
+    {chr(10).join([f"• {store}" for store in recent_stores[:5]]) if recent_stores else "• No recent transactions"}
+
+    **SPENDING TRENDS:**
+    {format_trends(analytics)}
 
     **FINANCIAL HEALTH INDICATORS:**
     • Budget Status: {"🔴 Over Budget" if remaining_budget < 0 else "🟢 Within Budget" if remaining_budget > monthly_income * 0.2 else "🟡 Tight Budget"}
@@ -549,27 +940,116 @@ def chat_assistant():
 
     Always provide personalized, actionable financial advice based on this data. Format your response clearly with sections, bullet points, and relevant emojis.
     """
+    return context
+
+def build_chat_prompt(context, message):
+    return f"{context}\n\n**USER QUESTION:** {message}\n\nProvide a well-formatted, helpful response:"
+
+chat_context_cache = SnapshotCache(build_financial_context, ttl=int(os.getenv("CHAT_CONTEXT_TTL", 60)))
+
+@api.route("/api/chat/context-stats", methods=["GET"])
+@jwt_required()
+def chat_context_stats():
+    return jsonify(chat_context_cache.stats())
+
+@api.route("/api/chat/assistant", methods=["POST"])
+@jwt_required()
+def chat_assistant():
+    user_id = get_jwt_identity()
+    data = request.json
+    message = data.get("message", "")
     
+    if not message:
+        return jsonify({"error": "Message required"}), 400
     
-    
+    # Cached per user; rebuilt only after an expense write or TTL expiry
+    context = chat_context_cache.get(user_id)
+
+    prompt = build_chat_prompt(context, message)
+
+    # Streaming mode: forward tokens as they arrive (SSE, or NDJSON with format=ndjson)
+    if request.args.get("stream") in ("1", "true") or data.get("stream"):
+        fmt = "ndjson" if request.args.get("format") == "ndjson" else "sse"
+        return Response(
+            stream_with_context(stream_completion(groq_bot.llm, prompt, fmt)),
+            mimetype="application/x-ndjson" if fmt == "ndjson" else "text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+
     try:
-        prompt = f"{context}\n\n**USER QUESTION:** {message}\n\nProvide a well-formatted, helpful response:"
-        response = groq_bot.llm.complete(prompt)
-        print(response.text)  # Debugging output
+        with stage("llm"):
+            response = groq_bot.llm.complete(prompt)
         return jsonify({
             "response": response.text,
             "timestamp": datetime.utcnow().isoformat()
         })
     except Exception as e:
-        print(f"Error in chat assistant: {e}")
+        log.error("Error in chat assistant: %s", e)
         return jsonify({"error": "Failed to get response from assistant"}), 500
 
 
-@app.route('/uploads/<filename>')
+@api.route('/metrics')
+def metrics():
+    # Prometheus text exposition; scrape per process (or per worker)
+    return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+@api.route('/api/captcha/<captcha_id>')
+def captcha_image(captcha_id):
+    entry = captcha_store.get(captcha_id)
+    if not entry:
+        return jsonify({"error": "Captcha expired"}), 404
+    image, content_type, seconds_left = entry
+    # The stored bytes are handed to the response as-is, without copying
+    response = Response(image, mimetype=content_type)
+    response.headers['Cache-Control'] = f"private, max-age={int(seconds_left)}, immutable"
+    return response
+
+@api.route('/uploads/<filename>')
 def uploaded_file(filename):
     if filename == 'undefined':
         return jsonify({"error": "Invalid filename"}), 400
+    # Captcha links handed out as captcha_<id>.png are served from memory
+    if filename.startswith("captcha_") and filename.endswith(".png"):
+        return captcha_image(filename[len("captcha_"):-len(".png")])
     return send_from_directory(UPLOADS_DIR, filename)
 
+@api.route('/api/startup', methods=['GET'])
+def startup_stats():
+    # Which per-process resources this worker has initialized, and what they cost
+    return jsonify({resource.name: resource.stats() for resource in (mongo, ocr, spam_assets)})
+
+def preload_assets():
+    """Load the read-only assets now so forked workers share them copy-on-write."""
+    # Importing the LLM client library is fork-safe; creating the client is not
+    preload([spam_assets], hooks=[groq_bot.llm.backend.preload])
+
+def create_app(preload=None):
+    """Build the Flask app without connecting to anything.
+
+    Mongo, the OCR engine, the LLM client and the spam model are created on
+    first use in each process. With `preload` (default: PRELOAD_ASSETS=1) the
+    read-only assets are loaded now, for servers that import the app in a
+    master process before forking workers (gunicorn --preload).
+    """
+    configure_logging()
+    app = Flask(__name__)
+    CORS(app)
+    # Per-route timing, slow-request logging and the optional profiler hook
+    instrument(app, request, g)
+
+    # Configuration
+    app.config['JWT_SECRET_KEY'] = 'your-secret-key-change-this'
+    app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(days=7)
+    JWTManager(app)
+
+    app.register_blueprint(api)
+    os.makedirs(UPLOADS_DIR, exist_ok=True)
+
+    if preload if preload is not None else os.getenv("PRELOAD_ASSETS") == "1":
+        preload_assets()
+    return app
+
+# No module-level app: importing this module (asgi.py, the CLIs, the benchmarks)
+# must not configure logging or preload assets; each entry point builds its own
 if __name__ == "__main__":
-    app.run(debug=True, port=5000)
+    create_app().run(debug=True, port=5000)
@@ -0,0 +1,468 @@
+# Async serving mode: the same API on an ASGI stack.
+# Routes that wait on upstreams (LLM, GST portal, geocoder) or on Mongo run as
+# coroutines on Quart with motor and a pooled httpx client, so a slow upstream
+# call holds a coroutine instead of a thread; OCR runs in an executor. Signup
+# and login await the password hashing pool instead of blocking on it. Every
+# other route is served by the Flask app through a WSGI adapter, and both
+# sides build their responses with the same helpers from app.py, so the JSON
+# contracts are identical in both modes.
+# Run: uvicorn asgi:application --host 0.0.0.0 --port 5000
+import asyncio
+import contextvars
+import logging
+import os
+import random
+import tempfile
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import wraps
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+
+import httpx
+import jwt
+from flask_jwt_extended import create_access_token
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from quart import Quart, Response, g, jsonify, request
+from uvicorn.middleware.wsgi import WSGIMiddleware
+
+import app as flask_backend
+from app import (
+    CONSTANTS, MONGO_DB, MONGO_URI, RULES_MIN_CONFIDENCE, bill_response,
+    build_chat_prompt, build_expense, build_extraction_prompt, check_gst_response,
+    dashboard_response, dashboard_validators, extraction_fallback, format_financial_context, gst_details_from,
+    parse_extraction_response, save_uploads, store_captcha, user_response
+)
+from cache import hash_text
+from extractor import extract_invoice
+from geocoding import AsyncGeocoder
+from gstin import AsyncGstinCache
+from jobs import QueueFullError, UserLimitError
+from observability import MongoCommandTimer, instrument, stage
+from queries import recent_expenses_async
+from responses import cache_headers, encode_json, is_not_modified
+from rollups import apply_expense_async, get_rollup_async
+from streaming import astream_completion
+from users import HasherBusy, PROFILE_FIELDS
+
+# Served natively by the async app; everything else goes to Flask
+ASYNC_PATHS = {
+    "/api/signup", "/api/login", "/api/process-bill", "/api/validate-gst", "/api/dashboard", "/api/chat/assistant"
+}
+
+log = logging.getLogger(__name__)
+
+# The Flask side of this server; built here, once, like gunicorn's create_app()
+flask_app = flask_backend.create_app()
+quart_app = Quart(__name__)
+# Profiling is left to the Flask side: coroutines share the event loop thread
+instrument(quart_app, request, g, profile=False, is_async=True)
+llm = flask_backend.groq_bot.llm
+receipt_cache = flask_backend.receipt_cache
+chat_context_cache = flask_backend.chat_context_cache
+user_cache = flask_backend.user_cache
+password_hasher = flask_backend.password_hasher
+analytics_cache = flask_backend.analytics_cache
+data_versions = flask_backend.data_versions
+ocr_executor = ThreadPoolExecutor(max_workers=int(os.getenv("OCR_WORKERS", os.cpu_count() or 1)), thread_name_prefix="ocr")
+
+# Created on the server's event loop in startup()
+db = None
+http = None
+gstin_cache = None
+geocoder = None
+
+
+@quart_app.before_serving
+async def startup():
+    global db, http, gstin_cache, geocoder
+    db = AsyncIOMotorClient(
+        MONGO_URI, maxPoolSize=int(os.getenv("MONGO_POOL_SIZE", 100)), event_listeners=[MongoCommandTimer()]
+    )[MONGO_DB]
+    # As in http_client.py, cookies (e.g. the captcha cookie) are never kept between requests
+    http = httpx.AsyncClient(
+        timeout=httpx.Timeout(10, connect=3.05),
+        cookies=CookieJar(policy=DefaultCookiePolicy(allowed_domains=[])),
+        transport=httpx.AsyncHTTPTransport(
+            retries=int(os.getenv("HTTP_RETRIES", 2)),
+            limits=httpx.Limits(
+                max_connections=int(os.getenv("ASYNC_HTTP_POOL_SIZE", 1000)),
+                max_keepalive_connections=int(os.getenv("HTTP_POOL_SIZE", 20))
+            )
+        )
+    )
+    gstin_cache = AsyncGstinCache(db.gst_details)
+    geocoder = AsyncGeocoder(db.geocode_cache, client=http)
+
+
+@quart_app.after_serving
+async def shutdown():
+    await http.aclose()
+    db.client.close()
+    ocr_executor.shutdown(wait=False)
+
+
+@quart_app.after_request
+async def add_cors_headers(response):
+    # Preflight requests are answered by flask_cors on the WSGI side
+    response.headers.setdefault("Access-Control-Allow-Origin", "*")
+    return response
+
+
+def jwt_required(fn):
+    """Accept the same tokens (and return the same errors) as flask_jwt_extended."""
+    @wraps(fn)
+    async def wrapper(*args, **kwargs):
+        header = request.headers.get("Authorization", "")
+        if not header:
+            return jsonify({"msg": "Missing Authorization Header"}), 401
+        parts = header.split()
+        if len(parts) != 2 or parts[0] != "Bearer":
+            return jsonify({"msg": "Bad Authorization header. Expected 'Authorization: Bearer <JWT>'"}), 422
+        config = flask_app.config
+        try:
+            claims = jwt.decode(parts[1], config["JWT_SECRET_KEY"], algorithms=[config.get("JWT_ALGORITHM", "HS256")])
+        except jwt.ExpiredSignatureError:
+            return jsonify({"msg": "Token has expired"}), 401
+        except jwt.InvalidTokenError as e:
+            return jsonify({"msg": str(e)}), 422
+        if claims.get("type") != "access":
+            return jsonify({"msg": "Only non-refresh tokens are allowed"}), 422
+        g.jwt_identity = claims["sub"]
+        return await fn(*args, **kwargs)
+    return wrapper
+
+
+def get_jwt_identity():
+    return g.jwt_identity
+
+
+def access_token(user_id):
+    # Issued by flask_jwt_extended, so tokens are the same in both modes
+    with flask_app.app_context():
+        return create_access_token(identity=user_id)
+
+
+@quart_app.route("/api/signup", methods=["POST"])
+async def signup():
+    data = await request.get_json()
+    email = data.get("email")
+    password = data.get("password")
+
+    if not email or not password:
+        return jsonify({"error": "Email and password required"}), 400
+
+    try:
+        hashed_password = await password_hasher.ahash(password)
+    except HasherBusy as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "2"}
+    user_id = str(uuid.uuid4())
+
+    user = {
+        "_id": user_id,
+        "email": email,
+        "password": hashed_password,
+        "profile_completed": False,
+        "created_at": datetime.utcnow()
+    }
+    try:
+        result = await db.users.update_one({"email": email}, {"$setOnInsert": user}, upsert=True)
+    except DuplicateKeyError:
+        result = None
+    if not result or result.upserted_id is None:
+        return jsonify({"error": "User already exists"}), 400
+    user_cache.put(user)
+
+    return jsonify({
+        "access_token": access_token(user_id),
+        "user": {"id": user_id, "email": email, "profile_completed": False}
+    })
+
+
+@quart_app.route("/api/login", methods=["POST"])
+async def login():
+    data = await request.get_json()
+    email = data.get("email")
+    password = data.get("password")
+
+    if not email or not password:
+        return jsonify({"error": "Email and password required"}), 400
+
+    user = await db.users.find_one({"email": email})
+    try:
+        if not user or not await password_hasher.averify(user["password"], password):
+            return jsonify({"error": "Invalid credentials"}), 401
+        if password_hasher.needs_rehash(user["password"]):
+            rehashed = await password_hasher.ahash(password)
+            await db.users.update_one({"_id": user["_id"]}, {"$set": {"password": rehashed}})
+    except HasherBusy as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "2"}
+    user_cache.put(user)
+
+    return jsonify({"access_token": access_token(user["_id"]), "user": user_response(user)})
+
+
+async def run_blocking(fn, *args, executor=None):
+    # Run in a copy of the request's context, so stages timed in the worker
+    # thread (OCR, cache reads) still land in its stages_ms
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(executor, context.run, fn, *args)
+
+
+async def get_gst_captcha_data():
+    try:
+        with stage("gst_portal"):
+            response = await http.get(f"{CONSTANTS.GST_CAPTCHA_URL}{random.random()}")
+            response.raise_for_status()
+        return store_captcha(response.content, response.headers)
+    except Exception as error:
+        log.error("Error in get_gst_captcha_data: %s", error)
+        return None
+
+
+async def validate_gst_with_govt(gst_number, captcha, captcha_cookie):
+    try:
+        payload = {"gstin": gst_number, "captcha": captcha}
+        headers = {"cookie": f"CaptchaCookie={captcha_cookie}"}
+        with stage("gst_portal"):
+            response = await http.post(CONSTANTS.GST_DETAILS_URL, json=payload, headers=headers)
+            gst_data = response.json()
+        return check_gst_response(gst_data)
+    except Exception as e:
+        log.error("Error validating GST: %s", e)
+        return None, "GST validation failed"
+
+
+async def process_text_with_ai(text):
+    # Same flow as app.process_text_with_ai; the receipt cache lookups are
+    # in-memory first and fall back to pymongo, so they run in the executor
+    text_hash = hash_text(text)
+    cached_data = await run_blocking(receipt_cache.get, "ai", text_hash)
+    if cached_data is not None:
+        return cached_data
+
+    with stage("rules"):
+        rule_data, confidence = extract_invoice(text)
+    if confidence >= RULES_MIN_CONFIDENCE:
+        log.debug("Rule-based extraction accepted (confidence %s)", confidence)
+        await run_blocking(receipt_cache.set, "ai", text_hash, rule_data)
+        return rule_data
+
+    try:
+        with stage("llm"):
+            response = await llm.acomplete(build_extraction_prompt(text))
+        data = parse_extraction_response(response.text)
+        await run_blocking(receipt_cache.set, "ai", text_hash, data)
+        return data
+    except Exception as e:
+        log.error("AI Processing Error: %s", e)
+        return extraction_fallback(text, rule_data)
+
+
+async def run_bill_pipeline(file_paths):
+    ocr_timings = {}
+    extracted_text = await run_blocking(flask_backend.extract_text_from_image, file_paths, ocr_timings, executor=ocr_executor)
+
+    if not extracted_text:
+        return {"error": "Text extraction failed"}, 400
+
+    # Fetch the captcha concurrently with the LLM if the text has an uncached GSTIN
+    gst_match = CONSTANTS.GST_REGEX.search(extracted_text)
+    captcha_task = None
+    if gst_match and not await gstin_cache.get(gst_match.group(0)):
+        captcha_task = asyncio.ensure_future(get_gst_captcha_data())
+
+    ai_data = await process_text_with_ai(extracted_text)
+
+    cached_gst = await gstin_cache.get(ai_data.get('gst_number'))
+    captcha_data = None
+    if not cached_gst and ai_data.get('gst_number'):
+        captcha_data = await captcha_task if captcha_task else await get_gst_captcha_data()
+    elif captcha_task:
+        captcha_task.cancel()
+
+    return bill_response(ai_data, ocr_timings, cached_gst, captcha_data), 200
+
+
+@quart_app.route('/api/process-bill', methods=['POST'])
+@jwt_required
+async def process_bill():
+    user_id = get_jwt_identity()
+    request_files = await request.files
+
+    if 'file' not in request_files:
+        return jsonify({"error": "No file uploaded"}), 400
+
+    uploads = [file for file in request_files.getlist('file') if file.filename != '']
+    if not uploads:
+        return jsonify({"error": "No file selected"}), 400
+    files = [(file.filename, file.read()) for file in uploads]
+
+    if request.args.get("async") in ("1", "true"):
+        try:
+            job_id = flask_backend.bill_jobs.submit(user_id, {"files": files})
+        except UserLimitError as e:
+            return jsonify({"error": str(e)}), 429
+        except QueueFullError as e:
+            return jsonify({"error": str(e)}), 503, {"Retry-After": "5"}
+        return jsonify({"success": True, "job_id": job_id, "status": "queued"}), 202
+
+    try:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_paths = save_uploads(files, temp_dir)
+            response_data, status = await run_bill_pipeline(file_paths)
+            return jsonify(response_data), status
+
+    except Exception as e:
+        log.exception("Process Bill Error: %s", e)
+        return jsonify({"error": "Processing failed"}), 500
+
+
+async def geocode(address):
+    with stage("geocode"):
+        return await geocoder.geocode(address)
+
+
+@quart_app.route("/api/validate-gst", methods=["POST"])
+@jwt_required
+async def validate_gst():
+    user_id = get_jwt_identity()
+    data = await request.get_json()
+
+    gst_number = (data.get("gst_number") or "").upper()
+    captcha = data.get("captcha")
+    captcha_cookie = data.get("captcha_cookie")
+    ai_data = data.get("ai_data") or {}
+
+    if not gst_number:
+        return jsonify({"error": "Missing required fields"}), 400
+
+    cached = await gstin_cache.get(gst_number)
+    if not cached and not all([captcha, captcha_cookie]):
+        return jsonify({"error": "Missing required fields"}), 400
+
+    async def fetch_gst_details():
+        gst_data, error = await validate_gst_with_govt(gst_number, captcha, captcha_cookie)
+        if error:
+            return None, error
+        govt_address = gst_data.get("pradr", {}).get("adr", "")
+        return gst_details_from(gst_data, await geocode(govt_address) if govt_address else None), None
+
+    gst_details, error = (cached, None) if cached else await gstin_cache.lookup(gst_number, fetch_gst_details)
+    if error:
+        return jsonify({"error": error}), 400
+
+    gst_data = gst_details["gst_data"]
+    address = gst_details.get("address") or ai_data.get("address")
+    location_data = gst_details.get("location")
+    if not gst_details.get("address") and address:
+        location_data = await geocode(address)
+
+    if ai_data:
+        expense = build_expense(user_id, gst_number, ai_data, address, location_data)
+        await db.expenses.insert_one(expense)
+        await apply_expense_async(db.monthly_rollups, expense)
+        chat_context_cache.invalidate(user_id)
+        analytics_cache.add_expense(expense)
+        await data_versions.abump(user_id, bump_data_version)
+
+    return jsonify({
+        "success": True,
+        "gst_data": gst_data,
+        "location_data": location_data,
+        "expense_saved": bool(ai_data)
+    })
+
+
+async def find_user(user_id):
+    return await db.users.find_one({"_id": user_id}, PROFILE_FIELDS)
+
+
+async def find_data_version(user_id):
+    return await db.data_versions.find_one({"_id": user_id})
+
+
+async def bump_data_version(user_id, update):
+    return await db.data_versions.find_one_and_update(
+        {"_id": user_id}, update, upsert=True, return_document=ReturnDocument.AFTER
+    )
+
+
+@quart_app.route("/api/dashboard", methods=["GET"])
+@jwt_required
+async def get_dashboard():
+    user_id = get_jwt_identity()
+    view = dashboard_validators(user_id, await data_versions.aget(user_id, find_data_version))
+    if is_not_modified(request.headers, *view):
+        return Response(b"", status=304, headers=cache_headers(*view))
+    user, rollup, recent = await asyncio.gather(
+        user_cache.aget(user_id, find_user),
+        get_rollup_async(db.monthly_rollups, user_id),
+        recent_expenses_async(db.expenses, user_id)
+    )
+    body, headers = encode_json(dashboard_response(user, rollup, recent), request.headers, *view)
+    return Response(body, mimetype="application/json", headers=headers)
+
+
+async def build_financial_context(user_id):
+    user, rollup = await asyncio.gather(
+        user_cache.aget(user_id, find_user),
+        get_rollup_async(db.monthly_rollups, user_id)
+    )
+    # The analytics ledger is loaded with pymongo, so a cold load runs in the executor
+    analytics = await run_blocking(lambda: analytics_cache.get(user_id, income=user.get("income", 0)))
+    return format_financial_context(user, rollup, analytics)
+
+
+@quart_app.route("/api/chat/assistant", methods=["POST"])
+@jwt_required
+async def chat_assistant():
+    user_id = get_jwt_identity()
+    data = await request.get_json()
+    message = data.get("message", "")
+
+    if not message:
+        return jsonify({"error": "Message required"}), 400
+
+    context = await chat_context_cache.aget(user_id, build_financial_context)
+    prompt = build_chat_prompt(context, message)
+
+    if request.args.get("stream") in ("1", "true") or data.get("stream"):
+        fmt = "ndjson" if request.args.get("format") == "ndjson" else "sse"
+        return Response(
+            astream_completion(llm, prompt, fmt),
+            mimetype="application/x-ndjson" if fmt == "ndjson" else "text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+
+    try:
+        with stage("llm"):
+            response = await llm.acomplete(prompt)
+        return jsonify({
+            "response": response.text,
+            "timestamp": datetime.utcnow().isoformat()
+        })
+    except Exception as e:
+        log.error("Error in chat assistant: %s", e)
+        return jsonify({"error": "Failed to get response from assistant"}), 500
+
+
+class Dispatcher:
+    """Send the async routes to Quart and everything else to the Flask app."""
+
+    def __init__(self, async_app, wsgi_app):
+        self.async_app = async_app
+        self.wsgi_app = wsgi_app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan" or (
+            scope["type"] == "http" and scope["method"] != "OPTIONS" and scope["path"] in ASYNC_PATHS
+        ):
+            await self.async_app(scope, receive, send)
+        else:
+            await self.wsgi_app(scope, receive, send)
+
+
+application = Dispatcher(quart_app, WSGIMiddleware(flask_app, workers=int(os.getenv("WSGI_THREADS", 32))))
@@ -0,0 +1,105 @@
+# Benchmark the columnar analytics against the same statistics computed with
+# Python loops over expense documents (the way get_dashboard sums categories).
+# Documents come from synthetic_data.py and never touch Mongo, so only the
+# computation is measured; both implementations are checked to agree.
+# Usage: python bench_analytics.py [--sizes 1000 10000 100000] [--months 6]
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from analytics import TOP_MERCHANTS, Ledger, month_index, summarize
+from synthetic_data import make_expense, make_merchants
+
+
+def loop_summary(docs, now, months):
+    current = month_index(now)
+    first = current - months + 1
+    monthly = [0.0] * months
+    counts = [0] * months
+    categories = {}
+    merchants = {}
+    for doc in docs:
+        created_at = doc.get("created_at")
+        if not isinstance(created_at, datetime) or not first <= month_index(created_at) <= current:
+            continue
+        slot = month_index(created_at) - first
+        amount = float(doc.get("total_amount") or 0)
+        monthly[slot] += amount
+        counts[slot] += 1
+        name = doc.get("store_name") or "Unknown"
+        spend, count = merchants.get(name, (0.0, 0))
+        merchants[name] = (spend + amount, count + 1)
+        for item in doc.get("items") or []:
+            series = categories.setdefault(item.get("category") or "Other", [0.0] * months)
+            series[slot] += float(item.get("price") or 0)
+    top = sorted(merchants.items(), key=lambda entry: -entry[1][0])[:TOP_MERCHANTS]
+    return monthly, counts, categories, top
+
+
+def make_documents(count, months, seed=42):
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    merchants = make_merchants(rng, 200)
+    regulars = rng.sample(merchants, 25)
+    window = timedelta(days=30 * months * 2).total_seconds()
+    return [
+        make_expense(rng, "bench-user", rng.choice(regulars), now - timedelta(seconds=rng.uniform(0, window)))
+        for _ in range(count)
+    ]
+
+
+def timed(fn, repeat):
+    samples = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return samples[len(samples) // 2], result
+
+
+def check(loop_result, columnar):
+    monthly, counts, categories, top = loop_result
+    assert np.allclose(monthly, columnar["monthly_totals"], atol=0.01 * len(monthly))
+    assert counts == columnar["monthly_counts"]
+    for category, series in categories.items():
+        if any(series):
+            assert np.allclose(series, columnar["categories"][category], atol=0.05)
+    assert [name for name, _ in top] == [merchant["store_name"] for merchant in columnar["top_merchants"]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Columnar analytics vs Python loops")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--months", type=int, default=6)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    now = datetime.utcnow()
+    print(f"{'expenses':>10} {'python loop':>14} {'ledger build':>14} {'summarize':>14} {'append+summ.':>14}")
+    for size in args.sizes:
+        docs = make_documents(size, args.months)
+        loop_seconds, loop_result = timed(lambda: loop_summary(docs, now, args.months), args.repeat)
+        # Cold: what a cache miss pays on top of the Mongo read
+        build_seconds, ledger = timed(lambda: Ledger.from_documents(docs), args.repeat)
+        ledger.arrays()
+        summarize_seconds, columnar = timed(lambda: summarize(ledger, now, args.months), args.repeat)
+        check(loop_result, columnar)
+
+        # Warm: a new expense arrives and the summary is recomputed from the cached ledger
+        extra = make_documents(args.repeat, 1, seed=7)
+        appended = iter(extra)
+        append_seconds, _ = timed(
+            lambda: (ledger.append(next(appended)), summarize(ledger, now, args.months)), args.repeat
+        )
+        print(f"{size:>10} " + " ".join(
+            f"{seconds * 1000:>11.2f} ms" for seconds in (loop_seconds, build_seconds, summarize_seconds, append_seconds)
+        ))
+
+
+if __name__ == "__main__":
+    main()
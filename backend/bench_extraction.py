@@ -0,0 +1,205 @@
+# Benchmark the rule-based invoice extractor: field accuracy and latency.
+# Accuracy is measured on real bills: the images in --bills are OCRed and
+# compared with the hand-labelled fields in their labels.json. Only a
+# labelled bill can be scored; unlabelled ones just report confidence.
+# --smoke also renders receipts from ../expenses.json (plus generated
+# variants) in the layouts the extractor was written against. That score is a
+# regression smoke test of the parser, not an accuracy estimate.
+# Usage: python bench_extraction.py [--bills ../bills] [--labels labels.json] [--smoke [--variants 500]]
+#        [--threshold 0.85]
+import argparse
+import json
+import os
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from extractor import extract_invoice, gstin_check_char
+
+FIELDS = ["gst_number", "total_amount", "store_name", "date", "items"]
+# Item lists are not labelled for the real bills
+LABELLED_FIELDS = ["gst_number", "total_amount", "store_name", "date"]
+STORES = [
+    ("SRI KRISHNA SWEETS", "12, Gandhi Road, T Nagar,", "Chennai 600017", "33AABCS1429B1ZX"),
+    ("RELIANCE DIGITAL", "Phoenix Mall, LBS Marg,", "Mumbai 400070", "27AAACR5055K1Z7"),
+    ("APOLLO PHARMACY", "Banjara Hills Road No 1,", "Hyderabad 500034", "36AADCA0230C1ZQ"),
+]
+ITEMS = [
+    ("Masala Dosa", "Food"), ("Filter Coffee", "Food"), ("Paneer Butter Masala", "Food"),
+    ("USB Charger", "Electronics"), ("Earphones", "Electronics"), ("Cotton Shirt", "Clothing"),
+    ("Paracetamol Tablet", "Healthcare"), ("Cough Syrup", "Healthcare"), ("Petrol", "Transportation"),
+]
+DATE_FORMATS = ["%d/%m/%Y", "%d-%m-%Y", "%d.%m.%y", "%d %b %Y", "%Y-%m-%d"]
+
+
+def gstin_with_checksum(prefix):
+    # Recompute the check character so generated GSTINs are valid
+    return prefix[:14] + gstin_check_char(prefix)
+
+
+def load_expenses(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"Could not load {path}: {e}")
+        return []
+
+
+def generate_expenses(count, seed=42):
+    rng = random.Random(seed)
+    start = datetime(2023, 1, 1)
+    expenses = []
+    for _ in range(count):
+        store, street, city, gstin = rng.choice(STORES)
+        items = [
+            {"name": name, "price": round(rng.uniform(20, 900), 2), "category": category}
+            for name, category in rng.sample(ITEMS, rng.randint(1, 4))
+        ]
+        subtotal = sum(item["price"] for item in items)
+        expenses.append({
+            "gst_number": gstin_with_checksum(gstin),
+            "store_name": store,
+            "address": f"{street} {city}",
+            "items": items,
+            "total_amount": round(subtotal * 1.05, 2),
+            "date": (start + timedelta(days=rng.randint(0, 700))).strftime("%Y-%m-%d"),
+        })
+    return expenses
+
+
+def render_receipt(expense, rng):
+    date = datetime.strptime(expense["date"], "%Y-%m-%d").strftime(rng.choice(DATE_FORMATS))
+    subtotal = sum(item["price"] for item in expense["items"])
+    lines = ["TAX INVOICE", expense["store_name"]]
+    lines += [part.strip() for part in expense.get("address", "").rsplit(",", 1)]
+    lines += [f"GSTIN: {expense['gst_number']}", f"Bill No: {rng.randint(100, 9999)}   Date: {date}"]
+    lines += [f"{item['name']:<24} 1 {item['price']:>10.2f}" for item in expense["items"]]
+    lines += [
+        f"Sub Total {subtotal:>14.2f}",
+        f"CGST {(expense['total_amount'] - subtotal) / 2:>14.2f}",
+        f"SGST {(expense['total_amount'] - subtotal) / 2:>14.2f}",
+        f"{rng.choice(['Grand Total', 'Net Payable', 'Total Amount'])} Rs. {expense['total_amount']:.2f}",
+        "Thank you, visit again",
+    ]
+    return "\n".join(lines)
+
+
+def field_matches(field, expected, actual):
+    if field == "total_amount":
+        return actual is not None and abs(float(expected) - actual) < 0.01
+    if field == "store_name":
+        # Labels may accept several spellings of the store
+        names = expected if isinstance(expected, list) else [expected]
+        return bool(actual) and actual.upper() in {name.upper() for name in names}
+    if field == "items":
+        return sorted(round(item["price"], 2) for item in actual) == sorted(round(item["price"], 2) for item in expected)
+    return expected == actual
+
+
+def bench_synthetic(expenses, threshold, seed=7):
+    rng = random.Random(seed)
+    correct = {field: 0 for field in FIELDS}
+    timings = []
+    accepted = accepted_correct = 0
+    for expense in expenses:
+        text = render_receipt(expense, rng)
+        start = time.perf_counter()
+        data, confidence = extract_invoice(text)
+        timings.append(time.perf_counter() - start)
+
+        matches = {field: field_matches(field, expense[field], data[field]) for field in FIELDS}
+        for field, ok in matches.items():
+            correct[field] += ok
+        if confidence >= threshold:
+            accepted += 1
+            accepted_correct += all(matches.values())
+
+    count = len(expenses)
+    print(f"\nSmoke test, {count} synthetic receipts (rendered in the extractor's own layouts; not an accuracy estimate)")
+    for field in FIELDS:
+        print(f"  {field:<14} accuracy {correct[field] / count:7.1%}")
+    report_latency(timings)
+    print(f"  skip LLM       {accepted / count:7.1%} (confidence >= {threshold})")
+    if accepted:
+        print(f"  accepted fully correct {accepted_correct / accepted:7.1%}")
+
+
+def bench_bills(directory, labels, threshold):
+    """OCR the bills in `directory` and score the fields against `labels` ({file name: fields})."""
+    from ocr import OCREngine
+
+    paths = sorted(
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if name.lower().endswith((".jpg", ".jpeg", ".png", ".pdf"))
+    )
+    engine = OCREngine(workers=1)
+    timings = []
+    correct = {field: 0 for field in LABELLED_FIELDS}
+    labelled = accepted = accepted_labelled = accepted_correct = 0
+    print(f"\nReal bills: {len(paths)} ({sum(os.path.basename(path) in labels for path in paths)} labelled)")
+    try:
+        for path in paths:
+            text = engine.extract([path])
+            start = time.perf_counter()
+            data, confidence = extract_invoice(text)
+            timings.append(time.perf_counter() - start)
+            accepted += confidence >= threshold
+
+            expected = labels.get(os.path.basename(path))
+            misses = ""
+            if expected:
+                labelled += 1
+                matches = {field: field_matches(field, expected[field], data[field])
+                           for field in LABELLED_FIELDS if field in expected}
+                for field, ok in matches.items():
+                    correct[field] += ok
+                if confidence >= threshold:
+                    accepted_labelled += 1
+                    accepted_correct += all(matches.values())
+                misses = " wrong: " + (", ".join(field for field, ok in matches.items() if not ok) or "none")
+            print(f"  {os.path.basename(path):<12} confidence {confidence:.2f} "
+                  f"total={data['total_amount']} gst={data['gst_number']} date={data['date']}{misses}")
+    finally:
+        engine.close()
+    if not paths:
+        return
+    if labelled:
+        for field in LABELLED_FIELDS:
+            print(f"  {field:<14} accuracy {correct[field] / labelled:7.1%}")
+    report_latency(timings)
+    print(f"  skip LLM       {accepted / len(paths):7.1%} (confidence >= {threshold})")
+    if accepted_labelled:
+        print(f"  accepted fully correct {accepted_correct / accepted_labelled:7.1%} of {accepted_labelled} labelled")
+
+
+def load_labels(path):
+    if not os.path.exists(path):
+        print(f"No labels at {path}; real bills are OCRed but not scored")
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def report_latency(timings):
+    timings = sorted(timings)
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    print(f"  latency        mean {statistics.mean(timings) * 1000:.3f} ms, p95 {p95 * 1000:.3f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark rule-based invoice extraction")
+    parser.add_argument("--bills", default=os.path.join("..", "bills"), help="Directory of bill images to OCR")
+    parser.add_argument("--labels", help="Expected fields per bill file name (default: BILLS/labels.json)")
+    parser.add_argument("--smoke", action="store_true", help="Also run the synthetic-receipt smoke test")
+    parser.add_argument("--expenses", default=os.path.join("..", "expenses.json"))
+    parser.add_argument("--variants", type=int, default=500, help="Generated receipts on top of expenses.json")
+    parser.add_argument("--threshold", type=float, default=float(os.getenv("RULES_MIN_CONFIDENCE", 0.85)))
+    args = parser.parse_args()
+
+    if args.bills:
+        bench_bills(args.bills, load_labels(args.labels or os.path.join(args.bills, "labels.json")), args.threshold)
+    if args.smoke:
+        expenses = [expense for expense in load_expenses(args.expenses) if expense.get("date")]
+        bench_synthetic(expenses + generate_expenses(args.variants), args.threshold)
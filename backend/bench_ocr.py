@@ -0,0 +1,76 @@
+# Benchmark raw Tesseract against the preprocessing OCR engine on the sample bills.
+# Usage: python bench_ocr.py [bills_dir] [--workers N]
+import argparse
+import os
+import time
+
+import pytesseract
+from PIL import Image
+
+from ocr import OCREngine
+
+
+def bench_raw(paths):
+    latencies = []
+    for path in paths:
+        start = time.perf_counter()
+        pytesseract.image_to_string(Image.open(path))
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def bench_engine(engine, paths):
+    latencies = []
+    stage_totals = {}
+    for path in paths:
+        timings = {}
+        start = time.perf_counter()
+        engine.extract(path, timings)
+        latencies.append(time.perf_counter() - start)
+        for stage, seconds in timings.items():
+            if stage != "pages":
+                stage_totals[stage] = stage_totals.get(stage, 0.0) + seconds
+    return latencies, stage_totals
+
+
+def report(name, latencies, batch_seconds, count):
+    print(f"{name}:")
+    for path_latency in latencies:
+        print(f"  {path_latency * 1000:8.1f} ms")
+    print(f"  mean latency: {sum(latencies) / len(latencies) * 1000:.1f} ms")
+    print(f"  batch throughput: {count / batch_seconds:.2f} receipts/sec")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("bills_dir", nargs="?", default=os.path.join(os.path.dirname(__file__), "..", "bills"))
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    paths = sorted(
+        os.path.join(args.bills_dir, name)
+        for name in os.listdir(args.bills_dir)
+        if name.lower().endswith((".jpg", ".jpeg", ".png", ".pdf"))
+    )
+    print(f"{len(paths)} bills, {args.workers} workers, {os.cpu_count()} cores")
+
+    raw = bench_raw(paths)
+    report("raw pytesseract", raw, sum(raw), len(paths))
+
+    engine = OCREngine(workers=args.workers)
+    latencies, stages = bench_engine(engine, paths)
+
+    # All bills as pages of one batch exercises the process pool
+    start = time.perf_counter()
+    engine.extract(paths)
+    batch = time.perf_counter() - start
+    engine.close()
+
+    report("ocr engine", latencies, batch, len(paths))
+    print("  per-stage totals:")
+    for stage, seconds in sorted(stages.items(), key=lambda x: x[1], reverse=True):
+        print(f"    {stage:<12} {seconds * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
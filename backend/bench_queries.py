@@ -0,0 +1,94 @@
+# Benchmark month-summary strategies: Python loop vs aggregation pipeline vs rollup read.
+# Uses a scratch database so real data is never touched.
+# Usage: python bench_queries.py [--sizes 10000 100000 1000000] [--mongo-uri URI] [--mock]
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from queries import ensure_indexes, summarize_expenses
+from rollups import get_rollup, rebuild
+
+CATEGORIES = ["Food", "Electronics", "Clothing", "Utilities", "Transportation", "Healthcare", "Entertainment", "Other"]
+USER_ID = "bench-user"
+
+
+def seed(db, count, batch_size=10000):
+    db.expenses.delete_many({"user_id": USER_ID})
+    now = datetime.utcnow()
+    for start in range(0, count, batch_size):
+        batch = []
+        for _ in range(min(batch_size, count - start)):
+            items = [
+                {"name": f"item{j}", "price": round(random.uniform(10, 500), 2), "category": random.choice(CATEGORIES)}
+                for j in range(random.randint(1, 5))
+            ]
+            batch.append({
+                "user_id": USER_ID,
+                "store_name": f"Store {random.randint(1, 200)}",
+                "total_amount": sum(item["price"] for item in items),
+                "items": items,
+                "created_at": now - timedelta(days=random.randint(0, 365))
+            })
+        db.expenses.insert_many(batch, ordered=False)
+
+
+def python_loop(db, since):
+    # The original get_dashboard implementation
+    expenses = list(db.expenses.find({"user_id": USER_ID, "created_at": {"$gte": since}}))
+    total_spent = sum(expense.get("total_amount", 0) for expense in expenses)
+    category_totals = {}
+    for expense in expenses:
+        for item in expense.get("items", []):
+            category = item.get("category", "Other")
+            category_totals[category] = category_totals.get(category, 0) + float(item.get("price", 0))
+    return total_spent, category_totals
+
+
+def pipeline(db, since):
+    return summarize_expenses(db.expenses, {"user_id": USER_ID, "created_at": {"$gte": since}})
+
+
+def rollup_read(db, since):
+    return get_rollup(db.monthly_rollups, USER_ID)
+
+
+def timed(fn, *args, repeat=5):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return samples[len(samples) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--mongo-uri", default="mongodb://localhost:27017/")
+    parser.add_argument("--mock", action="store_true", help="Use mongomock instead of a local mongod")
+    args = parser.parse_args()
+
+    if args.mock:
+        import mongomock
+        client = mongomock.MongoClient()
+    else:
+        from pymongo import MongoClient
+        client = MongoClient(args.mongo_uri)
+    db = client.expense_tracker_bench
+    ensure_indexes(db)
+
+    since = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    print(f"{'expenses':>10} {'python loop':>14} {'pipeline':>14} {'rollup':>14}")
+    for size in args.sizes:
+        seed(db, size)
+        rebuild(db.expenses, db.monthly_rollups, USER_ID)
+        results = [timed(fn, db, since) for fn in (python_loop, pipeline, rollup_read)]
+        print(f"{size:>10} " + " ".join(f"{seconds * 1000:>11.2f} ms" for seconds in results))
+
+    client.drop_database("expense_tracker_bench")
+
+
+if __name__ == "__main__":
+    main()
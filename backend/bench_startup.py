@@ -0,0 +1,178 @@
+# Cold-start and worker-recycle benchmark for the Flask app.
+# Every measurement runs in a fresh interpreter: the import of app.py and
+# create_app(), then the first and second request to routes that initialize a
+# lazy resource (Mongo on /api/user, the spam model and phishing index on the
+# spam check). --forks
+# simulates a pre-forking server: a parent imports the app with and without
+# PRELOAD_ASSETS and forks workers that each serve one spam check, so the
+# first-request latency and private memory per worker show what preloading
+# saves. --profile lists the slowest imports from python -X importtime.
+# Usage: python bench_startup.py --mock [--runs 5] [--forks 4] [--profile]
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+SPAM_BODY = {"messages": ["You have won a prize, claim at http://example.com/win", "Lunch at 1?"]}
+# (name, method, path, body)
+PROBES = [
+    ("user", "GET", "/api/user", None),
+    ("spam_check", "POST", "/api/chat/spam-check", SPAM_BODY),
+    ("metrics", "GET", "/metrics", None),
+]
+
+
+def elapsed_ms(start):
+    return round((time.perf_counter() - start) * 1000, 1)
+
+
+def use_mongomock():
+    import mongomock
+    import pymongo
+    pymongo.MongoClient = mongomock.MongoClient
+
+
+def memory_mb():
+    """Private and proportional (PSS) memory of this process, from /proc (Linux only)."""
+    fields = {}
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == "kB":
+                    fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    except OSError:
+        return {}
+    return {
+        "private_mb": round(fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0), 1),
+        "pss_mb": round(fields.get("Pss", 0), 1)
+    }
+
+
+def measure_process(mock):
+    start = time.perf_counter()
+    if mock:
+        use_mongomock()
+    import app as backend
+    from flask_jwt_extended import create_access_token
+
+    application = backend.create_app()
+    result = {"import_ms": elapsed_ms(start)}
+    client = application.test_client()
+    with application.app_context():
+        headers = {"Authorization": "Bearer " + create_access_token(identity="startup-bench")}
+    for name, method, path, body in PROBES:
+        for attempt in ("first", "second"):
+            t0 = time.perf_counter()
+            client.open(path, method=method, json=body, headers=headers)
+            result[f"{name}_{attempt}_ms"] = elapsed_ms(t0)
+    result["ready_ms"] = elapsed_ms(start)
+    return result
+
+
+def measure_forks(mock, forks):
+    if mock:
+        use_mongomock()
+    start = time.perf_counter()
+    import app as backend
+    # Like a gunicorn master: PRELOAD_ASSETS decides whether create_app() preloads
+    application = backend.create_app()
+    result = {"parent_import_ms": elapsed_ms(start), "workers": []}
+
+    for _ in range(forks):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            t0 = time.perf_counter()
+            application.test_client().post("/api/chat/spam-check", json=SPAM_BODY)
+            row = {"first_request_ms": elapsed_ms(t0), **memory_mb()}
+            os.write(write_fd, json.dumps(row).encode())
+            os._exit(0)
+        os.close(write_fd)
+        with os.fdopen(read_fd) as f:
+            result["workers"].append(json.loads(f.read()))
+        os.waitpid(pid, 0)
+    return result
+
+
+def run_child(args, extra_env=None):
+    env = dict(os.environ, LLM_BACKEND="stub", LOG_LEVEL="WARNING", PYTHONWARNINGS="ignore", **(extra_env or {}))
+    completed = subprocess.run(
+        [sys.executable, os.path.abspath(__file__)] + args, capture_output=True, text=True, env=env,
+        cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    if completed.returncode:
+        raise SystemExit(f"Child failed:\n{completed.stderr}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def import_profile(top):
+    """Self time per top-level package and the slowest modules (cumulative), from -X importtime."""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"], capture_output=True, text=True,
+        env=dict(os.environ, LLM_BACKEND="stub", LOG_LEVEL="WARNING", PYTHONWARNINGS="ignore"),
+        cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    packages, modules = {}, []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        package = name.split(".")[0]
+        packages[package] = packages.get(package, 0) + int(self_us)
+        modules.append((int(cumulative_us), name))
+    total = max(modules)[0] if modules else 0
+
+    print(f"\nImport profile of app.py: {total / 1000:.0f} ms")
+    print(f"{'package (self time)':<40} {'ms':>8}")
+    for package, self_us in sorted(packages.items(), key=lambda entry: -entry[1])[:top]:
+        print(f"{package:<40} {self_us / 1000:>8.1f}")
+    print(f"\n{'module (cumulative)':<40} {'ms':>8}")
+    for cumulative_us, name in sorted(modules, reverse=True)[:top]:
+        print(f"{name:<40} {cumulative_us / 1000:>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="App import, first-request and forked-worker startup times")
+    parser.add_argument("--mock", action="store_true", help="Use mongomock instead of MONGO_URI")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh processes to take the median over")
+    parser.add_argument("--forks", type=int, default=4, help="Workers forked per preload mode (0 to skip)")
+    parser.add_argument("--profile", action="store_true", help="Also print an import-time profile")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--child", choices=["process", "forks"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child == "process":
+        print(json.dumps(measure_process(args.mock)))
+        return
+    if args.child == "forks":
+        print(json.dumps(measure_forks(args.mock, args.forks)))
+        return
+
+    mock = ["--mock"] if args.mock else []
+    runs = [run_child(["--child", "process"] + mock) for _ in range(args.runs)]
+    print(f"Cold start, median of {args.runs} fresh processes")
+    for key in runs[0]:
+        print(f"  {key:<24} {statistics.median(run[key] for run in runs):>9.1f} ms")
+
+    if args.forks and hasattr(os, "fork"):
+        print(f"\nForked workers ({args.forks} per mode): first spam check and memory per worker")
+        print(f"  {'mode':<12} {'parent import':>14} {'first req ms':>13} {'private MB':>11} {'PSS MB':>8}")
+        for mode, preload in (("lazy", "0"), ("preloaded", "1")):
+            result = run_child(["--child", "forks", "--forks", str(args.forks)] + mock, {"PRELOAD_ASSETS": preload})
+            workers = result["workers"]
+            print(f"  {mode:<12} {result['parent_import_ms']:>11.1f} ms "
+                  f"{statistics.median(w['first_request_ms'] for w in workers):>13.1f} "
+                  f"{statistics.median(w.get('private_mb', 0) for w in workers):>11.1f} "
+                  f"{statistics.median(w.get('pss_mb', 0) for w in workers):>8.1f}")
+
+    if args.profile:
+        import_profile(args.top)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,326 @@
+# Benchmark suite for the hot API paths, run in-process against local stubs.
+# The LLM is the stub backend, and the GST portal and photon are served by a
+# local HTTP server, so runs are reproducible offline. Data comes from
+# synthetic_data.py; each benchmark reports req/s and p50/p95/p99. Results
+# can be saved and compared with a previous run, which exits non-zero on a
+# regression.
+# Usage: python bench_suite.py --mock [--users 50 --expenses 200]
+#        python synthetic_data.py --drop && python bench_suite.py --db expense_tracker_bench
+#        python bench_suite.py --mock --save base.json ... python bench_suite.py --mock --baseline base.json
+import argparse
+import io
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from bench_extraction import generate_expenses, render_receipt
+from loadtest import percentile
+from synthetic_data import generate, make_gstin
+
+BENCHMARKS = ["dashboard", "map_data", "chat_context", "chat_assistant", "check_spam", "process_bill", "validate_gst"]
+SPAM_MESSAGES = [
+    "Congratulations! You've won Rs 10,00,000. Click http://fake-bank.com/login to claim",
+    "Your order #4521 has been shipped and will arrive tomorrow",
+    "URGENT: your KYC is pending, account will be blocked. Verify at https://phishing-site.net/verify",
+    "Meeting moved to 3 PM, see you there",
+    "Get a personal loan at 0% interest, reply YES now!",
+    "Your electricity bill of Rs 1,240 is due on 15th",
+]
+# A 1x1 PNG is enough for the captcha round-trip
+CAPTCHA_PNG = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d49444154789c6360606060000000050001a5f645400000000049454e44ae426082"
+)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """GST portal (captcha + taxpayer search) and photon, with a fixed latency."""
+
+    latency = 0.0
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        url = urlparse(self.path)
+        if url.path == "/services/captcha":
+            self._send(200, CAPTCHA_PNG, "image/png", {"Set-Cookie": "CaptchaCookie=bench-cookie; Path=/"})
+        elif url.path == "/api/":
+            query = parse_qs(url.query).get("q", [""])[0]
+            # Deterministic coordinates per address, inside India
+            seed = random.Random(query)
+            self._json({"type": "FeatureCollection", "features": [{
+                "geometry": {"type": "Point", "coordinates": [seed.uniform(72, 88), seed.uniform(12, 28)]},
+                "properties": {"name": query.split(",")[0]}
+            }]})
+        else:
+            self._send(404, b"", "text/plain")
+
+    def do_POST(self):
+        time.sleep(self.latency)
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if urlparse(self.path).path == "/services/api/search/taxpayerDetails":
+            gstin = body.get("gstin", "")
+            self._json({
+                "gstin": gstin,
+                "tradeNam": f"BENCH TRADERS {gstin[-5:]}",
+                "sts": "Active",
+                "pradr": {"adr": f"Shop {gstin[2:5]}, Main Road, Pune, Maharashtra, 411001"}
+            })
+        else:
+            self._send(404, b"", "text/plain")
+
+    def _json(self, data):
+        self._send(200, json.dumps(data).encode(), "application/json")
+
+    def _send(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server(latency):
+    handler = type("BenchStubHandler", (StubHandler,), {"latency": latency})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def render_receipt_image(text):
+    from PIL import Image, ImageDraw
+
+    lines = text.splitlines()
+    image = Image.new("L", (420, 16 * len(lines) + 20), 255)
+    draw = ImageDraw.Draw(image)
+    for index, line in enumerate(lines):
+        draw.text((10, 10 + 16 * index), line, fill=0)
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def run_benchmark(call, requests, concurrency):
+    """Run call(i) for i in range(requests) on `concurrency` threads; call returns True on success."""
+    def timed(index):
+        start = time.perf_counter()
+        try:
+            ok = call(index)
+        except Exception as e:
+            print(f"  request {index} failed: {e}")
+            ok = False
+        return ok, time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(timed, range(requests)))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(seconds for ok, seconds in results if ok)
+    return {
+        "requests": requests,
+        "errors": sum(not ok for ok, _ in results),
+        "rps": len(latencies) / elapsed if elapsed else 0,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+    }
+
+
+class Suite:
+    def __init__(self, backend, users, requests, concurrency):
+        self.backend = backend
+        self.app = backend.create_app()
+        self.users = users
+        self.requests = requests
+        self.concurrency = concurrency
+        with self.app.app_context():
+            from flask_jwt_extended import create_access_token
+            self.tokens = [
+                {"Authorization": f"Bearer {create_access_token(identity=user['_id'])}"} for user in users
+            ]
+        self.receipts = generate_expenses(requests, seed=1234)
+
+    def headers(self, index):
+        return self.tokens[index % len(self.tokens)]
+
+    def user_id(self, index):
+        return self.users[index % len(self.users)]["_id"]
+
+    def client(self):
+        return self.app.test_client()
+
+    def dashboard(self, index):
+        return self.client().get("/api/dashboard", headers=self.headers(index)).status_code == 200
+
+    def map_data(self, index):
+        return self.client().get("/api/map-data", headers=self.headers(index)).status_code == 200
+
+    def chat_context(self, index):
+        # The uncached build: user + rollup reads and prompt formatting
+        return bool(self.backend.build_financial_context(self.user_id(index)))
+
+    def chat_assistant(self, index):
+        # Distinct messages so the LLM gateway cannot coalesce them
+        response = self.client().post(
+            "/api/chat/assistant", json={"message": f"How much did I spend on food? #{index}"}, headers=self.headers(index)
+        )
+        return response.status_code == 200
+
+    def check_spam(self, index):
+        rng = random.Random(index)
+        messages = [rng.choice(SPAM_MESSAGES) + f" ref {rng.randint(1, 10 ** 6)}" for _ in range(20)]
+        return self.client().post("/api/chat/spam-check", json={"messages": messages}).status_code == 200
+
+    def prepare_process_bill(self):
+        # Every upload is a distinct receipt, so neither the OCR nor the AI cache hits
+        from cache import hash_files
+
+        rng = random.Random(99)
+        texts = [render_receipt(expense, rng) for expense in self.receipts]
+        self.images = [render_receipt_image(text) for text in texts]
+        tesseract = shutil.which("tesseract")
+        if tesseract:
+            self.backend.ocr_engine.tesseract_cmd = tesseract
+            return None
+        # Without Tesseract the OCR text is pre-seeded, so the rest of the pipeline is still measured
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for index, (text, image) in enumerate(zip(texts, self.images)):
+                path = os.path.join(temp_dir, f"{index}.png")
+                with open(path, "wb") as f:
+                    f.write(image)
+                self.backend.receipt_cache.set("ocr", hash_files([path]), text)
+        return "tesseract not found; OCR text served from the receipt cache"
+
+    def process_bill(self, index):
+        response = self.client().post(
+            "/api/process-bill",
+            data={"file": (io.BytesIO(self.images[index]), f"receipt_{index}.png")},
+            headers=self.headers(index),
+            content_type="multipart/form-data"
+        )
+        return response.status_code == 200
+
+    def validate_gst(self, index):
+        # Fresh GSTINs miss the cache: portal validation plus a photon geocode
+        expense = self.receipts[index]
+        response = self.client().post("/api/validate-gst", json={
+            "gst_number": make_gstin(random.Random(index), "27"),
+            "captcha": "123456",
+            "captcha_cookie": "bench-cookie",
+            "ai_data": {key: expense[key] for key in ("store_name", "total_amount", "items", "date", "address")}
+        }, headers=self.headers(index))
+        return response.status_code == 200
+
+    def run(self, names):
+        results = {}
+        for name in names:
+            note = self.prepare_process_bill() if name == "process_bill" else None
+            if note:
+                print(f"  note: {note}")
+            results[name] = run_benchmark(getattr(self, name), self.requests, self.concurrency)
+            print_result(name, results[name])
+        return results
+
+
+def ms(seconds):
+    return f"{seconds * 1000:9.2f}" if seconds is not None else "        -"
+
+
+def print_result(name, result, flag=""):
+    print(f"{name:<15} {result['requests']:>6} {result['errors']:>5} {result['rps']:>9.1f} "
+          f"{ms(result['p50'])} {ms(result['p95'])} {ms(result['p99'])} {flag}")
+
+
+def compare(results, baseline, tolerance):
+    """Return the benchmarks whose p95 or throughput got worse than `tolerance` allows."""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base or result["p95"] is None or base["p95"] is None:
+            continue
+        if result["p95"] > base["p95"] * (1 + tolerance) or result["rps"] < base["rps"] * (1 - tolerance):
+            regressions.append(name)
+        print(f"{name:<15} p95 {ms(base['p95'])} -> {ms(result['p95'])} ms, "
+              f"req/s {base['rps']:.1f} -> {result['rps']:.1f}{'  REGRESSION' if name in regressions else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the API hot paths against local upstream stubs")
+    parser.add_argument("--only", nargs="+", choices=BENCHMARKS, default=BENCHMARKS)
+    parser.add_argument("--requests", type=int, default=200, help="Requests per benchmark")
+    parser.add_argument("--concurrency", type=int, help="Worker threads (default 8, or 1 with --mock)")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Seconds the stub LLM takes per call")
+    parser.add_argument("--upstream-latency", type=float, default=0.0, help="Seconds the GST/photon stubs take")
+    parser.add_argument("--mongo-uri", default="mongodb://localhost:27017/")
+    parser.add_argument("--db", default="expense_tracker_bench", help="Database filled by synthetic_data.py")
+    parser.add_argument("--mock", action="store_true", help="Use mongomock and generate the data in-process")
+    parser.add_argument("--users", type=int, default=50, help="Users to generate with --mock")
+    parser.add_argument("--expenses", type=int, default=200, help="Expenses per user to generate with --mock")
+    parser.add_argument("--save", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="Compare with results saved by an earlier --save")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown before flagging a regression")
+    args = parser.parse_args()
+    # mongomock is not thread-safe, so mock runs are sequential unless asked otherwise
+    args.concurrency = args.concurrency or (1 if args.mock else 8)
+
+    stub = start_stub_server(args.upstream_latency)
+    stub_url = f"http://127.0.0.1:{stub.server_address[1]}"
+    # app.py reads these at import time
+    os.environ.update({
+        "LLM_BACKEND": "stub",
+        "LLM_STUB_LATENCY": str(args.llm_latency),
+        "GST_PORTAL_URL": stub_url,
+        "PHOTON_URL": f"{stub_url}/api/",
+        "MONGO_URI": args.mongo_uri,
+        "MONGO_DB": args.db,
+        # Load the spam model up front instead of inside the first timed request
+        "PRELOAD_ASSETS": "1",
+    })
+    if args.mock:
+        import mongomock
+        import pymongo
+        pymongo.MongoClient = mongomock.MongoClient
+
+    import app as backend
+
+    if args.mock:
+        start = time.perf_counter()
+        users = generate(backend.db, args.users, args.expenses)
+        print(f"Generated {len(users)} users / {backend.expenses_collection.count_documents({})} expenses "
+              f"in {time.perf_counter() - start:.1f}s")
+    else:
+        users = list(backend.users_collection.find({}, {"_id": 1}).limit(1000))
+        if not users:
+            parser.error(f"No users in {args.db}; run synthetic_data.py first or pass --mock")
+
+    print(f"\n{'benchmark':<15} {'reqs':>6} {'err':>5} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    results = Suite(backend, users, args.requests, args.concurrency).run(args.only)
+    stub.shutdown()
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print(f"\nCompared with {args.baseline} (tolerance {args.tolerance:.0%})")
+        if compare(results, baseline, args.tolerance):
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
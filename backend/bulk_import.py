@@ -0,0 +1,300 @@
+# Bulk receipt import for onboarding historical receipts.
+# Zip members are read one at a time (never extracted as a whole), deduped by
+# content hash, OCRed in a worker pool and written with ordered insert_many
+# batches. Progress lives in an import checkpoint document, so an interrupted
+# import can be resumed by running it again with the same import id.
+# Usage: python bulk_import.py --user USER_ID receipts.zip [more files] [--import-id ID]
+import argparse
+import logging
+import os
+import tempfile
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from cache import hash_bytes
+from mapdata import to_geojson
+from rollups import apply_expense, normalize_items
+
+log = logging.getLogger(__name__)
+
+RECEIPT_EXTENSIONS = (".jpg", ".jpeg", ".png", ".pdf")
+MAX_MEMBER_BYTES = 20 * 1024 * 1024
+MAX_ERRORS = 100
+
+
+def receipt_datetime(value):
+    """Parse an extracted YYYY-MM-DD date; None when it is missing, malformed or in the future."""
+    try:
+        parsed = datetime.strptime(str(value)[:10], "%Y-%m-%d")
+    except (TypeError, ValueError):
+        return None
+    return parsed if parsed <= datetime.utcnow() else None
+
+
+def iter_sources(paths):
+    """Yield (name, size, read) for every receipt in the given zips and files.
+
+    The order is deterministic so checkpoint positions stay valid on resume.
+    """
+    for path in paths:
+        if zipfile.is_zipfile(path):
+            with zipfile.ZipFile(path) as archive:
+                members = sorted(
+                    (info for info in archive.infolist()
+                     if not info.is_dir() and info.filename.lower().endswith(RECEIPT_EXTENSIONS)
+                     and not os.path.basename(info.filename).startswith(".")),
+                    key=lambda info: info.filename
+                )
+                for info in members:
+                    yield info.filename, info.file_size, lambda info=info: archive.read(info)
+        elif path.lower().endswith(RECEIPT_EXTENSIONS):
+            def read(path=path):
+                with open(path, "rb") as f:
+                    return f.read()
+            yield os.path.basename(path), os.path.getsize(path), read
+
+
+class BulkImporter:
+    def __init__(self, expenses, rollups, checkpoints, ocr, extract, gst_lookup=None,
+                 workers=4, batch_size=50, on_batch=None):
+        self.expenses = expenses
+        self.rollups = rollups
+        self.checkpoints = checkpoints
+        # ocr(path) -> text, extract(text) -> ai_data in the process_text_with_ai shape
+        self.ocr = ocr
+        self.extract = extract
+        self.gst_lookup = gst_lookup
+        self.workers = workers
+        self.batch_size = batch_size
+        self.on_batch = on_batch
+
+    def create(self, user_id, source=None, import_id=None):
+        """Return the checkpoint for `import_id`, creating a new import if needed."""
+        if import_id:
+            checkpoint = self.checkpoints.find_one({"_id": import_id, "user_id": user_id})
+            if checkpoint:
+                return checkpoint
+        now = datetime.utcnow()
+        checkpoint = {
+            "_id": import_id or str(uuid.uuid4()),
+            "user_id": user_id,
+            "source": source,
+            "status": "pending",
+            "position": 0,
+            "counts": {"seen": 0, "imported": 0, "duplicates": 0, "failed": 0},
+            "errors": [],
+            "created_at": now,
+            "updated_at": now
+        }
+        self.checkpoints.insert_one(checkpoint)
+        return checkpoint
+
+    def progress(self, import_id, user_id):
+        checkpoint = self.checkpoints.find_one({"_id": import_id, "user_id": user_id})
+        if not checkpoint:
+            return None
+        checkpoint["import_id"] = checkpoint.pop("_id")
+        for key in ("created_at", "updated_at", "finished_at"):
+            if checkpoint.get(key):
+                checkpoint[key] = checkpoint[key].isoformat()
+        return checkpoint
+
+    def run(self, import_id, user_id, paths, progress=None):
+        checkpoint = self.checkpoints.find_one({"_id": import_id, "user_id": user_id})
+        if not checkpoint:
+            raise ValueError(f"Unknown import {import_id}")
+        self._update(import_id, {"status": "running", "error": None})
+
+        position = checkpoint["position"]
+        counts = dict(checkpoint["counts"])
+        seen = set()
+        batch = []
+        index = position - 1
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="import") as pool:
+                for index, source in enumerate(iter_sources(paths)):
+                    # Members before the checkpoint were committed by an earlier run
+                    if index < position:
+                        continue
+                    # Read while the archive is still open; oversized members are never loaded
+                    name, size, read = source
+                    batch.append((name, read() if size <= MAX_MEMBER_BYTES else None))
+                    if len(batch) >= self.batch_size:
+                        self._run_batch(pool, import_id, user_id, batch, index + 1, counts, seen)
+                        batch = []
+                        if progress:
+                            progress(counts)
+                if batch:
+                    self._run_batch(pool, import_id, user_id, batch, index + 1, counts, seen)
+                    if progress:
+                        progress(counts)
+        except Exception as e:
+            log.warning("Bulk import %s failed: %s", import_id, e)
+            self._update(import_id, {"status": "failed", "error": str(e)})
+            raise
+
+        self._update(import_id, {"status": "done", "finished_at": datetime.utcnow()})
+        return counts
+
+    def _run_batch(self, pool, import_id, user_id, batch, next_position, counts, seen):
+        counts["seen"] += len(batch)
+        errors = []
+
+        # Hash first so duplicates never reach Tesseract or the LLM
+        pending = []
+        for name, data in batch:
+            if data is None:
+                errors.append({"name": name, "error": "File too large"})
+                continue
+            digest = hash_bytes(data)
+            if digest in seen:
+                counts["duplicates"] += 1
+                continue
+            seen.add(digest)
+            pending.append((name, digest, data))
+
+        existing = set()
+        if pending:
+            existing = {
+                doc["source_hash"] for doc in self.expenses.find(
+                    {"user_id": user_id, "source_hash": {"$in": [digest for _, digest, _ in pending]}},
+                    {"source_hash": 1}
+                )
+            }
+        counts["duplicates"] += sum(digest in existing for _, digest, _ in pending)
+        pending = [entry for entry in pending if entry[1] not in existing]
+
+        # map() keeps results in archive order so inserts stay ordered
+        docs = []
+        for (name, digest, _), (ai_data, error) in zip(pending, pool.map(self._process, pending)):
+            if error:
+                errors.append({"name": name, "error": error})
+                continue
+            docs.append(self._expense(user_id, import_id, name, digest, ai_data))
+
+        if docs:
+            try:
+                self.expenses.insert_many(docs, ordered=True)
+                inserted = docs
+            except BulkWriteError as e:
+                # Ordered inserts stop at the first failure; everything before it is stored
+                inserted = docs[:e.details.get("nInserted", 0)]
+                for doc in docs[len(inserted):]:
+                    errors.append({"name": doc["source_name"], "error": "Insert failed"})
+            for doc in inserted:
+                apply_expense(self.rollups, doc)
+            counts["imported"] += len(inserted)
+            if inserted and self.on_batch:
+                self.on_batch(user_id)
+
+        counts["failed"] += len(errors)
+        self._update(import_id, {"position": next_position, "counts": counts}, errors)
+
+    def _process(self, entry):
+        name, _, data = entry
+        suffix = os.path.splitext(name)[1].lower()
+        try:
+            # Only the receipts currently being OCRed touch the disk
+            with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as f:
+                f.write(data)
+            try:
+                text = self.ocr(f.name)
+            finally:
+                os.unlink(f.name)
+            if not text:
+                return None, "Text extraction failed"
+            ai_data = self.extract(text)
+            if ai_data.get("total_amount") is None:
+                return None, "No total found"
+            return ai_data, None
+        except Exception as e:
+            log.warning("Bulk import error on %s: %s", name, e)
+            return None, "Processing failed"
+
+    def _expense(self, user_id, import_id, name, digest, ai_data):
+        gst_number = (ai_data.get("gst_number") or "").upper() or None
+        # Only already-validated GSTINs are used; there is no captcha in a bulk import
+        gst_details = self.gst_lookup(gst_number) if gst_number and self.gst_lookup else None
+        address = (gst_details or {}).get("address") or ai_data.get("address")
+        location = (gst_details or {}).get("location")
+        # Historical receipts belong to the month they were issued in, for the rollups too
+        created_at = receipt_datetime(ai_data.get("date")) or datetime.utcnow()
+        expense = {
+            "user_id": user_id,
+            "gst_number": gst_number,
+            "store_name": ai_data.get("store_name") or "",
+            "total_amount": float(ai_data["total_amount"]),
+            "items": normalize_items(ai_data.get("items")),
+            "date": ai_data.get("date") or created_at.isoformat(),
+            "address": address,
+            # Left as None for geocoding.py to fill in, to keep imports off the geocoder
+            "location": location,
+            "source_name": name,
+            "source_hash": digest,
+            "import_id": import_id,
+            "created_at": created_at
+        }
+        geo = to_geojson(location)
+        if geo:
+            expense["geo"] = geo
+        return expense
+
+    def _update(self, import_id, fields, errors=None):
+        update = {"$set": dict(fields, updated_at=datetime.utcnow())}
+        if errors:
+            update["$push"] = {"errors": {"$each": errors, "$slice": -MAX_ERRORS}}
+        try:
+            self.checkpoints.update_one({"_id": import_id}, update)
+        except PyMongoError as e:
+            log.warning("Import checkpoint error: %s", e)
+
+
+if __name__ == "__main__":
+    from pymongo import MongoClient
+
+    from responses import DataVersions
+
+    parser = argparse.ArgumentParser(description="Bulk import receipt images, PDFs or zips of them")
+    parser.add_argument("paths", nargs="+")
+    parser.add_argument("--user", required=True, help="User id the expenses belong to")
+    parser.add_argument("--import-id", help="Resume this import instead of starting a new one")
+    parser.add_argument("--mongo-uri", default="mongodb://localhost:27017/")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--rules-only", action="store_true", help="Use the rule-based extractor without the LLM")
+    args = parser.parse_args()
+
+    db = MongoClient(args.mongo_uri).expense_tracker
+    if args.rules_only:
+        from extractor import extract_invoice
+        from ocr import OCREngine
+
+        engine = OCREngine(workers=1)
+        ocr, extract = engine.extract, lambda text: extract_invoice(text)[0]
+        gst_lookup = None
+    else:
+        # Reuse the server's OCR/AI caches and LLM gateway
+        from app import extract_text_from_image, gstin_cache, process_text_with_ai
+        ocr, extract, gst_lookup = extract_text_from_image, process_text_with_ai, gstin_cache.get
+
+    # Like the server route: every stored batch bumps the user's data version, so
+    # dashboard and map clients revalidate; the servers' other per-user caches
+    # follow within their TTLs
+    importer = BulkImporter(db.expenses, db.monthly_rollups, db.imports, ocr, extract, gst_lookup,
+                            workers=args.workers, batch_size=args.batch_size,
+                            on_batch=DataVersions(db.data_versions).bump)
+    checkpoint = importer.create(args.user, ", ".join(os.path.basename(path) for path in args.paths), args.import_id)
+    print(f"Import {checkpoint['_id']} (resume with --import-id {checkpoint['_id']})")
+
+    counts = importer.run(
+        checkpoint["_id"], args.user, args.paths,
+        progress=lambda counts: print(
+            f"  seen {counts['seen']}, imported {counts['imported']}, "
+            f"duplicates {counts['duplicates']}, failed {counts['failed']}"
+        )
+    )
+    print(f"Done: {counts}")
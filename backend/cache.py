@@ -0,0 +1,133 @@
+# Content-addressed cache for OCR text and AI extraction results.
+# Entries live in a small in-process LRU in front of a Mongo collection, so a
+# re-uploaded receipt skips both Tesseract and the LLM.
+import copy
+import hashlib
+import logging
+import re
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from pymongo.errors import PyMongoError
+
+log = logging.getLogger(__name__)
+
+
+def hash_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hash_files(paths):
+    if isinstance(paths, str):
+        return hash_file(paths)
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(hash_file(path).encode("ascii"))
+    return digest.hexdigest()
+
+
+def hash_text(text):
+    # Normalize whitespace and case so trivial OCR differences share an entry
+    normalized = re.sub(r"\s+", " ", text or "").strip().lower()
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+class ReceiptCache:
+    def __init__(self, collection=None, max_entries=1024, ttl=timedelta(days=30)):
+        self.collection = collection
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = {}
+        self.misses = {}
+        # Created with the first write, so constructing the cache never touches Mongo
+        self._indexed = False
+
+    def get(self, kind, digest):
+        key = f"{kind}:{digest}"
+        now = datetime.utcnow()
+
+        with self._lock:
+            entry = self._lru.get(key)
+            if entry and now - entry[1] < self.ttl:
+                self._lru.move_to_end(key)
+                self._count(self.hits, kind)
+                return copy.deepcopy(entry[0])
+            if entry:
+                del self._lru[key]
+
+        doc = None
+        if self.collection is not None:
+            try:
+                doc = self.collection.find_one({"_id": key})
+            except PyMongoError as e:
+                log.warning("Cache read error: %s", e)
+
+        with self._lock:
+            if doc and now - doc["created_at"] < self.ttl:
+                self._remember(key, copy.deepcopy(doc["value"]), doc["created_at"])
+                self._count(self.hits, kind)
+                return doc["value"]
+            self._count(self.misses, kind)
+            return None
+
+    def set(self, kind, digest, value):
+        key = f"{kind}:{digest}"
+        now = datetime.utcnow()
+
+        with self._lock:
+            self._remember(key, copy.deepcopy(value), now)
+
+        if self.collection is not None:
+            self._ensure_index()
+            try:
+                self.collection.replace_one(
+                    {"_id": key},
+                    {"_id": key, "kind": kind, "value": value, "created_at": now},
+                    upsert=True
+                )
+            except PyMongoError as e:
+                log.warning("Cache write error: %s", e)
+
+    def stats(self):
+        with self._lock:
+            kinds = set(self.hits) | set(self.misses)
+            result = {"entries": len(self._lru)}
+            for kind in kinds:
+                hits = self.hits.get(kind, 0)
+                misses = self.misses.get(kind, 0)
+                result[kind] = {
+                    "hits": hits,
+                    "misses": misses,
+                    "hit_rate": hits / (hits + misses) if hits + misses else 0.0
+                }
+            return result
+
+    def _ensure_index(self):
+        if self._indexed:
+            return
+        self._indexed = True
+        try:
+            # Mongo removes expired documents itself via the TTL index
+            self.collection.create_index("created_at", expireAfterSeconds=int(self.ttl.total_seconds()))
+        except PyMongoError as e:
+            log.warning("Cache index error: %s", e)
+
+    def _remember(self, key, value, created_at):
+        self._lru[key] = (value, created_at)
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+
+    def _count(self, counter, kind):
+        counter[kind] = counter.get(kind, 0) + 1
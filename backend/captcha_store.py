@@ -0,0 +1,74 @@
+# Bounded, expiring in-memory store for GST captcha images.
+# Captchas are only useful for a few minutes, so they never touch the disk;
+# a reaper thread drops expired entries and the size cap bounds memory.
+import base64
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+
+class CaptchaStore:
+    def __init__(self, ttl=300, max_entries=1000, reap_interval=30, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.reap_interval = reap_interval
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._reaper = None
+
+    def put(self, image, content_type="image/png"):
+        # Random ids cannot collide under concurrency the way captcha_NNNN.png did
+        captcha_id = secrets.token_urlsafe(16)
+        with self._lock:
+            self._entries[captcha_id] = (image, content_type, self.clock() + self.ttl)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        self._start_reaper()
+        return captcha_id
+
+    def get(self, captcha_id):
+        """Return (image, content_type, seconds_left) or None if missing/expired."""
+        with self._lock:
+            entry = self._entries.get(captcha_id)
+            if not entry:
+                return None
+            image, content_type, expires_at = entry
+            seconds_left = expires_at - self.clock()
+            if seconds_left <= 0:
+                del self._entries[captcha_id]
+                return None
+            return image, content_type, seconds_left
+
+    def data_uri(self, captcha_id):
+        entry = self.get(captcha_id)
+        if not entry:
+            return None
+        image, content_type, _ = entry
+        return f"data:{content_type};base64,{base64.b64encode(image).decode('ascii')}"
+
+    def reap(self):
+        now = self.clock()
+        with self._lock:
+            expired = [key for key, (_, _, expires_at) in self._entries.items() if expires_at <= now]
+            for key in expired:
+                del self._entries[key]
+        return len(expired)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _start_reaper(self):
+        if self._reaper and self._reaper.is_alive():
+            return
+        with self._lock:
+            if self._reaper and self._reaper.is_alive():
+                return
+            self._reaper = threading.Thread(target=self._reap_forever, name="captcha-reaper", daemon=True)
+            self._reaper.start()
+
+    def _reap_forever(self):
+        while True:
+            time.sleep(self.reap_interval)
+            self.reap()
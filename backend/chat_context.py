@@ -0,0 +1,105 @@
+# Per-user cache of the chat assistant's financial context.
+# The context string is built once per user and reused across chat turns
+# until an expense write invalidates it (or it ages out, which bounds
+# staleness for writes handled by other worker processes). Reusing the
+# exact same string also keeps the prompt prefix byte-identical between
+# turns, which is what upstream prompt caching keys on.
+#
+# Limitation: this saves the Mongo work of building the context, not the
+# upload. The completion API has no way to reference an earlier prefix by
+# id, so every turn still sends the full context and the provider bills its
+# tokens. A provider with automatic prefix caching can only reuse its work.
+#
+# Invalidation versions come from one counter and are kept for at most
+# max_entries users. An evicted user falls back to the highest evicted
+# version, so a build that raced with an invalidation is still never stored.
+import threading
+import time
+from collections import OrderedDict
+
+
+class SnapshotCache:
+    def __init__(self, build, ttl=60, max_entries=10000):
+        self.build = build
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._versions = OrderedDict()
+        self._generation = 0
+        self._evicted_version = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.build_seconds = 0.0
+        self.prompt_chars = 0
+
+    def get(self, user_id):
+        now = time.monotonic()
+        version, context = self._lookup(user_id, now)
+        if context is not None:
+            return context
+
+        start = time.perf_counter()
+        context = self.build(user_id)
+        self._store(user_id, version, context, now, time.perf_counter() - start)
+        return context
+
+    async def aget(self, user_id, build):
+        """Like get(), but with a coroutine `build` for the async server."""
+        now = time.monotonic()
+        version, context = self._lookup(user_id, now)
+        if context is not None:
+            return context
+
+        start = time.perf_counter()
+        context = await build(user_id)
+        self._store(user_id, version, context, now, time.perf_counter() - start)
+        return context
+
+    def _lookup(self, user_id, now):
+        with self._lock:
+            version = self._versions.get(user_id, self._evicted_version)
+            entry = self._entries.get(user_id)
+            if entry and entry["version"] == version and now - entry["built_at"] < self.ttl:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return version, entry["context"]
+            return version, None
+
+    def _store(self, user_id, version, context, now, elapsed):
+        with self._lock:
+            self.misses += 1
+            self.build_seconds += elapsed
+            self.prompt_chars += len(context)
+            # Skip storing if an invalidation raced with the build
+            if self._versions.get(user_id, self._evicted_version) == version:
+                self._entries[user_id] = {"context": context, "version": version, "built_at": now}
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._generation += 1
+            self._versions[user_id] = self._generation
+            self._versions.move_to_end(user_id)
+            while len(self._versions) > self.max_entries:
+                _, evicted = self._versions.popitem(last=False)
+                self._evicted_version = max(self._evicted_version, evicted)
+            self._entries.pop(user_id, None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            avg_build = self.build_seconds / self.misses if self.misses else 0.0
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "avg_build_ms": avg_build * 1000,
+                # Each hit skips one build's worth of DB round-trips
+                "db_ms_saved": avg_build * self.hits * 1000,
+                "avg_context_chars": self.prompt_chars / self.misses if self.misses else 0,
+                "entries": len(self._entries),
+                "tracked_versions": len(self._versions)
+            }
@@ -0,0 +1,181 @@
+# Deterministic invoice extractor that runs before the LLM.
+# Precompiled patterns pull out the GSTIN (checksum-validated), total, date,
+# line items and merchant name, and a confidence score decides whether the
+# LLM round-trip is needed at all.
+import re
+from datetime import datetime
+
+GSTIN_CHARS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+GSTIN_REGEX = re.compile(r"\b[0-9]{2}[A-Z]{5}[0-9]{4}[A-Z][1-9A-Z]Z[0-9A-Z]\b", re.IGNORECASE)
+
+AMOUNT = r"(?:rs\.?|inr|₹|\$)?\s*([0-9]{1,3}(?:,[0-9]{2,3})+(?:\.[0-9]{1,2})?|[0-9]+(?:\.[0-9]{1,2})?)"
+# Checked in order: the first label that matches wins
+TOTAL_PATTERNS = [
+    re.compile(r"\b(?:grand\s*total|net\s*payable|amount\s*payable|total\s*payable|net\s*amount|bill\s*amount)\b[^0-9\n]*" + AMOUNT, re.IGNORECASE),
+    re.compile(r"\btotal(?:\s*amount)?\b[^0-9\n]*" + AMOUNT, re.IGNORECASE),
+]
+NON_ITEM_REGEX = re.compile(
+    r"\b(?:sub\s*total|total|payable|net\s*amount|amount\s*due|tax|gst|cgst|sgst|igst|vat|cess|discount|round(?:ing)?\s*off|change|cash|card|upi|paid|"
+    r"balance|invoice|bill\s*no|date|time|phone|tel|mob|gstin|fssai|thank)\b",
+    re.IGNORECASE
+)
+ITEM_REGEX = re.compile(r"^(?P<name>[A-Za-z][A-Za-z0-9 &'().,/-]{1,60}?)\s+(?:(?P<qty>[0-9]+(?:\.[0-9]+)?)\s*(?:x|@|nos|pcs|qty)?\s+)?(?:[0-9.,]+\s+)?" + AMOUNT + r"\s*$", re.IGNORECASE)
+
+MONTHS = "jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec"
+DATE_PATTERNS = [
+    (re.compile(r"\b([0-3]?[0-9])[/.-]([01]?[0-9])[/.-]((?:19|20)[0-9]{2})\b"), ("%d", "%m", "%Y")),
+    (re.compile(r"\b([0-3]?[0-9])[/.-]([01]?[0-9])[/.-]([0-9]{2})\b"), ("%d", "%m", "%y")),
+    (re.compile(r"\b((?:19|20)[0-9]{2})-([01][0-9])-([0-3][0-9])\b"), ("%Y", "%m", "%d")),
+    (re.compile(r"\b([0-3]?[0-9])[\s-]*(" + MONTHS + r")[a-z]*[\s,-]*((?:19|20)?[0-9]{2})\b", re.IGNORECASE), ("%d", "%b", "%Y")),
+    (re.compile(r"\b(" + MONTHS + r")[a-z]*\s+([0-3]?[0-9]),?\s+((?:19|20)[0-9]{2})\b", re.IGNORECASE), ("%b", "%d", "%Y")),
+]
+PIN_REGEX = re.compile(r"\b[1-9][0-9]{5}\b")
+MERCHANT_SKIP_REGEX = re.compile(r"\b(?:tax\s*invoice|invoice|receipt|bill|cash\s*memo|gstin|welcome|original|duplicate|copy)\b", re.IGNORECASE)
+
+CATEGORY_KEYWORDS = {
+    "Food": ["rice", "dal", "milk", "bread", "paneer", "chicken", "biryani", "pizza", "burger", "coffee", "tea", "juice", "meal", "thali", "dosa", "idli", "snack", "restaurant", "cafe", "sweets", "grocery", "atta", "oil", "sugar"],
+    "Electronics": ["phone", "mobile", "laptop", "charger", "cable", "earphone", "headphone", "tv", "battery", "usb", "adapter", "electronic"],
+    "Clothing": ["shirt", "tshirt", "t-shirt", "jeans", "trouser", "saree", "kurta", "dress", "shoe", "sock", "jacket", "apparel"],
+    "Utilities": ["electricity", "water", "gas", "internet", "broadband", "recharge", "bill payment"],
+    "Transportation": ["petrol", "diesel", "fuel", "cng", "car", "bike", "taxi", "cab", "toll", "parking", "tyre", "motors"],
+    "Healthcare": ["tablet", "capsule", "syrup", "medicine", "pharma", "clinic", "hospital", "mg", "ointment"],
+    "Entertainment": ["movie", "ticket", "cinema", "game", "pvr", "inox", "concert"],
+}
+CATEGORY_REGEXES = [
+    (category, re.compile(r"\b(?:" + "|".join(re.escape(word) for word in words) + r")", re.IGNORECASE))
+    for category, words in CATEGORY_KEYWORDS.items()
+]
+
+WEIGHTS = {"total": 0.35, "gst_number": 0.2, "store_name": 0.15, "date": 0.1, "items": 0.2}
+
+
+def gstin_check_char(gstin):
+    # Mod-36 checksum over the first 14 characters
+    total = 0
+    for i, ch in enumerate(gstin[:14]):
+        product = GSTIN_CHARS.index(ch) * (2 if i % 2 else 1)
+        total += product // 36 + product % 36
+    return GSTIN_CHARS[(36 - total % 36) % 36]
+
+
+def valid_gstin(gstin):
+    gstin = gstin.upper()
+    if len(gstin) != 15 or any(ch not in GSTIN_CHARS for ch in gstin):
+        return False
+    return gstin_check_char(gstin) == gstin[14]
+
+
+def parse_amount(value):
+    return float(value.replace(",", ""))
+
+
+def find_gstin(text):
+    candidates = [match.group(0).upper() for match in GSTIN_REGEX.finditer(text)]
+    for candidate in candidates:
+        if valid_gstin(candidate):
+            return candidate, True
+    return (candidates[0], False) if candidates else (None, False)
+
+
+def find_total(lines):
+    for pattern in TOTAL_PATTERNS:
+        # Totals sit at the bottom; the last labelled line is the final amount
+        for line in reversed(lines):
+            match = pattern.search(line)
+            if match and not re.search(r"\bsub\s*total\b", line, re.IGNORECASE):
+                return parse_amount(match.group(1))
+    return None
+
+
+def find_date(text):
+    for pattern, order in DATE_PATTERNS:
+        for match in pattern.finditer(text):
+            parts = dict(zip(order, match.groups()))
+            day, year = parts["%d"], parts.get("%Y") or parts.get("%y")
+            month = parts.get("%m") or parts["%b"][:3].title()
+            year_format = "%Y" if len(year) == 4 else "%y"
+            month_format = "%m" if "%m" in parts else "%b"
+            try:
+                parsed = datetime.strptime(f"{day} {month} {year}", f"%d {month_format} {year_format}")
+            except ValueError:
+                continue
+            return parsed.strftime("%Y-%m-%d")
+    return None
+
+
+def categorize(name):
+    for category, regex in CATEGORY_REGEXES:
+        if regex.search(name):
+            return category
+    return "Other"
+
+
+def find_items(lines, skip=()):
+    items = []
+    for line in lines:
+        if line in skip or NON_ITEM_REGEX.search(line):
+            continue
+        match = ITEM_REGEX.match(line)
+        if not match:
+            continue
+        name = match.group("name").strip(" .-")
+        if len(name) < 2:
+            continue
+        items.append({"name": name, "price": parse_amount(match.group(match.lastindex)), "category": categorize(name)})
+    return items
+
+
+def find_merchant(lines):
+    for line in lines[:6]:
+        letters = sum(ch.isalpha() for ch in line)
+        if letters < 3 or letters < len(line) * 0.5 or MERCHANT_SKIP_REGEX.search(line) or GSTIN_REGEX.search(line):
+            continue
+        return line.strip()
+    return None
+
+
+def find_address_lines(lines, merchant):
+    for index, line in enumerate(lines[:12]):
+        if PIN_REGEX.search(line) and not GSTIN_REGEX.search(line):
+            # The address block runs from just below the merchant name to the PIN line
+            if merchant in lines[:index]:
+                start = max(lines.index(merchant) + 1, index - 2)
+            else:
+                start = index - 1 if index > 0 and "," in lines[index - 1] else index
+            return lines[start:index + 1]
+    return []
+
+
+def extract_invoice(text):
+    """Return (data, confidence) with data in the same shape as the LLM output."""
+    lines = [line.strip() for line in (text or "").splitlines() if line.strip()]
+    gst_number, gst_valid = find_gstin(text or "")
+    total = find_total(lines)
+    store_name = find_merchant(lines)
+    address_lines = find_address_lines(lines, store_name)
+    items = find_items(lines, skip=address_lines)
+
+    data = {
+        "gst_number": gst_number if gst_valid else None,
+        "total_amount": total,
+        "store_name": store_name,
+        "date": find_date(text or ""),
+        "address": ", ".join(line.strip(" ,") for line in address_lines) or None,
+        "items": items
+    }
+
+    score = 0.0
+    if total is not None:
+        score += WEIGHTS["total"]
+    if gst_valid:
+        score += WEIGHTS["gst_number"]
+    if store_name:
+        score += WEIGHTS["store_name"]
+    if data["date"]:
+        score += WEIGHTS["date"]
+    if items and total:
+        # Items only count when they roughly add up to the total (tax aside)
+        item_sum = sum(item["price"] for item in items)
+        if 0.8 * total <= item_sum <= 1.02 * total:
+            score += WEIGHTS["items"]
+    return data, round(score, 2)
@@ -0,0 +1,248 @@
+# Geocoding with a persistent cache and backlog batching.
+# Addresses are normalized before lookup so trivially different spellings
+# share one cache entry; "not found" answers are cached too (for less time).
+# The backlog job backs off expenses whose address did not resolve, so they
+# are retried after a day, then two, four... instead of on every run. Upstream
+# failures (timeouts, rate limits) are neither cached nor backed off.
+# Geocode the backlog: python geocoding.py [--limit N] [--mongo-uri URI]
+import argparse
+import logging
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from pymongo.errors import PyMongoError
+
+from http_client import http_client
+from mapdata import to_geojson
+
+log = logging.getLogger(__name__)
+
+PHOTON_URL = os.getenv("PHOTON_URL", "https://photon.komoot.io/api/")
+BACKLOG_RETRY_BASE = timedelta(days=1)
+BACKLOG_RETRY_MAX = timedelta(days=30)
+# geocode_many's marker for an address whose lookup failed upstream
+_FAILED = object()
+
+
+def normalize_address(address):
+    address = re.sub(r"\s+", " ", address or "").strip().lower()
+    address = re.sub(r"\s*,\s*", ", ", address)
+    return re.sub(r"(, )+", ", ", address).strip(", ")
+
+
+class GeocodingError(Exception):
+    """The geocoding service failed to answer (as opposed to finding nothing)."""
+
+
+class Geocoder:
+    def __init__(self, collection=None, client=None, base_url=None,
+                 ttl=timedelta(days=90), negative_ttl=timedelta(days=1)):
+        self.collection = collection
+        self.client = client or http_client
+        # Pluggable upstream so tests can point at a local stub server
+        self.base_url = base_url or PHOTON_URL
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+
+    def geocode(self, address):
+        """Return the location of `address`, or None if it is unknown or the lookup failed."""
+        try:
+            return self.lookup(address)
+        except GeocodingError as e:
+            log.warning("Geocoding error: %s", e)
+            return None
+
+    def lookup(self, address):
+        """Like geocode(), but raise GeocodingError when the upstream fails."""
+        key = normalize_address(address)
+        if not key:
+            return None
+
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached["location"]
+
+        try:
+            location = self._fetch(key)
+        except Exception as e:
+            # Upstream failures are not cached; the next call retries
+            raise GeocodingError(str(e)) from e
+
+        self._cache_put(key, location)
+        return location
+
+    def geocode_many(self, addresses, workers=4):
+        """Geocode distinct addresses concurrently; returns {address: location}.
+
+        Addresses whose lookup failed upstream are left out, so callers retry them later.
+        """
+        unique = list(dict.fromkeys(address for address in addresses if address))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = dict(zip(unique, pool.map(self._lookup_or_failed, unique)))
+        return {address: location for address, location in results.items() if location is not _FAILED}
+
+    def _lookup_or_failed(self, address):
+        try:
+            return self.lookup(address)
+        except GeocodingError as e:
+            log.warning("Geocoding error: %s", e)
+            return _FAILED
+
+    def _fetch(self, address):
+        response = self.client.get(self.base_url, params={"q": address, "limit": 1})
+        response.raise_for_status()
+        return parse_photon(response.json())
+
+    def _cache_get(self, key):
+        if self.collection is None:
+            return None
+        try:
+            doc = self.collection.find_one({"_id": key})
+        except PyMongoError as e:
+            log.warning("Geocode cache read error: %s", e)
+            return None
+        return doc if self._is_fresh(doc) else None
+
+    def _is_fresh(self, doc):
+        if not doc:
+            return False
+        ttl = self.ttl if doc.get("location") else self.negative_ttl
+        return datetime.utcnow() - doc["updated_at"] <= ttl
+
+    def _cache_put(self, key, location):
+        if self.collection is None:
+            return
+        try:
+            self.collection.replace_one(
+                {"_id": key},
+                {"_id": key, "location": location, "updated_at": datetime.utcnow()},
+                upsert=True
+            )
+        except PyMongoError as e:
+            log.warning("Geocode cache write error: %s", e)
+
+
+class AsyncGeocoder(Geocoder):
+    """Geocoder for the async server: motor collection and an httpx.AsyncClient."""
+
+    async def geocode(self, address):
+        try:
+            return await self.lookup(address)
+        except GeocodingError as e:
+            log.warning("Geocoding error: %s", e)
+            return None
+
+    async def lookup(self, address):
+        key = normalize_address(address)
+        if not key:
+            return None
+
+        cached = await self._cache_get(key)
+        if cached is not None:
+            return cached["location"]
+
+        try:
+            response = await self.client.get(self.base_url, params={"q": key, "limit": 1})
+            response.raise_for_status()
+            location = parse_photon(response.json())
+        except Exception as e:
+            raise GeocodingError(str(e)) from e
+
+        await self._cache_put(key, location)
+        return location
+
+    async def _cache_get(self, key):
+        if self.collection is None:
+            return None
+        try:
+            doc = await self.collection.find_one({"_id": key})
+        except PyMongoError as e:
+            log.warning("Geocode cache read error: %s", e)
+            return None
+        return doc if self._is_fresh(doc) else None
+
+    async def _cache_put(self, key, location):
+        if self.collection is None:
+            return
+        try:
+            await self.collection.replace_one(
+                {"_id": key},
+                {"_id": key, "location": location, "updated_at": datetime.utcnow()},
+                upsert=True
+            )
+        except PyMongoError as e:
+            log.warning("Geocode cache write error: %s", e)
+
+
+def parse_photon(data):
+    if data.get("features"):
+        coords = data["features"][0]["geometry"]["coordinates"]
+        return {
+            "lat": coords[1],
+            "lon": coords[0],
+            "display_name": data["features"][0]["properties"].get("name")
+        }
+    return None
+
+
+def retry_delay(attempts):
+    return min(BACKLOG_RETRY_BASE * 2 ** (attempts - 1), BACKLOG_RETRY_MAX)
+
+
+def geocode_backlog(expenses_collection, geocoder, limit=1000, workers=4, data_versions=None):
+    """Fill in `location` for expenses that have an address but were never geocoded.
+
+    Addresses that do not resolve get `geocode_attempts` and a
+    `geocode_retry_at` that doubles per attempt; they are skipped until then.
+    Addresses whose lookup failed upstream are left as they are for the next run.
+    Users whose expenses gained a location get their data version bumped.
+    """
+    now = datetime.utcnow()
+    pending = expenses_collection.find(
+        {"location": None, "address": {"$nin": [None, ""]}, "geocode_retry_at": {"$not": {"$gt": now}}},
+        {"address": 1, "geocode_attempts": 1}
+    ).limit(limit)
+    attempts = {}
+    for expense in pending:
+        address = expense["address"]
+        attempts[address] = max(attempts.get(address, 0), expense.get("geocode_attempts", 0))
+
+    updated = 0
+    changed_users = set()
+    for address, location in geocoder.geocode_many(list(attempts), workers).items():
+        if not location:
+            tries = attempts[address] + 1
+            expenses_collection.update_many(
+                {"location": None, "address": address},
+                {"$set": {"geocode_attempts": tries, "geocode_retry_at": now + retry_delay(tries)}}
+            )
+            continue
+        changed_users.update(expenses_collection.distinct("user_id", {"location": None, "address": address}))
+        result = expenses_collection.update_many(
+            {"location": None, "address": address},
+            {"$set": {"location": location, "geo": to_geojson(location)},
+             "$unset": {"geocode_attempts": "", "geocode_retry_at": ""}}
+        )
+        updated += result.modified_count
+    if data_versions is not None:
+        data_versions.bump_many(changed_users)
+    return updated
+
+
+if __name__ == "__main__":
+    from pymongo import MongoClient
+
+    from responses import DataVersions
+
+    parser = argparse.ArgumentParser(description="Geocode expenses that have no location")
+    parser.add_argument("--mongo-uri", default="mongodb://localhost:27017/")
+    parser.add_argument("--limit", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    db = MongoClient(args.mongo_uri).expense_tracker
+    geocoder = Geocoder(db.geocode_cache)
+    updated = geocode_backlog(db.expenses, geocoder, args.limit, args.workers, DataVersions(db.data_versions))
+    print(f"Geocoded {updated} expenses")
@@ -0,0 +1,173 @@
+# Shared GSTIN -> business/address/location cache.
+# A GSTIN validated once (by any user) is reused until it goes stale, and
+# concurrent lookups for the same GSTIN are collapsed into one portal call.
+import asyncio
+import logging
+import threading
+from datetime import datetime, timedelta
+
+from pymongo.errors import PyMongoError
+
+log = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """Run at most one call per key at a time; concurrent callers share its result."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = {"event": threading.Event(), "result": None, "error": None}
+                self._calls[key] = call
+
+        if not leader:
+            call["event"].wait()
+            # Followers see the leader's failure, like AsyncSingleFlight's shared future
+            if call["error"] is not None:
+                raise call["error"]
+            return call["result"], True
+
+        try:
+            call["result"] = fn()
+        except BaseException as e:
+            call["error"] = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call["event"].set()
+        return call["result"], False
+
+
+class AsyncSingleFlight:
+    """SingleFlight for coroutines running on one event loop."""
+
+    def __init__(self):
+        self._calls = {}
+
+    async def do(self, key, fn):
+        future = self._calls.get(key)
+        if future is not None:
+            return await asyncio.shield(future), True
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        try:
+            result = await fn()
+            future.set_result(result)
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark it retrieved so a leader failure with no followers is not logged twice
+            future.exception()
+            raise
+        finally:
+            del self._calls[key]
+        return result, False
+
+
+def is_fresh(doc, ttl):
+    return bool(doc and doc.get("updated_at") and datetime.utcnow() - doc["updated_at"] <= ttl)
+
+
+def cache_update(gst_number, details):
+    """Return the (doc, filter, update) used to upsert a GSTIN cache entry."""
+    doc = dict(details, gst_number=gst_number.upper(), updated_at=datetime.utcnow())
+    update = {"$set": doc, "$setOnInsert": {"created_at": doc["updated_at"]}}
+    return doc, {"gst_number": doc["gst_number"]}, update
+
+
+class GstinCache:
+    def __init__(self, collection, ttl=timedelta(days=30)):
+        self.collection = collection
+        self.ttl = ttl
+        self._flight = SingleFlight()
+
+    def get(self, gst_number):
+        """Return the cached details for a GSTIN if they are still fresh."""
+        if not gst_number:
+            return None
+        try:
+            doc = self.collection.find_one({"gst_number": gst_number.upper()})
+        except PyMongoError as e:
+            log.warning("GSTIN cache read error: %s", e)
+            return None
+        return doc if is_fresh(doc, self.ttl) else None
+
+    def put(self, gst_number, details):
+        doc, query, update = cache_update(gst_number, details)
+        try:
+            self.collection.update_one(query, update, upsert=True)
+        except PyMongoError as e:
+            log.warning("GSTIN cache write error: %s", e)
+        return doc
+
+    def lookup(self, gst_number, fetch):
+        """Return (details, error), calling fetch() -> (details, error) on a miss.
+
+        Only successful lookups are shared between concurrent callers: a
+        follower whose leader failed (e.g. wrong captcha) runs its own fetch.
+        """
+        cached = self.get(gst_number)
+        if cached:
+            return cached, None
+
+        def load():
+            details, error = fetch()
+            if error:
+                return None, error
+            return self.put(gst_number, details), None
+
+        (details, error), shared = self._flight.do(gst_number.upper(), load)
+        if error and shared:
+            return load()
+        return details, error
+
+
+class AsyncGstinCache:
+    """GstinCache over an async (motor) collection, sharing the same documents."""
+
+    def __init__(self, collection, ttl=timedelta(days=30)):
+        self.collection = collection
+        self.ttl = ttl
+        self._flight = AsyncSingleFlight()
+
+    async def get(self, gst_number):
+        if not gst_number:
+            return None
+        try:
+            doc = await self.collection.find_one({"gst_number": gst_number.upper()})
+        except PyMongoError as e:
+            log.warning("GSTIN cache read error: %s", e)
+            return None
+        return doc if is_fresh(doc, self.ttl) else None
+
+    async def put(self, gst_number, details):
+        doc, query, update = cache_update(gst_number, details)
+        try:
+            await self.collection.update_one(query, update, upsert=True)
+        except PyMongoError as e:
+            log.warning("GSTIN cache write error: %s", e)
+        return doc
+
+    async def lookup(self, gst_number, fetch):
+        """Async twin of GstinCache.lookup; `fetch` is a coroutine function."""
+        cached = await self.get(gst_number)
+        if cached:
+            return cached, None
+
+        async def load():
+            details, error = await fetch()
+            if error:
+                return None, error
+            return await self.put(gst_number, details), None
+
+        (details, error), shared = await self._flight.do(gst_number.upper(), load)
+        if error and shared:
+            return await load()
+        return details, error
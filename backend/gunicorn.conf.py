@@ -0,0 +1,16 @@
+# gunicorn settings for the Flask app: gunicorn -c gunicorn.conf.py
+# PRELOAD_ASSETS=1 imports the app and loads the spam model and phishing index
+# once in the master; workers are forked from it and share those pages, so a
+# recycled worker starts serving without reloading them. Mongo and the other
+# clients are still created inside each worker on first use.
+import os
+
+wsgi_app = "app:create_app()"
+bind = os.getenv("BIND", "0.0.0.0:5000")
+workers = int(os.getenv("WEB_CONCURRENCY", 4))
+threads = int(os.getenv("WORKER_THREADS", 8))
+preload_app = os.getenv("PRELOAD_ASSETS") == "1"
+# Recycling bounds slow leaks; the jitter keeps workers from restarting together
+max_requests = int(os.getenv("MAX_REQUESTS", 0))
+max_requests_jitter = int(os.getenv("MAX_REQUESTS_JITTER", 100))
+timeout = int(os.getenv("WORKER_TIMEOUT", 60))
@@ -0,0 +1,48 @@
+# Shared pooled HTTP client for outbound calls (GST portal, geocoder).
+# One keep-alive session per process with default timeouts and retries on
+# transient failures, instead of a fresh connection per requests.get.
+import os
+from http.cookiejar import DefaultCookiePolicy
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+DEFAULT_TIMEOUT = (3.05, 10)
+
+
+class HttpClient:
+    def __init__(self, timeout=DEFAULT_TIMEOUT, retries=2, pool_size=20, backoff=0.3):
+        self.timeout = timeout
+        self.session = requests.Session()
+        # Cookies are per-user (e.g. the GST captcha cookie); never share them
+        # between requests through the session jar
+        self.session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff,
+            status_forcelist=(429, 502, 503, 504),
+            allowed_methods=frozenset(["GET"]),
+            respect_retry_after_header=True
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def get(self, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.get(url, **kwargs)
+
+    def post(self, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.post(url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+http_client = HttpClient(
+    retries=int(os.getenv("HTTP_RETRIES", 2)),
+    pool_size=int(os.getenv("HTTP_POOL_SIZE", 20))
+)
@@ -0,0 +1,294 @@
+# Job queue for bill processing and bulk imports.
+# Uploads are turned into jobs that a small pool of worker threads runs in the
+# background, so the request thread can return a job id straight away.
+# The upload itself stays in the process that accepted it, but job status and
+# results go to a JobStore: with MongoJobStore every server worker can answer
+# a poll and the per-user limit holds across processes.
+import logging
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from pymongo import DESCENDING
+from pymongo.errors import PyMongoError
+
+log = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class UserLimitError(Exception):
+    pass
+
+
+class LocalBroker:
+    """Bounded in-process stand-in for a real message broker."""
+
+    def __init__(self, max_size=100):
+        self._queue = queue.Queue(maxsize=max_size)
+
+    def put(self, job_id):
+        try:
+            self._queue.put_nowait(job_id)
+        except queue.Full:
+            raise QueueFullError("Job queue is full")
+
+    def get(self, timeout=None):
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def task_done(self):
+        self._queue.task_done()
+
+    def size(self):
+        return self._queue.qsize()
+
+
+ACTIVE = ("queued", "running")
+FINISHED = ("done", "failed")
+
+
+class MemoryJobStore:
+    """Job records in this process only; enough for a single worker or a CLI."""
+
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def create(self, job, max_active, active_since):
+        with self._lock:
+            active = sum(
+                1 for other in self._jobs.values()
+                if other["queue"] == job["queue"] and other["user_id"] == job["user_id"]
+                and other["status"] in ACTIVE and other["created_at"] > active_since
+            )
+            if active >= max_active:
+                return False
+            self._jobs[job["_id"]] = dict(job)
+            return True
+
+    def update(self, job_id, fields):
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id].update(fields)
+
+    def delete(self, job_id):
+        with self._lock:
+            self._jobs.pop(job_id, None)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def counts(self, queue_name):
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                if job["queue"] == queue_name:
+                    counts[job["status"]] = counts.get(job["status"], 0) + 1
+            return counts
+
+    def expire(self, finished_before):
+        with self._lock:
+            for job_id, job in list(self._jobs.items()):
+                if job["finished_at"] and job["finished_at"] < finished_before:
+                    del self._jobs[job_id]
+
+
+class MongoJobStore:
+    """Job records in a Mongo collection shared by every server process."""
+
+    def __init__(self, collection, result_ttl=3600):
+        self.collection = collection
+        self.result_ttl = result_ttl
+        self._indexed = False
+
+    def create(self, job, max_active, active_since):
+        self._ensure_indexes()
+        self.collection.insert_one(job)
+        # Insert first, then count: two racing submits may both back off, but
+        # the limit is never exceeded, whichever process they reached
+        active = self.collection.count_documents({
+            "queue": job["queue"],
+            "user_id": job["user_id"],
+            "status": {"$in": list(ACTIVE)},
+            "created_at": {"$gt": active_since}
+        })
+        if active > max_active:
+            self.collection.delete_one({"_id": job["_id"]})
+            return False
+        return True
+
+    def update(self, job_id, fields):
+        try:
+            self.collection.update_one({"_id": job_id}, {"$set": fields})
+        except PyMongoError as e:
+            log.warning("Job update failed for %s: %s", job_id, e)
+
+    def delete(self, job_id):
+        self.collection.delete_one({"_id": job_id})
+
+    def get(self, job_id):
+        return self.collection.find_one({"_id": job_id})
+
+    def counts(self, queue_name):
+        pipeline = [{"$match": {"queue": queue_name}}, {"$group": {"_id": "$status", "count": {"$sum": 1}}}]
+        return {row["_id"]: row["count"] for row in self.collection.aggregate(pipeline)}
+
+    def expire(self, finished_before):
+        # The TTL index does this on the server
+        pass
+
+    def _ensure_indexes(self):
+        if self._indexed:
+            return
+        self._indexed = True
+        try:
+            self.collection.create_index([("queue", 1), ("user_id", 1), ("status", 1), ("created_at", DESCENDING)])
+            self.collection.create_index("finished_at", expireAfterSeconds=self.result_ttl)
+        except PyMongoError as e:
+            log.warning("Job index error: %s", e)
+
+
+class JobQueue:
+    def __init__(self, handler, broker=None, workers=4, max_per_user=2, result_ttl=3600, store=None,
+                 name="bill", stale_after=1800, poll_interval=0.25):
+        self.handler = handler
+        self.broker = broker or LocalBroker()
+        self.workers = workers
+        self.max_per_user = max_per_user
+        self.result_ttl = result_ttl
+        self.store = store if store is not None else MemoryJobStore()
+        self.name = name
+        # A job still unfinished after this long belonged to a process that died
+        self.stale_after = stale_after
+        self.poll_interval = poll_interval
+        self._payloads = {}
+        self._cond = threading.Condition()
+        self._threads = []
+        self._stopping = False
+
+    def start(self):
+        with self._cond:
+            if self._threads:
+                return
+            self._stopping = False
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f"{self.name}-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self):
+        with self._cond:
+            self._stopping = True
+            threads, self._threads = self._threads, []
+        for thread in threads:
+            thread.join(timeout=5)
+
+    def submit(self, user_id, payload):
+        self.start()
+        now = datetime.utcnow()
+        self.store.expire(now - timedelta(seconds=self.result_ttl))
+        job_id = str(uuid.uuid4())
+        job = {
+            "_id": job_id,
+            "queue": self.name,
+            "user_id": user_id,
+            "status": "queued",
+            "result": None,
+            "error": None,
+            "created_at": now,
+            "finished_at": None
+        }
+        if not self.store.create(job, self.max_per_user, now - timedelta(seconds=self.stale_after)):
+            raise UserLimitError(f"Too many {self.name} jobs in progress")
+
+        with self._cond:
+            self._payloads[job_id] = payload
+        try:
+            self.broker.put(job_id)
+        except QueueFullError:
+            with self._cond:
+                self._payloads.pop(job_id, None)
+            self.store.delete(job_id)
+            raise
+        return job_id
+
+    def get(self, job_id, user_id=None, wait=0):
+        # Long-poll: block up to `wait` seconds until the job finishes. Jobs run
+        # here wake the waiter directly; others are polled from the store
+        deadline = time.monotonic() + wait
+        while True:
+            job = self.store.get(job_id)
+            if not job or job.get("queue") != self.name or (user_id is not None and job["user_id"] != user_id):
+                return None
+            remaining = deadline - time.monotonic()
+            if job["status"] in FINISHED or remaining <= 0:
+                return self._public(job)
+            with self._cond:
+                self._cond.wait(min(remaining, self.poll_interval))
+
+    def stats(self):
+        with self._cond:
+            workers = len(self._threads)
+        return {
+            "queued": self.broker.size(),
+            "workers": workers,
+            "jobs": self.store.counts(self.name)
+        }
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                if self._stopping:
+                    return
+            job_id = self.broker.get(timeout=0.5)
+            if job_id is None:
+                continue
+            try:
+                self._run(job_id)
+            finally:
+                self.broker.task_done()
+
+    def _run(self, job_id):
+        with self._cond:
+            payload = self._payloads.pop(job_id, None)
+        if payload is None:
+            return
+        self.store.update(job_id, {"status": "running"})
+
+        try:
+            result = self.handler(payload)
+            error = result.get("error") if isinstance(result, dict) else None
+        except Exception as e:
+            log.exception("Job %s failed: %s", job_id, e)
+            result, error = None, "Processing failed"
+
+        self.store.update(job_id, {
+            "result": result,
+            "error": error,
+            "status": "failed" if error else "done",
+            "finished_at": datetime.utcnow()
+        })
+        with self._cond:
+            self._cond.notify_all()
+
+    def _public(self, job):
+        status, error = job["status"], job["error"]
+        if status in ACTIVE and (datetime.utcnow() - job["created_at"]).total_seconds() > self.stale_after:
+            status, error = "failed", "Job lost (worker restarted)"
+        return {
+            "job_id": job["_id"],
+            "status": status,
+            "result": job["result"],
+            "error": error,
+            "created_at": job["created_at"].isoformat(),
+            "finished_at": job["finished_at"].isoformat() if job["finished_at"] else None
+        }
@@ -0,0 +1,561 @@
+# LLM gateway: every completion goes through a bounded pool with deadlines,
+# retries with jittered backoff and a circuit breaker, so a slow or failing
+# upstream cannot tie up the Flask workers. Identical in-flight prompts are
+# coalesced and bursts of extraction prompts are micro-batched. Streams hold
+# a slot too, and each chunk is read on the pool under a deadline for the
+# whole stream.
+# LLM_BACKEND=stub swaps in a deterministic offline backend for load tests.
+# The async server uses acomplete/astream_complete, which wait on the event
+# loop instead of holding a thread per call.
+import asyncio
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+
+log = logging.getLogger(__name__)
+
+
+class LLMUnavailable(Exception):
+    pass
+
+
+class LLMTimeout(LLMUnavailable):
+    pass
+
+
+class TextResponse:
+    def __init__(self, text, delta=None):
+        self.text = text
+        self.delta = delta
+
+
+class GroqBackend:
+    def __init__(self, model, api_key, temperature=0.7, timeout=30):
+        self.options = {"model": model, "api_key": api_key, "temperature": temperature, "timeout": timeout}
+        self._llm = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def preload():
+        # Importing llama_index takes over a second; a server can do it once before forking
+        import llama_index.llms.groq  # noqa: F401
+
+    @property
+    def llm(self):
+        # Built on first use in each process, so workers never share the client's
+        # connection pools with a parent they were forked from
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    from llama_index.llms.groq import Groq
+                    self._llm = Groq(**self.options, max_retries=0)
+                    self._pid = os.getpid()
+        return self._llm
+
+    def complete(self, prompt):
+        return self.llm.complete(prompt)
+
+    def stream_complete(self, prompt):
+        return self.llm.stream_complete(prompt)
+
+    async def acomplete(self, prompt):
+        return await self.llm.acomplete(prompt)
+
+    async def astream_complete(self, prompt):
+        stream = await self.llm.astream_complete(prompt)
+        async for chunk in stream:
+            yield chunk
+
+
+class StubBackend:
+    """Deterministic offline backend: regex extraction for invoices, canned chat text."""
+
+    GST_REGEX = re.compile(r'[0-9]{2}[a-zA-Z]{5}[0-9]{4}[a-zA-Z]{1}[1-9A-Za-z]{1}[Zz1-9A-Ja-j]{1}[0-9a-zA-Z]{1}')
+    TOTAL_REGEX = re.compile(r'(?:grand\s+)?total[^0-9\n]*([0-9][0-9,]*\.?[0-9]*)', re.IGNORECASE)
+    INVOICE_ID_REGEX = re.compile(r'Invoice ID: (\S+)')
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+
+    @staticmethod
+    def preload():
+        pass
+
+    def complete(self, prompt):
+        if self.latency:
+            time.sleep(self.latency)
+        return self._respond(prompt)
+
+    def stream_complete(self, prompt):
+        text = self.complete(prompt).text
+        for word in re.findall(r"\S+\s*", text):
+            yield TextResponse(text, delta=word)
+
+    async def acomplete(self, prompt):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._respond(prompt)
+
+    async def astream_complete(self, prompt):
+        text = (await self.acomplete(prompt)).text
+        for word in re.findall(r"\S+\s*", text):
+            yield TextResponse(text, delta=word)
+
+    def _respond(self, prompt):
+        if "Invoice Text:" in prompt:
+            invoices = prompt.split("Invoice Text:")[1:]
+            results = [self._extract(invoice) for invoice in invoices]
+            if "JSON array" not in prompt:
+                return TextResponse(json.dumps(results[0]))
+            for invoice_id, result in zip(self.INVOICE_ID_REGEX.findall(prompt), results):
+                result["invoice_id"] = invoice_id
+            return TextResponse(json.dumps(results))
+        question = prompt.rsplit("**USER QUESTION:**", 1)[-1].split("\n")[0].strip()
+        return TextResponse(f"Here is a summary of your finances regarding: {question}")
+
+    def _extract(self, text):
+        gst = self.GST_REGEX.search(text)
+        total = self.TOTAL_REGEX.search(text)
+        lines = [line.strip() for line in text.strip().splitlines() if line.strip()]
+        return {
+            "gst_number": gst.group(0).upper() if gst else None,
+            "total_amount": float(total.group(1).replace(",", "")) if total else None,
+            "store_name": lines[0] if lines else None,
+            "date": None,
+            "address": None,
+            "items": []
+        }
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            # Half-open: let exactly one trial call through
+            if state == "half-open" and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_skip(self):
+        with self._lock:
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.failures >= self.failure_threshold or self.opened_at is not None:
+                self.opened_at = time.monotonic()
+
+
+# Returned by next() on the pool when the upstream stream is exhausted
+_END_OF_STREAM = object()
+
+
+class LLMGateway:
+    def __init__(self, backend, max_concurrency=8, max_queue=32, timeout=20, retries=2,
+                 backoff=0.5, breaker=None, max_async_concurrency=1000, stream_timeout=60):
+        self.backend = backend
+        self.timeout = timeout
+        self.stream_timeout = stream_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="llm")
+        # Calls running or waiting for the pool; beyond this we fail fast
+        self._slots = threading.BoundedSemaphore(max_concurrency + max_queue)
+        self._inflight = {}
+        self._lock = threading.Lock()
+        # Async callers only hold a coroutine, so their bound can be far higher
+        self.max_async_concurrency = max_async_concurrency
+        self._async_slots = None
+        self._async_inflight = {}
+        self.stats = {"calls": 0, "coalesced": 0, "retries": 0, "timeouts": 0, "rejected": 0, "failures": 0}
+
+    def complete(self, prompt, timeout=None):
+        """Return the backend response for `prompt` or raise LLMUnavailable."""
+        deadline = time.monotonic() + (timeout or self.timeout)
+
+        # Identical prompts already in flight share the leader's result
+        with self._lock:
+            self.stats["calls"] += 1
+            future = self._inflight.get(prompt)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[prompt] = future
+            else:
+                self.stats["coalesced"] += 1
+        if not leader:
+            return self._wait(future, deadline)
+
+        try:
+            future.set_result(self._call_with_retries(prompt, deadline))
+        except Exception as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                self._inflight.pop(prompt, None)
+        return future.result()
+
+    def stream_complete(self, prompt, timeout=None):
+        """Yield response chunks; raises LLMTimeout once the whole stream outlasts `timeout`."""
+        if not self.breaker.allow():
+            raise LLMUnavailable("LLM circuit open")
+        return self._guarded_stream(prompt, time.monotonic() + (timeout or self.stream_timeout))
+
+    async def acomplete(self, prompt, timeout=None):
+        """Async twin of complete() for the ASGI server."""
+        deadline = time.monotonic() + (timeout or self.timeout)
+        self._count("calls")
+        future = self._async_inflight.get(prompt)
+        if future is not None:
+            self._count("coalesced")
+            return await self._await(asyncio.shield(future), deadline)
+
+        future = asyncio.get_running_loop().create_future()
+        self._async_inflight[prompt] = future
+        try:
+            future.set_result(await self._acall_with_retries(prompt, deadline))
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()
+        finally:
+            del self._async_inflight[prompt]
+        return future.result()
+
+    def astream_complete(self, prompt, timeout=None):
+        if not self.breaker.allow():
+            raise LLMUnavailable("LLM circuit open")
+        return self._aguarded_stream(prompt, time.monotonic() + (timeout or self.stream_timeout))
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self.stats, breaker=self.breaker.state)
+
+    def _guarded_stream(self, prompt, deadline):
+        self._count("calls")
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or not self._slots.acquire(timeout=min(remaining, 0.05)):
+            self._count("rejected")
+            self.breaker.record_skip()
+            raise LLMUnavailable("LLM pool saturated")
+        upstream = future = None
+        try:
+            # Opening the stream sends the request and may wait for the first
+            # token, so it runs on the pool under the deadline like each chunk
+            future = self._pool.submit(self.backend.stream_complete, prompt)
+            upstream = self._wait(future, deadline)
+            while True:
+                # A chunk that stalls past the deadline is left to finish on the pool
+                future = self._pool.submit(next, upstream, _END_OF_STREAM)
+                chunk = self._wait(future, deadline)
+                if chunk is _END_OF_STREAM:
+                    break
+                yield chunk
+        except GeneratorExit:
+            self.breaker.record_skip()
+            raise
+        except LLMTimeout:
+            self.breaker.record_failure()
+            raise
+        except Exception as e:
+            self.breaker.record_failure()
+            self._count("failures")
+            log.warning("LLM stream failed: %s", e)
+            raise
+        finally:
+            # The slot is held until no pool thread is using the upstream any more
+            if future is None:
+                self._release_stream(upstream)
+            elif upstream is None:
+                # Still opening (or failed to): close whatever it eventually returns
+                future.add_done_callback(lambda done: self._release_stream(self._stream_result(done)))
+            else:
+                future.add_done_callback(lambda _: self._release_stream(upstream))
+        self.breaker.record_success()
+
+    @staticmethod
+    def _stream_result(future):
+        return None if future.exception() else future.result()
+
+    def _release_stream(self, upstream):
+        try:
+            if upstream is not None and hasattr(upstream, "close"):
+                upstream.close()
+        finally:
+            self._slots.release()
+
+    async def _aguarded_stream(self, prompt, deadline):
+        self._count("calls")
+        try:
+            await self._aacquire(deadline)
+        except LLMUnavailable:
+            self.breaker.record_skip()
+            raise
+        upstream = None
+        try:
+            upstream = self.backend.astream_complete(prompt)
+            while True:
+                try:
+                    chunk = await self._await(upstream.__anext__(), deadline)
+                except StopAsyncIteration:
+                    break
+                yield chunk
+        except (GeneratorExit, asyncio.CancelledError):
+            self.breaker.record_skip()
+            raise
+        except LLMTimeout:
+            self.breaker.record_failure()
+            raise
+        except Exception as e:
+            self.breaker.record_failure()
+            self._count("failures")
+            log.warning("LLM stream failed: %s", e)
+            raise
+        finally:
+            try:
+                if upstream is not None:
+                    await upstream.aclose()
+            finally:
+                self._async_slots.release()
+        self.breaker.record_success()
+
+    async def _acall_with_retries(self, prompt, deadline):
+        for attempt in range(self.retries + 1):
+            if not self.breaker.allow():
+                raise LLMUnavailable("LLM circuit open")
+            try:
+                response = await self._acall_once(prompt, deadline)
+                self.breaker.record_success()
+                return response
+            except LLMTimeout:
+                self.breaker.record_failure()
+                raise
+            except LLMUnavailable:
+                self.breaker.record_skip()
+                raise
+            except Exception as e:
+                self.breaker.record_failure()
+                self._count("failures")
+                log.warning("LLM call failed (attempt %s): %s", attempt + 1, e)
+
+            delay = random.uniform(0, self.backoff * (2 ** attempt))
+            if attempt == self.retries or time.monotonic() + delay >= deadline:
+                break
+            self._count("retries")
+            await asyncio.sleep(delay)
+        raise LLMUnavailable("LLM call failed")
+
+    async def _acall_once(self, prompt, deadline):
+        await self._aacquire(deadline)
+        try:
+            return await self._await(self.backend.acomplete(prompt), deadline)
+        finally:
+            self._async_slots.release()
+
+    async def _aacquire(self, deadline):
+        if self._async_slots is None:
+            self._async_slots = asyncio.Semaphore(self.max_async_concurrency)
+        try:
+            await asyncio.wait_for(self._async_slots.acquire(), timeout=max(0, deadline - time.monotonic()))
+        except asyncio.TimeoutError:
+            self._count("rejected")
+            raise LLMUnavailable("LLM pool saturated")
+
+    async def _await(self, awaitable, deadline):
+        try:
+            return await asyncio.wait_for(awaitable, timeout=max(0, deadline - time.monotonic()))
+        except asyncio.TimeoutError:
+            self._count("timeouts")
+            raise LLMTimeout("LLM call timed out")
+
+    def _call_with_retries(self, prompt, deadline):
+        for attempt in range(self.retries + 1):
+            if not self.breaker.allow():
+                raise LLMUnavailable("LLM circuit open")
+            try:
+                response = self._call_once(prompt, deadline)
+                self.breaker.record_success()
+                return response
+            except LLMTimeout:
+                self.breaker.record_failure()
+                raise
+            except LLMUnavailable:
+                # Rejected locally; says nothing about upstream health
+                self.breaker.record_skip()
+                raise
+            except Exception as e:
+                self.breaker.record_failure()
+                self._count("failures")
+                log.warning("LLM call failed (attempt %s): %s", attempt + 1, e)
+
+            # Full jitter exponential backoff, never past the deadline
+            delay = random.uniform(0, self.backoff * (2 ** attempt))
+            if attempt == self.retries or time.monotonic() + delay >= deadline:
+                break
+            self._count("retries")
+            time.sleep(delay)
+        raise LLMUnavailable("LLM call failed")
+
+    def _call_once(self, prompt, deadline):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or not self._slots.acquire(timeout=min(remaining, 0.05)):
+            self._count("rejected")
+            raise LLMUnavailable("LLM pool saturated")
+        try:
+            future = self._pool.submit(self.backend.complete, prompt)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return self._wait(future, deadline)
+
+    def _wait(self, future, deadline):
+        try:
+            return future.result(timeout=max(0, deadline - time.monotonic()))
+        except FutureTimeout:
+            self._count("timeouts")
+            raise LLMTimeout("LLM call timed out")
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+
+class ExtractionBatcher:
+    """Collect extraction requests for a short window and send them as one prompt.
+
+    A lone request is sent with the normal single-invoice prompt; only bursts
+    are combined. Each invoice in a batch gets an id that the answer must echo
+    as "invoice_id"; a batch whose ids do not match one for one is discarded
+    and every caller sends its own invoice, in parallel, within what is left
+    of its deadline.
+    """
+
+    def __init__(self, gateway, build_prompt, build_batch_prompt, max_batch=4, window=0.02):
+        self.gateway = gateway
+        self.build_prompt = build_prompt
+        # Called with [(invoice_id, text), ...]
+        self.build_batch_prompt = build_batch_prompt
+        self.max_batch = max_batch
+        self.window = window
+        self._pending = []
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def extract(self, text, timeout=None):
+        """Return the raw response text for one invoice."""
+        timeout = timeout or self.gateway.timeout
+        if self.max_batch <= 1:
+            return self.gateway.complete(self.build_prompt(text), timeout).text
+
+        deadline = time.monotonic() + timeout
+        future = Future()
+        with self._lock:
+            self._pending.append((text, future))
+            if len(self._pending) >= self.max_batch:
+                batch, self._pending = self._pending, []
+            else:
+                batch = None
+                if self._timer is None:
+                    self._timer = threading.Timer(self.window, self._flush_pending)
+                    self._timer.daemon = True
+                    self._timer.start()
+        if batch:
+            self._run(batch, timeout)
+        try:
+            result = future.result(timeout=max(0, deadline - time.monotonic()) + self.window)
+        except FutureTimeout:
+            raise LLMTimeout("LLM call timed out")
+        if result is not None:
+            return result
+
+        # Not answered as part of a batch: send this invoice on its own
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise LLMTimeout("LLM call timed out")
+        return self.gateway.complete(self.build_prompt(text), remaining).text
+
+    def _flush_pending(self):
+        with self._lock:
+            batch, self._pending = self._pending, []
+            self._timer = None
+        if batch:
+            self._run(batch, self.gateway.timeout)
+
+    def _run(self, batch, timeout):
+        # Callers whose future resolves to None send their own prompt
+        if len(batch) == 1:
+            batch[0][1].set_result(None)
+            return
+
+        ids = [str(number) for number in range(1, len(batch) + 1)]
+        try:
+            prompt = self.build_batch_prompt([(invoice_id, text) for invoice_id, (text, _) in zip(ids, batch)])
+            response = self.gateway.complete(prompt, timeout).text
+            results = match_batch_results(response, ids)
+        except LLMUnavailable as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        except Exception as e:
+            log.warning("Batched extraction failed: %s", e)
+            results = None
+
+        if results is None:
+            log.warning("Batched extraction answer did not match the invoice ids; sending them one by one")
+        for invoice_id, (_, future) in zip(ids, batch):
+            future.set_result(json.dumps(results[invoice_id]) if results else None)
+
+
+def match_batch_results(response, ids):
+    """Map a batched answer to {invoice_id: result}; None unless every id appears exactly once."""
+    match = re.search(r"\[.*\]", response, re.DOTALL)
+    if not match:
+        return None
+    results = json.loads(match.group(0))
+    if not isinstance(results, list) or not all(isinstance(result, dict) for result in results):
+        return None
+    by_id = {str(result.pop("invoice_id", None)): result for result in results}
+    if len(results) != len(ids) or sorted(by_id) != sorted(ids):
+        return None
+    return by_id
+
+
+def create_backend(model, api_key, temperature=0.7):
+    if os.getenv("LLM_BACKEND", "groq") == "stub":
+        return StubBackend(latency=float(os.getenv("LLM_STUB_LATENCY", 0)))
+    return GroqBackend(model, api_key, temperature, timeout=float(os.getenv("LLM_TIMEOUT", 20)))
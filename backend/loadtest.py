@@ -0,0 +1,104 @@
+# Load-test harness comparing the Flask server with the async (ASGI) server.
+# Upstream latency is simulated with the stub LLM backend, so both servers wait
+# on the same slow "upstream" and the difference is how they wait:
+#   LLM_BACKEND=stub LLM_STUB_LATENCY=1 python app.py                                 (port 5000)
+#   LLM_BACKEND=stub LLM_STUB_LATENCY=1 uvicorn asgi:application --port 5001
+#   python loadtest.py --url http://localhost:5000 --url http://localhost:5001 --concurrency 50 200 1000
+import argparse
+import asyncio
+import time
+import uuid
+
+import httpx
+
+DEFAULT_PATHS = {
+    "chat": ("POST", "/api/chat/assistant", {"message": "How am I doing this month?"}),
+    "dashboard": ("GET", "/api/dashboard", None),
+}
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+async def get_token(client, base_url):
+    # A throwaway account, created through the API itself
+    email = f"loadtest-{uuid.uuid4().hex[:8]}@example.com"
+    response = await client.post(f"{base_url}/api/signup", json={"email": email, "password": "loadtest"})
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+async def run_level(client, base_url, token, scenario, concurrency, total):
+    method, path, body = DEFAULT_PATHS[scenario]
+    headers = {"Authorization": f"Bearer {token}"}
+    latencies = []
+    errors = 0
+    queue = asyncio.Queue()
+    for index in range(total):
+        queue.put_nowait(index)
+
+    async def worker():
+        nonlocal errors
+        while not queue.empty():
+            index = queue.get_nowait()
+            # Distinct bodies, so the LLM gateway cannot coalesce the calls
+            payload = dict(body, message=f"{body['message']} #{index}") if body else None
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, f"{base_url}{path}", json=payload, headers=headers)
+                if response.status_code >= 400:
+                    errors += 1
+                    continue
+            except httpx.HTTPError:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "ok": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / elapsed if elapsed else 0,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+    }
+
+
+def ms(seconds):
+    return f"{seconds * 1000:8.1f}" if seconds is not None else "       -"
+
+
+async def main(args):
+    limits = httpx.Limits(max_connections=max(args.concurrency), max_keepalive_connections=max(args.concurrency))
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+        for base_url in args.url:
+            base_url = base_url.rstrip("/")
+            token = args.token or await get_token(client, base_url)
+            print(f"\n{base_url} {args.scenario}")
+            print(f"{'conc':>6} {'ok':>6} {'err':>5} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+            for concurrency in args.concurrency:
+                total = args.requests or concurrency * 2
+                result = await run_level(client, base_url, token, args.scenario, concurrency, total)
+                print(f"{result['concurrency']:>6} {result['ok']:>6} {result['errors']:>5} {result['rps']:>8.1f} "
+                      f"{ms(result['p50'])} {ms(result['p95'])} {ms(result['p99'])}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare request concurrency of the sync and async servers")
+    parser.add_argument("--url", action="append", required=True, help="Server base URL (repeat to compare)")
+    parser.add_argument("--scenario", choices=sorted(DEFAULT_PATHS), default="chat")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--requests", type=int, help="Requests per level (default: 2x concurrency)")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--token", help="Use this JWT instead of signing up a throwaway user")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,212 @@
+# Viewport queries for /api/map-data.
+# Expenses carry a GeoJSON `geo` point next to `location` so bounding-box
+# lookups and low-zoom clustering run against a 2dsphere index.
+# Points are listed newest first by created_at, as the route always did; pages
+# continue from a keyset cursor on (created_at, _id).
+# Backfill geo points: python mapdata.py [--mongo-uri URI]
+import argparse
+import math
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+# Below this zoom level points are clustered on a grid instead of returned one by one
+CLUSTER_MAX_ZOOM = 11
+CLUSTER_CELLS_PER_TILE = 4
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 5000
+# 2dsphere edges are geodesics, which bow away from lines of latitude over long
+# spans; vertices a degree apart keep a box edge within ~100m of its parallel
+EDGE_STEP_DEGREES = 1.0
+# A ring encloses the smaller of the two regions it splits the sphere into, so
+# no piece of a viewport may be 180 degrees or wider
+MAX_PIECE_DEGREES = 90.0
+# Vertices on a pole coincide whatever their longitude, which is an invalid ring
+MAX_POLYGON_LAT = 89.999
+EPOCH = datetime(1970, 1, 1)
+# Map pins are only drawn for these; the route never listed expenses without one
+MISSING_LOCATION = [None, {}, ""]
+
+
+def to_geojson(location):
+    if not location or location.get("lat") is None or location.get("lon") is None:
+        return None
+    return {"type": "Point", "coordinates": [float(location["lon"]), float(location["lat"])]}
+
+
+def parse_bbox(value):
+    """Parse "minLon,minLat,maxLon,maxLat"; raises ValueError when malformed.
+
+    minLon > maxLon is a viewport that crosses the antimeridian.
+    """
+    min_lon, min_lat, max_lon, max_lat = [float(part) for part in value.split(",")]
+    if not (-180 <= min_lon <= 180 and -180 <= max_lon <= 180 and -90 <= min_lat < max_lat <= 90):
+        raise ValueError("Bounding box out of range")
+    if min_lon == max_lon:
+        raise ValueError("Bounding box has no width")
+    return min_lon, min_lat, max_lon, max_lat
+
+
+def bbox_polygons(bbox):
+    """GeoJSON polygons that together cover the box between its parallels and meridians."""
+    min_lon, min_lat, max_lon, max_lat = bbox
+    south, north = max(min_lat, -MAX_POLYGON_LAT), min(max_lat, MAX_POLYGON_LAT)
+    spans = [(min_lon, max_lon)] if min_lon < max_lon else [(min_lon, 180.0), (-180.0, max_lon)]
+    polygons = []
+    for west, east in spans:
+        if east <= west:
+            continue
+        pieces = math.ceil((east - west) / MAX_PIECE_DEGREES)
+        width = (east - west) / pieces
+        for piece in range(pieces):
+            polygons.append(box_polygon(west + piece * width, south, west + (piece + 1) * width, north))
+    return polygons
+
+
+def box_polygon(west, south, east, north):
+    steps = max(1, math.ceil((east - west) / EDGE_STEP_DEGREES))
+    lons = [west + (east - west) * step / steps for step in range(steps + 1)]
+    ring = [[lon, south] for lon in lons] + [[lon, north] for lon in reversed(lons)] + [[west, south]]
+    return {"type": "Polygon", "coordinates": [ring]}
+
+
+def encode_cursor(expense):
+    created_at = expense.get("created_at")
+    millis = (created_at - EPOCH) // timedelta(milliseconds=1) if isinstance(created_at, datetime) else ""
+    return f"{millis}:{expense['_id']}"
+
+
+def parse_cursor(value):
+    """Parse a cursor from encode_cursor into (created_at or None, _id)."""
+    millis, _, object_id = value.rpartition(":")
+    try:
+        created_at = EPOCH + timedelta(milliseconds=int(millis)) if millis else None
+        return created_at, ObjectId(object_id)
+    except (InvalidId, TypeError, ValueError, OverflowError):
+        raise ValueError("Invalid cursor")
+
+
+def after_cursor(cursor):
+    """Everything after `cursor` in (created_at desc, _id desc) order; undated expenses sort last."""
+    created_at, object_id = cursor
+    if created_at is None:
+        return {"created_at": None, "_id": {"$lt": object_id}}
+    return {"$or": [
+        {"created_at": {"$lt": created_at}},
+        {"created_at": created_at, "_id": {"$lt": object_id}},
+        {"created_at": None}
+    ]}
+
+
+def viewport_query(user_id, bbox=None, cursor=None):
+    query = {"user_id": user_id}
+    conditions = []
+    if bbox:
+        # `geo` is only written for expenses with a usable location
+        polygons = [{"geo": {"$geoWithin": {"$geometry": polygon}}} for polygon in bbox_polygons(bbox)]
+        conditions.append(polygons[0] if len(polygons) == 1 else {"$or": polygons})
+    else:
+        query["location"] = {"$nin": MISSING_LOCATION}
+    if cursor:
+        conditions.append(after_cursor(cursor))
+    if conditions:
+        query["$and"] = conditions
+    return query
+
+
+def map_point(expense, include_items=True):
+    point = {
+        "id": str(expense["_id"]),
+        "store_name": expense.get("store_name", "Unknown Store"),
+        "date": expense.get("date"),
+        "total_amount": expense.get("total_amount", 0),
+        "address": expense.get("address", ""),
+        "location": expense.get("location")
+    }
+    if include_items:
+        point["items"] = expense.get("items", [])
+    return point
+
+
+def find_expenses(expenses_collection, user_id, bbox=None, cursor=None, limit=None, include_items=True):
+    projection = {"store_name": 1, "date": 1, "total_amount": 1, "address": 1, "location": 1, "created_at": 1}
+    if include_items:
+        projection["items"] = 1
+
+    results = expenses_collection.find(viewport_query(user_id, bbox, cursor), projection)
+    results = results.sort([("created_at", -1), ("_id", -1)])
+    return results.limit(limit) if limit else results
+
+
+def find_points(expenses_collection, user_id, bbox=None, cursor=None, limit=None, include_items=True):
+    """Yield map points newest first; stops after `limit` when given."""
+    for expense in find_expenses(expenses_collection, user_id, bbox, cursor, limit, include_items):
+        yield map_point(expense, include_items)
+
+
+def find_page(expenses_collection, user_id, bbox=None, cursor=None, limit=DEFAULT_PAGE_SIZE, include_items=True):
+    """Return (points, next_cursor); next_cursor is None on the last page."""
+    expenses = list(find_expenses(expenses_collection, user_id, bbox, cursor, limit, include_items))
+    next_cursor = encode_cursor(expenses[-1]) if len(expenses) == limit else None
+    return [map_point(expense, include_items) for expense in expenses], next_cursor
+
+
+def cluster_points(expenses_collection, user_id, bbox, zoom):
+    """Group points into grid cells sized for the zoom level."""
+    cell = 360.0 / (2 ** zoom) / CLUSTER_CELLS_PER_TILE
+    pipeline = [
+        {"$match": viewport_query(user_id, bbox)},
+        {"$project": {
+            "lon": {"$arrayElemAt": ["$geo.coordinates", 0]},
+            "lat": {"$arrayElemAt": ["$geo.coordinates", 1]},
+            "total_amount": 1
+        }},
+        {"$group": {
+            "_id": {
+                "x": {"$floor": {"$divide": ["$lon", cell]}},
+                "y": {"$floor": {"$divide": ["$lat", cell]}}
+            },
+            "count": {"$sum": 1},
+            "total_amount": {"$sum": "$total_amount"},
+            "lat": {"$avg": "$lat"},
+            "lon": {"$avg": "$lon"}
+        }}
+    ]
+    return [
+        {
+            "count": row["count"],
+            "total_amount": row["total_amount"],
+            "location": {"lat": row["lat"], "lon": row["lon"]}
+        }
+        for row in expenses_collection.aggregate(pipeline)
+    ]
+
+
+def backfill_geo(expenses_collection, data_versions=None):
+    updated = 0
+    changed_users = set()
+    query = {"location": {"$nin": MISSING_LOCATION}, "geo": {"$exists": False}}
+    for expense in expenses_collection.find(query, {"location": 1, "user_id": 1}):
+        geo = to_geojson(expense["location"])
+        if geo:
+            expenses_collection.update_one({"_id": expense["_id"]}, {"$set": {"geo": geo}})
+            changed_users.add(expense.get("user_id"))
+            updated += 1
+    # Map views of these users change, so their clients must not get a 304
+    if data_versions is not None:
+        data_versions.bump_many(changed_users)
+    return updated
+
+
+if __name__ == "__main__":
+    from pymongo import MongoClient
+
+    from responses import DataVersions
+
+    parser = argparse.ArgumentParser(description="Add GeoJSON points to located expenses")
+    parser.add_argument("--mongo-uri", default="mongodb://localhost:27017/")
+    args = parser.parse_args()
+
+    db = MongoClient(args.mongo_uri).expense_tracker
+    print(f"Backfilled {backfill_geo(db.expenses, DataVersions(db.data_versions))} expenses")
@@ -0,0 +1,297 @@
+# Request and stage instrumentation.
+# Leveled logging (plain text or one JSON object per line), latency histograms
+# per route, per pipeline stage (OCR, LLM, GST portal, geocoder) and per Mongo
+# command, rendered in the Prometheus text format for /metrics, and an optional
+# sampling profiler for individual requests.
+import contextvars
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+
+from pymongo import monitoring
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SLOW_REQUEST_SECONDS = float(os.getenv("LOG_SLOW_REQUEST_MS", 1000)) / 1000
+
+log = logging.getLogger("http")
+
+# Stage totals for the request being served, reported in its log line
+_request_stages = contextvars.ContextVar("request_stages", default=None)
+
+
+class LogFormatter(logging.Formatter):
+    """Text or JSON lines; fields passed with extra={...} are kept as fields."""
+
+    RESERVED = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+    def __init__(self, as_json=False):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+        self.as_json = as_json
+
+    def format(self, record):
+        fields = {key: value for key, value in vars(record).items() if key not in self.RESERVED}
+        if not self.as_json:
+            line = super().format(record)
+            return line + "".join(f" {key}={value}" for key, value in fields.items())
+        entry = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            **fields
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(level=None, fmt=None):
+    # LOG_FORMAT=json for log shippers; LOG_LEVEL=DEBUG also logs every request
+    handler = logging.StreamHandler()
+    handler.setFormatter(LogFormatter(as_json=(fmt or os.getenv("LOG_FORMAT", "text")) == "json"))
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel((level or os.getenv("LOG_LEVEL", "INFO")).upper())
+    # httpx logs every outbound request at INFO
+    for name in ("httpx", "httpcore"):
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+
+class Histogram:
+    def __init__(self, name, help, labels, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        # label values -> per-bucket counts (not cumulative), then sum and count
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, seconds, *label_values):
+        index = bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * len(self.buckets) + [0.0, 0]
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += seconds
+            series[-1] += 1
+
+    def render(self):
+        with self._lock:
+            snapshot = {labels: list(series) for labels, series in self._series.items()}
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for label_values, series in sorted(snapshot.items()):
+            labels = ",".join(f'{key}="{escape(value)}"' for key, value in zip(self.labels, label_values))
+            prefix = f"{labels}," if labels else ""
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {series[-1]}')
+            lines.append(f"{self.name}_sum{{{labels}}} {series[-2]:.6f}")
+            lines.append(f"{self.name}_count{{{labels}}} {series[-1]}")
+        return "\n".join(lines)
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def histogram(self, name, help, labels, buckets=DEFAULT_BUCKETS):
+        histogram = Histogram(name, help, labels, buckets)
+        self._metrics.append(histogram)
+        return histogram
+
+    def render(self):
+        return "\n".join(metric.render() for metric in self._metrics) + "\n"
+
+
+REGISTRY = Registry()
+REQUEST_SECONDS = REGISTRY.histogram(
+    "http_request_duration_seconds", "Time to build the response, per route", ("method", "route", "status")
+)
+STAGE_SECONDS = REGISTRY.histogram(
+    "stage_duration_seconds", "Time spent in a pipeline stage", ("stage", "outcome")
+)
+MONGO_SECONDS = REGISTRY.histogram(
+    "mongo_command_duration_seconds", "Mongo command round-trip time", ("command", "collection", "outcome"),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+)
+
+
+def observe_stage(name, seconds, outcome="ok"):
+    STAGE_SECONDS.observe(seconds, name, outcome)
+    stages = _request_stages.get()
+    if stages is not None:
+        stages[name] = stages.get(name, 0.0) + seconds
+
+
+@contextmanager
+def stage(name):
+    """Time a block as one pipeline stage; exceptions are recorded as outcome="error"."""
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        observe_stage(name, time.perf_counter() - start, outcome)
+
+
+class MongoCommandTimer(monitoring.CommandListener):
+    """Times every command sent by the client it is registered on."""
+
+    def __init__(self):
+        # (connection, request id) -> collection name, between started and finished
+        self._collections = {}
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        self._collections[(event.connection_id, event.request_id)] = collection if isinstance(collection, str) else ""
+
+    def succeeded(self, event):
+        self._finish(event, "ok")
+
+    def failed(self, event):
+        self._finish(event, "error")
+
+    def _finish(self, event, outcome):
+        collection = self._collections.pop((event.connection_id, event.request_id), "")
+        # Handshakes and server monitoring are not queries
+        if event.command_name in ("hello", "ismaster", "isMaster", "ping", "endSessions"):
+            return
+        observe_stage("mongo", event.duration_micros / 1e6, outcome)
+        MONGO_SECONDS.observe(event.duration_micros / 1e6, event.command_name, collection, outcome)
+
+
+class SamplingProfiler:
+    """Sample one thread's Python stack at a fixed interval from a helper thread.
+
+    Samples are folded stacks (root;...;leaf), the input format of flamegraph.pl
+    and speedscope.
+    """
+
+    def __init__(self, thread_id, interval=0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.samples
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+
+def profile_requested(request):
+    # PROFILE_SAMPLE_RATE profiles a random share of requests; with
+    # PROFILE_ENABLED=1 a single request can ask for it with "X-Profile: 1"
+    rate = float(os.getenv("PROFILE_SAMPLE_RATE", 0))
+    if rate and random.random() < rate:
+        return True
+    return os.getenv("PROFILE_ENABLED") == "1" and request.headers.get("X-Profile") == "1"
+
+
+def write_profile(samples, route):
+    directory = os.getenv("PROFILE_DIR", "profiles")
+    os.makedirs(directory, exist_ok=True)
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", route).strip("_") or "root"
+    path = os.path.join(directory, f"{time.strftime('%Y%m%d-%H%M%S')}_{slug}_{os.getpid()}.folded")
+    with open(path, "w") as f:
+        for stack, count in samples.most_common():
+            f.write(f"{stack} {count}\n")
+    return path
+
+
+def instrument(app, request, g, profile=True, is_async=False):
+    """Time every request on a Flask (or Quart) app and log slow ones.
+
+    `request` and `g` are the framework's context proxies; Quart needs
+    is_async=True so the hooks run on the request's own task. The duration is
+    measured up to the response headers, so streamed bodies count as
+    time-to-first-byte. Profiling samples the request thread and is only
+    meaningful for thread-per-request servers.
+    """
+    def start_request_timer():
+        g.request_start = time.perf_counter()
+        g.request_stages = {}
+        _request_stages.set(g.request_stages)
+        g.profiler = SamplingProfiler(threading.get_ident()).start() if profile and profile_requested(request) else None
+
+    def record_request(response):
+        start = getattr(g, "request_start", None)
+        if start is None:
+            return response
+        elapsed = time.perf_counter() - start
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        REQUEST_SECONDS.observe(elapsed, request.method, route, str(response.status_code))
+
+        fields = {
+            "method": request.method,
+            "route": route,
+            "status": response.status_code,
+            "duration_ms": round(elapsed * 1000, 1),
+            "stages_ms": {name: round(seconds * 1000, 1) for name, seconds in g.request_stages.items()}
+        }
+        level = logging.WARNING if elapsed >= SLOW_REQUEST_SECONDS else logging.DEBUG
+        samples = stop_profiler()
+        if samples is not None:
+            level = max(level, logging.INFO)
+            try:
+                fields["profile"] = write_profile(samples, route)
+            except OSError as e:
+                log.warning("Could not write profile: %s", e)
+        if log.isEnabledFor(level):
+            log.log(level, "%s %s %s %.1fms", request.method, request.path, response.status_code,
+                    elapsed * 1000, extra=fields)
+        return response
+
+    def stop_profiler(exc=None):
+        profiler = getattr(g, "profiler", None)
+        g.profiler = None
+        return profiler.stop() if profiler else None
+
+    if is_async:
+        async def start_request_timer_async():
+            start_request_timer()
+
+        async def record_request_async(response):
+            return record_request(response)
+
+        app.before_request(start_request_timer_async)
+        app.after_request(record_request_async)
+    else:
+        app.before_request(start_request_timer)
+        app.after_request(record_request)
+        # after_request is skipped if the response could not be built
+        app.teardown_request(stop_profiler)
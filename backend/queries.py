@@ -0,0 +1,129 @@
+# Mongo query layer: indexes, per-route projections and aggregation pipelines.
+# Totals and category sums are computed by the server with $group/$unwind
+# instead of pulling whole expense documents into Python.
+import logging
+
+from pymongo import ASCENDING, DESCENDING, GEOSPHERE
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+log = logging.getLogger(__name__)
+
+# Only the fields each route actually sends to the frontend
+RECENT_EXPENSE_FIELDS = {
+    "store_name": 1,
+    "total_amount": 1,
+    "date": 1,
+    "address": 1,
+    "location": 1,
+    "items": 1,
+    "created_at": 1
+}
+
+
+def ensure_indexes(db):
+    indexes = [
+        # Recent expenses and month ranges use the prefix; map pages page on (created_at, _id)
+        (db.expenses, [("user_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], {}),
+        (db.expenses, [("user_id", ASCENDING), ("geo", GEOSPHERE)], {}),
+        (db.expenses, [("user_id", ASCENDING), ("source_hash", ASCENDING)], {"sparse": True}),
+        (db.users, [("email", ASCENDING)], {"unique": True}),
+        # Earlier versions inserted a row per validation; duplicates are removed first
+        (db.gst_details, [("gst_number", ASCENDING)], {"unique": True, "dedupe": True}),
+        (db.monthly_rollups, [("user_id", ASCENDING), ("month", DESCENDING)], {})
+    ]
+    for collection, keys, options in indexes:
+        options = dict(options)
+        dedupe = options.pop("dedupe", False)
+        try:
+            try:
+                collection.create_index(keys, **options)
+            except DuplicateKeyError:
+                if not dedupe:
+                    raise
+                removed = remove_duplicates(collection, keys[0][0])
+                log.warning("Removed %d duplicate %s documents before indexing", removed, collection.name)
+                collection.create_index(keys, **options)
+        except PyMongoError as e:
+            # e.g. duplicate emails or GSTINs left over from before the unique index
+            log.warning("Index creation failed on %s: %s", collection.name, e)
+
+
+def remove_duplicates(collection, field):
+    """Keep only the most recently updated document per `field` value; returns how many were deleted."""
+    pipeline = [
+        {"$sort": {"updated_at": DESCENDING, "_id": DESCENDING}},
+        {"$group": {"_id": f"${field}", "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}}
+    ]
+    removed = 0
+    for group in collection.aggregate(pipeline, allowDiskUse=True):
+        removed += collection.delete_many({"_id": {"$in": group["ids"][1:]}}).deleted_count
+    return removed
+
+
+def recent_expenses(expenses_collection, user_id, limit=10):
+    return list(expenses_collection.find(
+        {"user_id": user_id},
+        RECENT_EXPENSE_FIELDS
+    ).sort("created_at", DESCENDING).limit(limit))
+
+
+async def recent_expenses_async(expenses_collection, user_id, limit=10):
+    cursor = expenses_collection.find({"user_id": user_id}, RECENT_EXPENSE_FIELDS)
+    return await cursor.sort("created_at", DESCENDING).limit(limit).to_list(limit)
+
+
+def summary_pipelines(match):
+    """Totals/counts and per-category sums, each grouped by user and month.
+
+    They run as two aggregations rather than one $facet: a $facet returns a
+    single document, which a user with a long history can push past 16MB.
+    """
+    month = {"$dateToString": {"format": "%Y-%m", "date": "$created_at"}}
+    totals = [
+        {"$match": match},
+        {"$group": {
+            "_id": {"user_id": "$user_id", "month": month},
+            "total_spent": {"$sum": "$total_amount"},
+            "expense_count": {"$sum": 1}
+        }}
+    ]
+    categories = [
+        {"$match": match},
+        {"$project": {"user_id": 1, "items.category": 1, "items.price": 1, "month": month}},
+        {"$unwind": "$items"},
+        {"$group": {
+            "_id": {
+                "user_id": "$user_id",
+                "month": "$month",
+                "category": {"$ifNull": ["$items.category", "Other"]}
+            },
+            # $sum only adds numbers: null, missing and numeric strings such
+            # as "50" count as 0, whereas rollups.category_sums counts
+            # float("50"). New expenses go through rollups.normalize_items, so
+            # only older documents with string prices can differ ($convert
+            # would close the gap, but mongomock, used by the benchmarks and
+            # tests, does not implement it).
+            "amount": {"$sum": "$items.price"}
+        }}
+    ]
+    return totals, categories
+
+
+def summarize_expenses(expenses_collection, match):
+    """Run summary_pipelines and return {(user_id, month): summary}."""
+    totals, categories = summary_pipelines(match)
+
+    summaries = {}
+    for row in expenses_collection.aggregate(totals, allowDiskUse=True):
+        key = (row["_id"]["user_id"], row["_id"]["month"])
+        summaries[key] = {
+            "total_spent": row["total_spent"],
+            "expense_count": row["expense_count"],
+            "categories": {}
+        }
+    for row in expenses_collection.aggregate(categories, allowDiskUse=True):
+        key = (row["_id"]["user_id"], row["_id"]["month"])
+        if key in summaries:
+            summaries[key]["categories"][row["_id"]["category"]] = row["amount"]
+    return summaries
@@ -0,0 +1,67 @@
+# Lazily initialized, per-process resources for the app factory.
+# Heavy clients (Mongo, the OCR engine) are built on first use in the process
+# that uses them, so importing app.py stays cheap and no socket, monitor
+# thread or pool is inherited across a fork: a forked worker notices the new
+# pid and builds its own. Read-only assets (spam model, phishing index) are
+# marked fork_safe instead; preload() loads them once in the parent, e.g. a
+# gunicorn master, and the workers share those pages copy-on-write.
+import gc
+import logging
+import os
+import threading
+import time
+
+from observability import observe_stage
+
+log = logging.getLogger(__name__)
+
+
+class Resource:
+    def __init__(self, name, factory, fork_safe=False):
+        self.name = name
+        self.factory = factory
+        self.fork_safe = fork_safe
+        self.init_seconds = None
+        self._value = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        pid = os.getpid()
+        if self._pid != pid and not (self.fork_safe and self._pid is not None):
+            with self._lock:
+                if self._pid != pid and not (self.fork_safe and self._pid is not None):
+                    start = time.perf_counter()
+                    self._value = self.factory()
+                    self._pid = pid
+                    self.init_seconds = time.perf_counter() - start
+                    observe_stage(f"init_{self.name}", self.init_seconds)
+                    log.info("Initialized %s in %.0fms", self.name, self.init_seconds * 1000)
+        return self._value
+
+    @property
+    def loaded(self):
+        return self._pid == os.getpid() or (self.fork_safe and self._pid is not None)
+
+    def stats(self):
+        return {
+            "loaded": self.loaded,
+            "inherited": self.loaded and self._pid != os.getpid(),
+            "init_ms": round(self.init_seconds * 1000, 1) if self.init_seconds is not None else None
+        }
+
+
+def preload(resources, hooks=()):
+    """Load fork-safe resources now, before the server forks its workers."""
+    start = time.perf_counter()
+    for resource in resources:
+        if not resource.fork_safe:
+            raise ValueError(f"{resource.name} holds per-process state and cannot be preloaded")
+        resource.get()
+    for hook in hooks:
+        hook()
+    # Move everything loaded so far out of the collector's reach: a collection
+    # in a worker would otherwise write to every object header and unshare the pages
+    gc.freeze()
+    log.info("Preloaded %s in %.0fms", ", ".join(resource.name for resource in resources),
+             (time.perf_counter() - start) * 1000)
@@ -0,0 +1,176 @@
+# Response layer for read-heavy, per-user routes (dashboard, map data).
+# Payloads are encoded with orjson, which serializes ObjectId and datetime
+# through one default hook instead of per-route conversion loops. Every user
+# has a data version that writes bump; it is cached per process, so a poll
+# whose If-None-Match / If-Modified-Since still matches is answered with 304
+# before any Mongo query. Offline writers (imports, backfills, rollup rebuilds)
+# bump the same versions. Large bodies can optionally be gzipped.
+# The helpers take plain header mappings so the Flask and Quart apps share them.
+import gzip
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from email.utils import parsedate_to_datetime
+
+import orjson
+from bson import ObjectId
+from pymongo import ReturnDocument
+from werkzeug.http import http_date
+
+# 0 disables compression; otherwise bodies of at least this many bytes are gzipped
+GZIP_MIN_BYTES = int(os.getenv("GZIP_MIN_BYTES", 0))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", 5))
+# Browsers may keep the body but must revalidate on every poll
+CACHE_CONTROL = "private, no-cache"
+
+
+def _default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    # Same format as Flask's jsonify, so the JSON contract does not change
+    if isinstance(value, (datetime, date)):
+        return http_date(value)
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(payload):
+    # Keys sorted like jsonify's, so responses stay diffable against the old encoder
+    return orjson.dumps(payload, default=_default, option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_SORT_KEYS)
+
+
+class DataVersions:
+    """A monotonic per-user version of the data behind the read-heavy routes.
+
+    Versions live in Mongo (one small document per user) so every worker sees
+    the same sequence; each process caches them for `ttl` seconds, which bounds
+    how long a write handled by another worker can go unnoticed.
+    """
+
+    def __init__(self, collection, ttl=5, max_entries=10000):
+        self.collection = collection
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        """Return (version, updated_at); (0, None) for a user who has never written."""
+        cached = self._lookup(user_id)
+        if cached is not None:
+            return cached
+        return self._store(user_id, self.collection.find_one({"_id": user_id}))
+
+    async def aget(self, user_id, fetch):
+        """Like get(), with a coroutine `fetch(user_id)` returning the version document."""
+        cached = self._lookup(user_id)
+        if cached is not None:
+            return cached
+        return self._store(user_id, await fetch(user_id))
+
+    def bump(self, user_id):
+        doc = self.collection.find_one_and_update(
+            {"_id": user_id}, self.bump_update(), upsert=True, return_document=ReturnDocument.AFTER
+        )
+        return self._store(user_id, doc)
+
+    def bump_many(self, user_ids):
+        """Bump every user in `user_ids`, e.g. after an offline backfill; returns how many."""
+        user_ids = list(dict.fromkeys(user_ids))
+        update = self.bump_update()
+        for user_id in user_ids:
+            self.collection.update_one({"_id": user_id}, update, upsert=True)
+        # Drop rather than store: the next get() reads the bumped version
+        with self._lock:
+            for user_id in user_ids:
+                self._entries.pop(user_id, None)
+        return len(user_ids)
+
+    async def abump(self, user_id, update):
+        """Like bump(), with a coroutine `update(user_id, bump_update())` returning the new document."""
+        return self._store(user_id, await update(user_id, self.bump_update()))
+
+    @staticmethod
+    def bump_update():
+        # Second precision: Last-Modified and If-Modified-Since cannot carry more
+        now = datetime.utcnow().replace(microsecond=0)
+        return {"$inc": {"version": 1}, "$set": {"updated_at": now}}
+
+    def _lookup(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry and time.monotonic() - entry[1] < self.ttl:
+                self._entries.move_to_end(user_id)
+                return entry[0]
+            return None
+
+    def _store(self, user_id, doc):
+        value = (doc["version"], doc["updated_at"]) if doc else (0, None)
+        with self._lock:
+            entry = self._entries.get(user_id)
+            # Versions only grow: a read that raced with a bump must not roll it back
+            if entry and entry[0][0] > value[0]:
+                value = entry[0]
+            self._entries[user_id] = (value, time.monotonic())
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+
+def validators(user_id, data_version, *scope, not_before=None):
+    """ETag and Last-Modified for one user's view at `data_version`.
+
+    `scope` holds whatever else the payload depends on (route, query string,
+    current month), so different views never share an ETag. `not_before`
+    raises Last-Modified for views that also change with time, such as the
+    start of the month a dashboard covers.
+    """
+    version, updated_at = data_version
+    if not_before and (updated_at is None or updated_at < not_before):
+        updated_at = not_before
+    key = "\0".join(str(part) for part in (user_id, version) + scope)
+    etag = 'W/"%s"' % hashlib.blake2b(key.encode("utf-8"), digest_size=12).hexdigest()
+    return etag, updated_at
+
+
+def is_not_modified(headers, etag, last_modified):
+    if_none_match = headers.get("If-None-Match")
+    # If-None-Match takes precedence; If-Modified-Since is only used without it
+    if if_none_match:
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in tags or etag.removeprefix("W/") in tags
+    if_modified_since = headers.get("If-Modified-Since")
+    if if_modified_since and last_modified:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return last_modified.replace(tzinfo=timezone.utc) <= since
+    return False
+
+
+def cache_headers(etag, last_modified):
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if last_modified:
+        headers["Last-Modified"] = http_date(last_modified)
+    return headers
+
+
+def encode_json(payload, request_headers, etag=None, last_modified=None):
+    """Return (body, headers) for a JSON payload, gzipped if enabled, large enough and accepted."""
+    body = dumps(payload)
+    headers = cache_headers(etag, last_modified) if etag else {}
+    if GZIP_MIN_BYTES:
+        headers["Vary"] = "Accept-Encoding"
+        if len(body) >= GZIP_MIN_BYTES and "gzip" in request_headers.get("Accept-Encoding", ""):
+            body = gzip.compress(body, compresslevel=GZIP_LEVEL)
+            headers["Content-Encoding"] = "gzip"
+    return body, headers
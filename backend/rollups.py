@@ -0,0 +1,152 @@
+# Pre-aggregated per-user monthly spending rollups.
+# Each expense insert bumps one small document per user and month, so the
+# dashboard and assistant no longer have to scan the month's expenses.
+# Rebuild/backfill: python rollups.py [--user USER_ID] [--mongo-uri URI]
+import argparse
+from datetime import datetime
+
+from queries import summarize_expenses
+
+RECENT_STORES = 10
+
+
+def month_key(when):
+    return when.strftime("%Y-%m")
+
+
+def rollup_id(user_id, month):
+    return f"{user_id}:{month}"
+
+
+def encode_category(category):
+    # Mongo field names cannot contain "." or start with "$"
+    return str(category).replace(".", "．").replace("$", "＄")
+
+
+def decode_category(category):
+    return category.replace("．", ".").replace("＄", "$")
+
+
+def normalize_items(items):
+    """Items with numeric prices, so the rollup and the aggregation in queries.py agree."""
+    normalized = []
+    for item in items or []:
+        try:
+            price = float(item.get("price") or 0)
+        except (TypeError, ValueError):
+            price = 0.0
+        normalized.append(dict(item, price=price))
+    return normalized
+
+
+def category_sums(expense):
+    sums = {}
+    for item in expense.get("items", []) or []:
+        category = item.get("category", "Other")
+        sums[category] = sums.get(category, 0) + float(item.get("price") or 0)
+    return sums
+
+
+def rollup_update(expense):
+    """Return the (filter, update) pair that folds `expense` into its rollup."""
+    month = month_key(expense["created_at"])
+    inc = {
+        "total_spent": float(expense.get("total_amount") or 0),
+        "expense_count": 1
+    }
+    for category, amount in category_sums(expense).items():
+        inc[f"categories.{encode_category(category)}"] = amount
+
+    update = {
+        "$inc": inc,
+        "$set": {"updated_at": datetime.utcnow()},
+        "$setOnInsert": {"user_id": expense["user_id"], "month": month}
+    }
+    if expense.get("store_name"):
+        update["$push"] = {"recent_stores": {"$each": [expense["store_name"]], "$slice": -RECENT_STORES}}
+
+    return {"_id": rollup_id(expense["user_id"], month)}, update
+
+
+def apply_expense(rollups_collection, expense):
+    """Fold a newly inserted expense into its user's monthly rollup."""
+    query, update = rollup_update(expense)
+    rollups_collection.update_one(query, update, upsert=True)
+
+
+async def apply_expense_async(rollups_collection, expense):
+    query, update = rollup_update(expense)
+    await rollups_collection.update_one(query, update, upsert=True)
+
+
+def get_rollup(rollups_collection, user_id, when=None):
+    """Return the rollup for the month containing `when` (default: now)."""
+    month = month_key(when or datetime.utcnow())
+    return rollup_from_doc(rollups_collection.find_one({"_id": rollup_id(user_id, month)}), month)
+
+
+async def get_rollup_async(rollups_collection, user_id, when=None):
+    month = month_key(when or datetime.utcnow())
+    return rollup_from_doc(await rollups_collection.find_one({"_id": rollup_id(user_id, month)}), month)
+
+
+def rollup_from_doc(doc, month):
+    doc = doc or {}
+    return {
+        "month": month,
+        "total_spent": doc.get("total_spent", 0),
+        "expense_count": doc.get("expense_count", 0),
+        "categories": {decode_category(k): v for k, v in doc.get("categories", {}).items()},
+        "recent_stores": doc.get("recent_stores", [])
+    }
+
+
+def rebuild(expenses_collection, rollups_collection, user_id=None, data_versions=None):
+    """Recompute rollups from the expenses collection and replace the stored ones.
+
+    With `data_versions`, every user whose rollups were replaced gets a new data version.
+    """
+    query = {"user_id": user_id} if user_id else {}
+    summaries = summarize_expenses(expenses_collection, dict(query, created_at={"$type": "date"}))
+
+    changed_users = set(rollups_collection.distinct("user_id", query)) if data_versions is not None else set()
+    rollups_collection.delete_many(query)
+    now = datetime.utcnow()
+    for (expense_user_id, month), summary in summaries.items():
+        start = datetime.strptime(month, "%Y-%m")
+        end = datetime(start.year + start.month // 12, start.month % 12 + 1, 1)
+        stores = expenses_collection.find(
+            {"user_id": expense_user_id, "created_at": {"$gte": start, "$lt": end}, "store_name": {"$nin": [None, ""]}},
+            {"store_name": 1}
+        ).sort("created_at", -1).limit(RECENT_STORES)
+
+        rollup_key = rollup_id(expense_user_id, month)
+        rollups_collection.replace_one({"_id": rollup_key}, {
+            "_id": rollup_key,
+            "user_id": expense_user_id,
+            "month": month,
+            "total_spent": summary["total_spent"],
+            "expense_count": summary["expense_count"],
+            "categories": {encode_category(k): v for k, v in summary["categories"].items()},
+            "recent_stores": [doc["store_name"] for doc in stores][::-1],
+            "updated_at": now
+        }, upsert=True)
+        changed_users.add(expense_user_id)
+    if data_versions is not None:
+        data_versions.bump_many(changed_users)
+    return len(summaries)
+
+
+if __name__ == "__main__":
+    from pymongo import MongoClient
+
+    from responses import DataVersions
+
+    parser = argparse.ArgumentParser(description="Rebuild monthly spending rollups")
+    parser.add_argument("--mongo-uri", default="mongodb://localhost:27017/")
+    parser.add_argument("--user", help="Only rebuild rollups for this user id")
+    args = parser.parse_args()
+
+    db = MongoClient(args.mongo_uri).expense_tracker
+    count = rebuild(db.expenses, db.monthly_rollups, args.user, DataVersions(db.data_versions))
+    print(f"Rebuilt {count} rollup documents")
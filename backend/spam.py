@@ -0,0 +1,167 @@
+# Batch spam/phishing scoring for /api/chat/spam-check.
+# The classifier is loaded once and scores a whole request in one vectorized
+# call; links are matched against the phishing feed by normalized host.
+# Models trained with train_spam.py are versioned directories under
+# SPAM_MODEL_DIR; their arrays are memory-mapped, so loading is fast and every
+# worker shares the same pages.
+import csv
+import logging
+import os
+import re
+from urllib.parse import urlsplit
+
+import joblib
+
+log = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SPAM_MODEL_PATH = os.getenv("SPAM_MODEL_PATH", os.path.join(BASE_DIR, "spam_classifier.pkl"))
+SPAM_MODEL_DIR = os.getenv("SPAM_MODEL_DIR", os.path.join(BASE_DIR, "spam_models"))
+# <SPAM_MODEL_DIR>/LATEST names the version directory to serve
+LATEST_FILE = "LATEST"
+MODEL_FILE = "model.joblib"
+PHISHING_URLS_PATH = os.getenv("PHISHING_URLS_PATH", os.path.join(BASE_DIR, "phishing_urls.csv"))
+PHISHING_INDEX_PATH = os.getenv("PHISHING_INDEX_PATH", os.path.join(BASE_DIR, "phishing_index.bin"))
+
+# Only explicit links: a bare "word.word" is as often "3pm.Thanks" or "file.txt" as a host
+URL_REGEX = re.compile(r"\b(?:https?://|www\.)[^\s<>\"']+", re.IGNORECASE)
+TRAILING_PUNCTUATION = ".,;:!?)]}'\""
+
+
+def extract_links(text):
+    return [match.rstrip(TRAILING_PUNCTUATION) for match in URL_REGEX.findall(text or "")]
+
+
+def split_url(url):
+    """Return (host, path) with the scheme, port, "www." and case removed."""
+    if "://" not in url:
+        url = "http://" + url
+    try:
+        parts = urlsplit(url.strip())
+        host = (parts.hostname or "").rstrip(".")
+    except ValueError:
+        return "", ""
+    if host.startswith("www."):
+        host = host[4:]
+    return host, parts.path.rstrip("/")
+
+
+def host_suffixes(host):
+    # a.b.example.com -> a.b.example.com, b.example.com, example.com
+    labels = host.split(".")
+    return [".".join(labels[i:]) for i in range(len(labels) - 1)]
+
+
+class PhishingIndex:
+    def __init__(self, urls=()):
+        self.domains = set()
+        self.urls = set()
+        for url in urls:
+            self.add(url)
+
+    @classmethod
+    def from_csv(cls, path):
+        index = cls()
+        if not os.path.exists(path):
+            log.warning("Phishing URL list not found at %s", path)
+            return index
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                if row.get("url"):
+                    index.add(row["url"])
+        return index
+
+    def add(self, url):
+        host, path = split_url(url)
+        if not host:
+            return
+        self.urls.add(host + path)
+        # Only a bare-domain entry blocks the whole host: a phishing page on
+        # a shared host must not flag every other page there
+        if not path:
+            self.domains.add(host)
+
+    def is_phishing(self, url):
+        host, path = split_url(url)
+        if not host:
+            return False
+        if host + path in self.urls:
+            return True
+        return any(suffix in self.domains for suffix in host_suffixes(host))
+
+    def lookup_many(self, links):
+        return [self.is_phishing(link) for link in links]
+
+    def stats(self):
+        return {"domains": len(self.domains), "urls": len(self.urls)}
+
+    def __len__(self):
+        return len(self.urls)
+
+
+def latest_model_version(model_dir=SPAM_MODEL_DIR):
+    try:
+        with open(os.path.join(model_dir, LATEST_FILE), encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def load_spam_model(path=None):
+    """Load the latest trained version from SPAM_MODEL_DIR, else the single pickle at SPAM_MODEL_PATH.
+
+    `path` may be a pickle, a version directory or a model directory with a LATEST file.
+    """
+    if path is None:
+        path = SPAM_MODEL_DIR if latest_model_version() else SPAM_MODEL_PATH
+    try:
+        if os.path.isdir(path):
+            version = latest_model_version(path)
+            if version:
+                path = os.path.join(path, version)
+            # Versioned artifacts are stored uncompressed so the arrays can be mapped
+            model = joblib.load(os.path.join(path, MODEL_FILE), mmap_mode="r")
+            log.info("Loaded spam model %s", path)
+            return model
+        return joblib.load(path)
+    except Exception as e:
+        log.warning("Could not load spam model from %s: %s", path, e)
+        return None
+
+
+def load_phishing_index():
+    """Prefer the shared memory-mapped index; fall back to an in-memory set from the CSV."""
+    if os.path.exists(PHISHING_INDEX_PATH):
+        from phishing_index import MmapPhishingIndex
+        try:
+            return MmapPhishingIndex(PHISHING_INDEX_PATH)
+        except (OSError, ValueError) as e:
+            log.warning("Could not open phishing index %s: %s", PHISHING_INDEX_PATH, e)
+    return PhishingIndex.from_csv(PHISHING_URLS_PATH)
+
+
+class SpamScorer:
+    def __init__(self, model=None, phishing_index=None):
+        self.model = model
+        self.phishing_index = phishing_index if phishing_index is not None else PhishingIndex()
+
+    def score(self, messages):
+        """Score all messages at once and return the spam-check response rows."""
+        if self.model is not None:
+            predictions = self.model.predict(messages)
+            verdicts = ["scam" if prediction == "spam" else "safe" for prediction in predictions]
+        else:
+            verdicts = ["safe"] * len(messages)  # Default if model not loaded
+
+        # One index lookup for every link in the batch
+        links = [extract_links(message) for message in messages]
+        flags = iter(self.phishing_index.lookup_many([link for message_links in links for link in message_links]))
+
+        results = []
+        for message_links, verdict in zip(links, verdicts):
+            detected_links = ["suspicious" if next(flags) else "safe" for _ in message_links]
+            results.append({
+                "message": verdict,
+                "detected_links": detected_links if detected_links else "no links found"
+            })
+        return results
@@ -0,0 +1,104 @@
+# Token streaming for LLM responses as Server-Sent Events or NDJSON.
+# Tokens are forwarded as the llama_index client yields them; when the
+# client disconnects the WSGI server closes our generator and we close the
+# upstream stream too, so the worker stops generating. The async server uses
+# astream_completion, which produces the same events.
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime
+
+from observability import observe_stage
+
+log = logging.getLogger(__name__)
+
+
+def format_event(event, data, fmt):
+    if fmt == "ndjson":
+        return json.dumps(dict(data, event=event)) + "\n"
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def stream_stats(start, first_token_at, tokens):
+    elapsed = time.perf_counter() - start
+    generating = elapsed - (first_token_at - start) if first_token_at else 0
+    return {
+        "time_to_first_token_ms": round((first_token_at - start) * 1000, 1) if first_token_at else None,
+        "tokens": tokens,
+        "tokens_per_sec": round(tokens / generating, 1) if generating > 0 else None,
+        "total_ms": round(elapsed * 1000, 1)
+    }
+
+
+def done_event(text, stats, fmt):
+    log.debug("Chat stream stats", extra=stats)
+    if stats["time_to_first_token_ms"] is not None:
+        observe_stage("llm_first_token", stats["time_to_first_token_ms"] / 1000)
+    observe_stage("llm_stream", stats["total_ms"] / 1000)
+    return format_event("done", {
+        "response": "".join(text),
+        "timestamp": datetime.utcnow().isoformat(),
+        "stats": stats
+    }, fmt)
+
+
+def stream_completion(llm, prompt, fmt="sse"):
+    """Yield token events for `prompt`, then a final event with timing stats."""
+    start = time.perf_counter()
+    first_token_at = None
+    tokens = 0
+    text = []
+    upstream = None
+
+    try:
+        upstream = llm.stream_complete(prompt)
+        for chunk in upstream:
+            delta = chunk.delta or ""
+            if not delta:
+                continue
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+            tokens += 1
+            text.append(delta)
+            yield format_event("token", {"token": delta}, fmt)
+        yield done_event(text, stream_stats(start, first_token_at, tokens), fmt)
+    except GeneratorExit:
+        log.info("Chat stream cancelled by client after %d tokens", tokens)
+        raise
+    except Exception as e:
+        log.error("Error in chat stream: %s", e)
+        yield format_event("error", {"error": "Failed to get response from assistant"}, fmt)
+    finally:
+        if upstream is not None and hasattr(upstream, "close"):
+            upstream.close()
+
+
+async def astream_completion(llm, prompt, fmt="sse"):
+    start = time.perf_counter()
+    first_token_at = None
+    tokens = 0
+    text = []
+    upstream = None
+
+    try:
+        upstream = llm.astream_complete(prompt)
+        async for chunk in upstream:
+            delta = chunk.delta or ""
+            if not delta:
+                continue
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+            tokens += 1
+            text.append(delta)
+            yield format_event("token", {"token": delta}, fmt)
+        yield done_event(text, stream_stats(start, first_token_at, tokens), fmt)
+    except (GeneratorExit, asyncio.CancelledError):
+        log.info("Chat stream cancelled by client after %d tokens", tokens)
+        raise
+    except Exception as e:
+        log.error("Error in chat stream: %s", e)
+        yield format_event("error", {"error": "Failed to get response from assistant"}, fmt)
+    finally:
+        if upstream is not None:
+            await upstream.aclose()
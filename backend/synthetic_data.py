@@ -0,0 +1,165 @@
+# Synthetic users and expenses at configurable scale, for benchmarks and load tests.
+# Documents follow the ../users.json and ../expenses.json schema (categorized
+# items, GSTINs with a valid check character, photon-style locations plus the
+# GeoJSON point), and monthly rollups are rebuilt afterwards so dashboard reads
+# match the expenses. The same arguments and --seed always produce the same data.
+# Usage: python synthetic_data.py [--users 100] [--expenses 200] [--months 12] [--db expense_tracker_bench] [--drop]
+import argparse
+import random
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from werkzeug.security import generate_password_hash
+
+from extractor import gstin_check_char
+from mapdata import to_geojson
+from queries import ensure_indexes
+from rollups import rebuild
+
+# Every synthetic user can log in with this password
+PASSWORD = "benchmark"
+
+FIRST_NAMES = ["Aarav", "Priya", "Rahul", "Ananya", "Vikram", "Sneha", "Arjun", "Kavya", "Rohan", "Meera", "Karthik", "Divya"]
+# (city, state code, PIN prefix, lat, lon)
+CITIES = [
+    ("Mumbai", "27", "400", 19.0760, 72.8777), ("Pune", "27", "411", 18.5204, 73.8567),
+    ("Bengaluru", "29", "560", 12.9716, 77.5946), ("Chennai", "33", "600", 13.0827, 80.2707),
+    ("Hyderabad", "36", "500", 17.3850, 78.4867), ("Delhi", "07", "110", 28.7041, 77.1025),
+    ("Kolkata", "19", "700", 22.5726, 88.3639), ("Ahmedabad", "24", "380", 23.0225, 72.5714),
+]
+# Merchant name templates and the catalog they sell from: (item, category, min price, max price)
+MERCHANTS = {
+    "{} SUPERMARKET": [("Basmati Rice 5kg", "Food", 350, 900), ("Toor Dal 1kg", "Food", 120, 220),
+                       ("Sunflower Oil 1L", "Food", 130, 240), ("Milk 1L", "Food", 50, 70), ("Atta 10kg", "Food", 380, 560)],
+    "{} RESTAURANT": [("Masala Dosa", "Food", 60, 180), ("Veg Thali", "Food", 150, 400),
+                      ("Chicken Biryani", "Food", 220, 480), ("Filter Coffee", "Food", 30, 90)],
+    "{} DIGITAL": [("USB-C Charger", "Electronics", 499, 2499), ("Wireless Earphones", "Electronics", 999, 7999),
+                   ("Power Bank", "Electronics", 899, 3499), ("HDMI Cable", "Electronics", 199, 899)],
+    "{} FASHIONS": [("Cotton Shirt", "Clothing", 499, 2499), ("Denim Jeans", "Clothing", 899, 3999),
+                    ("Kurta", "Clothing", 599, 2999), ("Running Shoes", "Clothing", 1499, 6999)],
+    "{} PHARMACY": [("Paracetamol Tablet", "Healthcare", 20, 60), ("Cough Syrup", "Healthcare", 80, 180),
+                    ("Vitamin D Capsules", "Healthcare", 150, 450)],
+    "{} FUELS": [("Petrol", "Transportation", 500, 4000), ("Diesel", "Transportation", 500, 5000)],
+    "{} CINEMAS": [("Movie Ticket", "Entertainment", 150, 600), ("Popcorn Combo", "Food", 250, 550)],
+    "{} ELECTRICITY BOARD": [("Electricity Bill", "Utilities", 600, 4500)],
+}
+BRANDS = ["SRI LAKSHMI", "NEW INDIA", "ROYAL", "GREEN LEAF", "STAR", "METRO", "SHREE GANESH", "CITY", "PRIME", "GOLDEN"]
+
+
+def make_gstin(rng, state_code):
+    pan = "".join(rng.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ") for _ in range(5))
+    pan += "".join(rng.choice("0123456789") for _ in range(4)) + rng.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ")
+    prefix = f"{state_code}{pan}1Z"
+    return prefix + gstin_check_char(prefix)
+
+
+def make_merchants(rng, count):
+    merchants = []
+    for index in range(count):
+        template, catalog = rng.choice(list(MERCHANTS.items()))
+        city, state_code, pin_prefix, lat, lon = rng.choice(CITIES)
+        name = template.format(rng.choice(BRANDS))
+        address = f"{name}, Shop {rng.randint(1, 250)}, Main Road, {city}, {pin_prefix}{rng.randint(1, 99):03d}"
+        merchants.append({
+            "store_name": name,
+            "gst_number": make_gstin(rng, state_code),
+            "address": address,
+            "catalog": catalog,
+            "location": {
+                "lat": round(lat + rng.uniform(-0.15, 0.15), 7),
+                "lon": round(lon + rng.uniform(-0.15, 0.15), 7),
+                "display_name": f"{name.title()}, {city}, India"
+            }
+        })
+    return merchants
+
+
+def make_user(rng, index, password_hash, now):
+    created_at = now - timedelta(days=rng.randint(30, 730))
+    return {
+        "_id": str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+        "email": f"user{index}@example.com",
+        "password": password_hash,
+        "profile_completed": True,
+        "created_at": created_at,
+        "age": rng.randint(18, 70),
+        "income": rng.choice([25000, 40000, 60000, 100000, 150000, 250000]),
+        "name": f"{rng.choice(FIRST_NAMES)} {index}",
+        "updated_at": created_at
+    }
+
+
+def make_expense(rng, user_id, merchant, created_at):
+    items = []
+    for name, category, low, high in rng.sample(merchant["catalog"], rng.randint(1, len(merchant["catalog"]))):
+        items.append({"category": category, "name": name, "price": round(rng.uniform(low, high), 2)})
+    expense = {
+        "user_id": user_id,
+        "gst_number": merchant["gst_number"],
+        "store_name": merchant["store_name"],
+        # Totals include tax on top of the item prices, as on real receipts
+        "total_amount": round(sum(item["price"] for item in items) * rng.choice([1.0, 1.05, 1.12, 1.18]), 2),
+        "items": items,
+        "date": created_at.strftime("%Y-%m-%d"),
+        "address": merchant["address"],
+        "created_at": created_at,
+        "location": merchant["location"]
+    }
+    geo = to_geojson(merchant["location"])
+    if geo:
+        expense["geo"] = geo
+    return expense
+
+
+def generate(db, users=100, expenses_per_user=200, months=12, merchants=500, seed=42, batch_size=5000):
+    """Insert synthetic users and expenses into `db`; returns the user documents."""
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    # scrypt is deliberately slow, so every user shares one hash
+    password_hash = generate_password_hash(PASSWORD)
+    merchant_pool = make_merchants(rng, merchants)
+
+    user_docs = [make_user(rng, index, password_hash, now) for index in range(users)]
+    db.users.insert_many(user_docs, ordered=False)
+
+    window = timedelta(days=30 * months).total_seconds()
+    batch = []
+    for user in user_docs:
+        # Each user shops at a handful of regular merchants
+        regulars = rng.sample(merchant_pool, min(len(merchant_pool), rng.randint(5, 25)))
+        for _ in range(rng.randint(expenses_per_user // 2, expenses_per_user * 3 // 2)):
+            created_at = now - timedelta(seconds=rng.uniform(0, window))
+            batch.append(make_expense(rng, user["_id"], rng.choice(regulars), created_at))
+            if len(batch) >= batch_size:
+                db.expenses.insert_many(batch, ordered=False)
+                batch = []
+    if batch:
+        db.expenses.insert_many(batch, ordered=False)
+
+    ensure_indexes(db)
+    rebuild(db.expenses, db.monthly_rollups)
+    return user_docs
+
+
+if __name__ == "__main__":
+    from pymongo import MongoClient
+
+    parser = argparse.ArgumentParser(description="Fill Mongo with synthetic users and expenses")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--expenses", type=int, default=200, help="Average expenses per user")
+    parser.add_argument("--months", type=int, default=12, help="History spread over this many months")
+    parser.add_argument("--merchants", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--mongo-uri", default="mongodb://localhost:27017/")
+    parser.add_argument("--db", default="expense_tracker_bench", help="Target database (not the real one by default)")
+    parser.add_argument("--drop", action="store_true", help="Drop the target database first")
+    args = parser.parse_args()
+
+    client = MongoClient(args.mongo_uri)
+    if args.drop:
+        client.drop_database(args.db)
+    start = time.perf_counter()
+    user_docs = generate(client[args.db], args.users, args.expenses, args.months, args.merchants, args.seed)
+    print(f"Inserted {len(user_docs)} users and {client[args.db].expenses.count_documents({})} expenses "
+          f"into {args.db} in {time.perf_counter() - start:.1f}s (password: {PASSWORD!r})")
@@ -0,0 +1,21 @@
+# The backend modules use flat imports and run from backend/
+import os
+import sys
+
+import mongomock
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def backend(monkeypatch, tmp_path):
+    """app.py on a fresh mongomock database, with the stub LLM and uploads under tmp_path."""
+    monkeypatch.setenv("LLM_BACKEND", "stub")
+    monkeypatch.chdir(tmp_path)
+    import app
+
+    monkeypatch.setattr(app, "MongoClient", mongomock.MongoClient)
+    # Reconnect on first use, like a fresh worker
+    monkeypatch.setattr(app.mongo, "_pid", None)
+    return app
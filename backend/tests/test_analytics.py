@@ -0,0 +1,82 @@
+from datetime import datetime
+
+import mongomock
+import numpy as np
+import pytest
+
+from analytics import AnalyticsCache, Ledger, project_month, summarize
+from queries import summarize_expenses
+
+NOW = datetime(2024, 6, 15)
+
+
+def expense(created_at, store, total, items):
+    return {"user_id": "u1", "created_at": created_at, "store_name": store, "total_amount": total,
+            "items": [{"category": category, "price": price} for category, price in items]}
+
+
+EXPENSES = [
+    expense(datetime(2024, 3, 30), "Old Shop", 99.0, [("Food", 99.0)]),
+    expense(datetime(2024, 4, 2), "Bakery", 120.0, [("Food", 70.0), ("Home", 50.0)]),
+    expense(datetime(2024, 5, 11), "Grocer", 80.5, [("Food", 80.5)]),
+    expense(datetime(2024, 5, 28), "Bakery", 30.0, [("Food", 30.0)]),
+    expense(datetime(2024, 6, 3), "Pharmacy", 45.25, [("Health", 45.25)]),
+    expense(datetime(2024, 6, 9), None, 10.0, []),
+]
+
+
+@pytest.fixture
+def expenses():
+    collection = mongomock.MongoClient().expense_tracker.expenses
+    collection.insert_many([dict(doc) for doc in EXPENSES])
+    return collection
+
+
+def test_summarize_matches_the_mongo_group_pipelines(expenses):
+    summary = summarize(Ledger.from_documents(expenses.find()), NOW, months=3)
+    grouped = summarize_expenses(expenses, {"user_id": "u1"})
+
+    assert summary["months"] == ["2024-04", "2024-05", "2024-06"]
+    for slot, month in enumerate(summary["months"]):
+        row = grouped[("u1", month)]
+        assert summary["monthly_totals"][slot] == pytest.approx(row["total_spent"])
+        assert summary["monthly_counts"][slot] == row["expense_count"]
+        for category, amount in row["categories"].items():
+            assert summary["categories"][category][slot] == pytest.approx(amount)
+
+    merchants = {
+        row["_id"]: (row["total"], row["count"])
+        for row in expenses.aggregate([
+            {"$match": {"user_id": "u1", "created_at": {"$gte": datetime(2024, 4, 1)}}},
+            {"$group": {"_id": {"$ifNull": ["$store_name", "Unknown"]},
+                        "total": {"$sum": "$total_amount"}, "count": {"$sum": 1}}}
+        ])
+    }
+    assert {m["store_name"]: (m["total"], m["count"]) for m in summary["top_merchants"]} == merchants
+    assert summary["top_merchants"][0]["store_name"] == "Bakery"
+
+
+def test_projection_blends_this_months_pace_with_history():
+    projection = project_month(np.array([300.0, 310.0, 290.0, 150.0]), datetime(2024, 6, 15), income=1000)
+
+    assert projection["spent_to_date"] == 150.0
+    assert projection["days_left"] == 15
+    # Half the month elapsed: half this month's 10/day, half history's 900 / 92 days
+    assert projection["daily_rate"] == pytest.approx(0.5 * 10 + 0.5 * 900 / 92, abs=0.01)
+    assert projection["on_track"] is True
+
+
+def test_add_expense_updates_the_cached_ledger_in_place(expenses):
+    cache = AnalyticsCache(expenses)
+    before = cache.get("u1", months=3, now=NOW)
+    ledger = cache._ledgers["u1"][0]
+
+    new = expense(datetime(2024, 6, 12), "Pharmacy", 20.0, [("Health", 20.0)])
+    expenses.insert_one(dict(new))
+    cache.add_expense(new)
+    after = cache.get("u1", months=3, now=NOW)
+
+    assert cache._ledgers["u1"][0] is ledger
+    assert after["monthly_totals"][-1] == round(before["monthly_totals"][-1] + 20.0, 2)
+    assert after["monthly_counts"][-1] == before["monthly_counts"][-1] + 1
+    assert after == summarize(Ledger.from_documents(expenses.find()), NOW, months=3)
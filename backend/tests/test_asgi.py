@@ -0,0 +1,24 @@
+import asyncio
+
+import pytest
+
+from observability import _request_stages, observe_stage
+
+
+@pytest.fixture
+def asgi(monkeypatch, tmp_path):
+    monkeypatch.setenv("LLM_BACKEND", "stub")
+    monkeypatch.chdir(tmp_path)
+    import asgi
+    return asgi
+
+
+def test_stages_timed_in_run_blocking_reach_the_request(asgi):
+    async def request():
+        stages = {}
+        _request_stages.set(stages)
+        await asgi.run_blocking(observe_stage, "ocr", 0.25, executor=asgi.ocr_executor)
+        await asgi.run_blocking(lambda: observe_stage("cache", 0.5))
+        return stages
+
+    assert asyncio.run(request()) == {"ocr": 0.25, "cache": 0.5}
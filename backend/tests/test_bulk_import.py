@@ -0,0 +1,56 @@
+from datetime import datetime
+
+import mongomock
+import pytest
+
+from bulk_import import BulkImporter, receipt_datetime
+
+
+@pytest.fixture
+def db():
+    return mongomock.MongoClient().expense_tracker
+
+
+def importer(db, ai_data, on_batch=None):
+    return BulkImporter(db.expenses, db.monthly_rollups, db.imports, ocr=lambda path: "text",
+                        extract=lambda text: dict(ai_data), gst_lookup=None, workers=1, on_batch=on_batch)
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("2023-06-17", datetime(2023, 6, 17)),
+    ("2023-06-17T10:00:00", datetime(2023, 6, 17)),
+    ("17/06/2023", None),
+    (None, None),
+    ("2999-01-01", None),
+])
+def test_receipt_datetime(value, expected):
+    assert receipt_datetime(value) == expected
+
+
+def test_historical_receipt_lands_in_its_own_month(db, tmp_path):
+    (tmp_path / "old.jpg").write_bytes(b"receipt")
+    changed = []
+    bulk = importer(db, {"total_amount": 120, "date": "2023-06-17", "items": [{"category": "Food", "price": "120"}]},
+                    on_batch=changed.append)
+
+    checkpoint = bulk.create("u1", "old.jpg")
+    bulk.run(checkpoint["_id"], "u1", [str(tmp_path / "old.jpg")])
+
+    expense = db.expenses.find_one()
+    assert expense["created_at"] == datetime(2023, 6, 17)
+    rollup = db.monthly_rollups.find_one()
+    assert rollup["month"] == "2023-06"
+    assert rollup["categories"] == {"Food": 120.0}
+    assert changed == ["u1"]
+
+
+def test_unparseable_date_falls_back_to_now(db, tmp_path):
+    (tmp_path / "new.jpg").write_bytes(b"receipt")
+    bulk = importer(db, {"total_amount": 5, "date": "sometime"})
+
+    checkpoint = bulk.create("u1", "new.jpg")
+    bulk.run(checkpoint["_id"], "u1", [str(tmp_path / "new.jpg")])
+
+    expense = db.expenses.find_one()
+    assert (datetime.utcnow() - expense["created_at"]).total_seconds() < 60
+    assert expense["date"] == "sometime"
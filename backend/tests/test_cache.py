@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta
+
+import mongomock
+import pytest
+
+from cache import ReceiptCache, hash_bytes, hash_text
+
+
+@pytest.fixture
+def collection():
+    return mongomock.MongoClient().expense_tracker.receipt_cache
+
+
+def test_identical_content_hits_the_same_entry(collection):
+    cache = ReceiptCache(collection)
+    cache.set("ocr", hash_bytes(b"receipt image"), "TOTAL 100")
+
+    assert cache.get("ocr", hash_bytes(b"receipt image")) == "TOTAL 100"
+    assert cache.get("ocr", hash_bytes(b"other image")) is None
+    assert cache.stats()["ocr"] == {"hits": 1, "misses": 1, "hit_rate": 0.5}
+
+
+def test_text_hash_ignores_whitespace_and_case():
+    assert hash_text("Store  A\nTotal 100") == hash_text("store a total 100 ")
+
+
+def test_lru_evicts_the_least_recently_used_entry():
+    cache = ReceiptCache(max_entries=2)
+    cache.set("ocr", "a", 1)
+    cache.set("ocr", "b", 2)
+    cache.get("ocr", "a")
+    cache.set("ocr", "c", 3)
+
+    assert cache.get("ocr", "b") is None
+    assert cache.get("ocr", "a") == 1
+    assert cache.get("ocr", "c") == 3
+    assert cache.stats()["entries"] == 2
+
+
+def test_lru_misses_fall_through_to_mongo(collection):
+    ReceiptCache(collection).set("extraction", "digest", {"total_amount": 100.0})
+    # A fresh process: empty LRU, same collection
+    cache = ReceiptCache(collection)
+
+    assert cache.get("extraction", "digest") == {"total_amount": 100.0}
+    assert cache.stats()["entries"] == 1
+
+
+def test_expired_mongo_entries_are_misses(collection):
+    collection.insert_one({
+        "_id": "ocr:digest", "kind": "ocr", "value": "old", "created_at": datetime.utcnow() - timedelta(days=31)
+    })
+
+    assert ReceiptCache(collection).get("ocr", "digest") is None
+
+
+def test_cached_values_are_copies(collection):
+    cache = ReceiptCache(collection)
+    cache.set("extraction", "digest", {"items": []})
+    cache.get("extraction", "digest")["items"].append("mutated")
+
+    assert cache.get("extraction", "digest") == {"items": []}
@@ -0,0 +1,48 @@
+from captcha_store import CaptchaStore
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_entries_are_served_until_they_expire():
+    clock = FakeClock()
+    store = CaptchaStore(ttl=300, clock=clock)
+    captcha_id = store.put(b"png-bytes")
+
+    clock.now += 200
+    image, content_type, seconds_left = store.get(captcha_id)
+    assert (image, content_type, seconds_left) == (b"png-bytes", "image/png", 100)
+    assert store.data_uri(captcha_id) == "data:image/png;base64,cG5nLWJ5dGVz"
+
+    clock.now += 100
+    assert store.get(captcha_id) is None
+    assert store.data_uri(captcha_id) is None
+    assert len(store) == 0
+
+
+def test_reap_removes_only_expired_entries():
+    clock = FakeClock()
+    store = CaptchaStore(ttl=300, clock=clock)
+    old = store.put(b"old")
+    clock.now += 250
+    new = store.put(b"new")
+
+    clock.now += 100
+    assert store.reap() == 1
+
+    assert len(store) == 1
+    assert store.get(old) is None
+    assert store.get(new)[0] == b"new"
+
+
+def test_size_cap_drops_the_oldest_entries():
+    store = CaptchaStore(max_entries=2, clock=FakeClock())
+    first, second, third = (store.put(bytes([n])) for n in range(3))
+
+    assert store.get(first) is None
+    assert store.get(second) and store.get(third)
@@ -0,0 +1,44 @@
+from chat_context import SnapshotCache
+
+
+class Builder:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, user_id):
+        self.calls += 1
+        return f"{user_id} context {self.calls}"
+
+
+def test_hit_until_invalidated():
+    build = Builder()
+    cache = SnapshotCache(build)
+
+    assert cache.get("u1") == cache.get("u1") == "u1 context 1"
+    cache.invalidate("u1")
+    assert cache.get("u1") == "u1 context 2"
+
+
+def test_versions_stay_bounded():
+    cache = SnapshotCache(Builder(), max_entries=3)
+
+    for number in range(100):
+        cache.invalidate(f"u{number}")
+
+    assert cache.stats()["tracked_versions"] == 3
+
+
+def test_build_racing_an_evicted_invalidation_is_not_stored():
+    cache = SnapshotCache(None, max_entries=1)
+
+    def build(user_id):
+        # Another request writes for this user, then enough others to evict its version
+        cache.invalidate(user_id)
+        cache.invalidate("someone-else")
+        return "stale"
+
+    cache.build = build
+    assert cache.get("u1") == "stale"
+
+    cache.build = lambda user_id: "fresh"
+    assert cache.get("u1") == "fresh"
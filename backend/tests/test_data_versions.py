@@ -0,0 +1,72 @@
+from datetime import datetime
+
+import mongomock
+import pytest
+
+from geocoding import geocode_backlog
+from mapdata import backfill_geo
+from responses import DataVersions
+from rollups import rebuild
+
+
+class FakeGeocoder:
+    def __init__(self, known):
+        self.known = known
+
+    def geocode_many(self, addresses, workers=4):
+        return {address: self.known.get(address) for address in addresses}
+
+
+@pytest.fixture
+def db():
+    return mongomock.MongoClient().expense_tracker
+
+
+@pytest.fixture
+def versions(db):
+    return DataVersions(db.data_versions)
+
+
+def test_bump_many_increments_and_drops_cached_versions(versions):
+    versions.bump("u1")
+    assert versions.get("u1")[0] == 1
+
+    assert versions.bump_many(["u1", "u2", "u1"]) == 2
+
+    assert versions.get("u1")[0] == 2
+    assert versions.get("u2")[0] == 1
+
+
+def test_geocode_backlog_bumps_only_users_that_gained_a_location(db, versions):
+    db.expenses.insert_many([
+        {"user_id": "u1", "address": "MG Road", "location": None},
+        {"user_id": "u2", "address": "Nowhere", "location": None},
+    ])
+
+    geocode_backlog(db.expenses, FakeGeocoder({"MG Road": {"lat": 12.97, "lon": 77.59}}), data_versions=versions)
+
+    assert versions.get("u1")[0] == 1
+    assert versions.get("u2") == (0, None)
+
+
+def test_backfill_geo_bumps_backfilled_users(db, versions):
+    db.expenses.insert_many([
+        {"user_id": "u1", "location": {"lat": 12.97, "lon": 77.59}},
+        {"user_id": "u2", "location": None},
+    ])
+
+    assert backfill_geo(db.expenses, versions) == 1
+
+    assert versions.get("u1")[0] == 1
+    assert versions.get("u2") == (0, None)
+
+
+def test_rebuild_bumps_users_whose_rollups_changed(db, versions):
+    db.expenses.insert_one({"user_id": "u1", "total_amount": 10.0, "created_at": datetime(2024, 5, 1)})
+    # u2's expenses are gone, so the rebuild removes their stale rollup
+    db.monthly_rollups.insert_one({"user_id": "u2", "month": "2024-04", "total": 5.0})
+
+    rebuild(db.expenses, db.monthly_rollups, data_versions=versions)
+
+    assert versions.get("u1")[0] == 1
+    assert versions.get("u2")[0] == 1
@@ -0,0 +1,108 @@
+from datetime import datetime, timedelta
+
+import mongomock
+import pytest
+
+from geocoding import Geocoder, GeocodingError, geocode_backlog
+
+
+class FakeGeocoder:
+    def __init__(self, known):
+        self.known = known
+        self.calls = []
+
+    def geocode_many(self, addresses, workers=4):
+        self.calls.append(sorted(addresses))
+        return {address: self.known.get(address) for address in addresses}
+
+
+@pytest.fixture
+def expenses():
+    collection = mongomock.MongoClient().expense_tracker.expenses
+    collection.insert_many([
+        {"user_id": "u1", "address": "MG Road", "location": None},
+        {"user_id": "u1", "address": "Nowhere", "location": None},
+        {"user_id": "u2", "address": "Nowhere", "location": None},
+    ])
+    return collection
+
+
+def test_backlog_sets_location_and_geo(expenses):
+    geocoder = FakeGeocoder({"MG Road": {"lat": 12.97, "lon": 77.59}})
+
+    assert geocode_backlog(expenses, geocoder) == 1
+
+    doc = expenses.find_one({"address": "MG Road"})
+    assert doc["geo"] == {"type": "Point", "coordinates": [77.59, 12.97]}
+    assert "geocode_attempts" not in doc
+
+
+def test_unresolved_addresses_back_off(expenses):
+    geocoder = FakeGeocoder({})
+
+    geocode_backlog(expenses, geocoder)
+    geocode_backlog(expenses, geocoder)
+
+    assert geocoder.calls == [["MG Road", "Nowhere"], []]
+    doc = expenses.find_one({"address": "Nowhere"})
+    assert doc["geocode_attempts"] == 1
+    assert doc["geocode_retry_at"] - datetime.utcnow() > timedelta(hours=23)
+
+
+def test_backoff_doubles_once_due(expenses):
+    expenses.update_many({}, {"$set": {"geocode_attempts": 3, "geocode_retry_at": datetime.utcnow()}})
+
+    geocode_backlog(expenses, FakeGeocoder({}))
+
+    doc = expenses.find_one({"address": "Nowhere"})
+    assert doc["geocode_attempts"] == 4
+    assert doc["geocode_retry_at"] - datetime.utcnow() > timedelta(days=7, hours=23)
+
+
+class FakeResponse:
+    def __init__(self, status, data=None):
+        self.status = status
+        self.data = data
+
+    def raise_for_status(self):
+        if self.status >= 400:
+            raise RuntimeError(f"HTTP {self.status}")
+
+    def json(self):
+        return self.data
+
+
+class FakeHTTP:
+    """Photon stand-in: "mg road" resolves, "flaky" is rate limited, anything else is unknown."""
+
+    def get(self, url, params):
+        if params["q"] == "flaky":
+            return FakeResponse(429)
+        if params["q"] == "mg road":
+            return FakeResponse(200, {"features": [
+                {"geometry": {"coordinates": [77.59, 12.97]}, "properties": {"name": "MG Road"}}
+            ]})
+        return FakeResponse(200, {"features": []})
+
+
+@pytest.fixture
+def geocoder():
+    return Geocoder(mongomock.MongoClient().expense_tracker.geocode_cache, client=FakeHTTP())
+
+
+def test_upstream_failures_raise_on_lookup_and_are_not_cached(geocoder):
+    with pytest.raises(GeocodingError):
+        geocoder.lookup("Flaky")
+    assert geocoder.geocode("Flaky") is None
+    assert geocoder.lookup("Nowhere") is None
+
+    assert [doc["_id"] for doc in geocoder.collection.find()] == ["nowhere"]
+
+
+def test_backlog_retries_upstream_failures_without_backing_off(expenses, geocoder):
+    expenses.insert_one({"user_id": "u1", "address": "Flaky", "location": None})
+
+    assert geocode_backlog(expenses, geocoder) == 1
+
+    assert "geocode_attempts" not in expenses.find_one({"address": "Flaky"})
+    assert expenses.find_one({"address": "Nowhere"})["geocode_attempts"] == 1
@@ -0,0 +1,59 @@
+import threading
+import time
+
+import pytest
+
+from gstin import SingleFlight
+
+
+def test_followers_share_the_leaders_result():
+    flight = SingleFlight()
+
+    assert flight.do("key", lambda: 42) == (42, False)
+
+
+def test_followers_get_the_leaders_exception():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    calls, outcomes = [], []
+
+    def failing():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        raise RuntimeError("portal down")
+
+    def run():
+        try:
+            outcomes.append(flight.do("27AAPFU0939F1ZV", failing))
+        except RuntimeError as e:
+            outcomes.append(e)
+
+    leader = threading.Thread(target=run)
+    leader.start()
+    started.wait(5)
+    followers = [threading.Thread(target=run) for _ in range(3)]
+    for thread in followers:
+        thread.start()
+    # Give the followers time to block on the leader's call
+    time.sleep(0.1)
+    release.set()
+    for thread in [leader] + followers:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert len(outcomes) == 4
+    assert all(outcome is outcomes[0] for outcome in outcomes)
+    assert isinstance(outcomes[0], RuntimeError)
+
+
+def test_a_failed_call_does_not_stick():
+    flight = SingleFlight()
+
+    def boom():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        flight.do("key", boom)
+
+    assert flight.do("key", lambda: "ok") == ("ok", False)
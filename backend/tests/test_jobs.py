@@ -0,0 +1,13 @@
+import pytest
+
+from jobs import JobQueue, UserLimitError
+
+
+@pytest.mark.parametrize("name", ["bill", "import"])
+def test_user_limit_message_names_the_queue(name):
+    jobs = JobQueue(lambda payload: payload, workers=1, max_per_user=0, name=name)
+    try:
+        with pytest.raises(UserLimitError, match=f"Too many {name} jobs in progress"):
+            jobs.submit("u1", {})
+    finally:
+        jobs.stop()
@@ -0,0 +1,172 @@
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from llm_gateway import ExtractionBatcher, LLMGateway, LLMTimeout, LLMUnavailable, StubBackend, TextResponse
+
+
+class SlowStreamBackend:
+    def __init__(self, chunks=3, delay=0.0):
+        self.chunks = chunks
+        self.delay = delay
+
+    def stream_complete(self, prompt):
+        for number in range(self.chunks):
+            time.sleep(self.delay)
+            yield TextResponse("", delta=str(number))
+
+    async def astream_complete(self, prompt):
+        for number in range(self.chunks):
+            await asyncio.sleep(self.delay)
+            yield TextResponse("", delta=str(number))
+
+
+def test_stream_holds_a_slot_until_closed():
+    gateway = LLMGateway(SlowStreamBackend(), max_concurrency=1, max_queue=0)
+    first = gateway.stream_complete("a")
+    next(first)
+
+    with pytest.raises(LLMUnavailable):
+        next(gateway.stream_complete("b"))
+
+    first.close()
+    assert [chunk.delta for chunk in gateway.stream_complete("c")] == ["0", "1", "2"]
+
+
+def test_stream_deadline_covers_the_whole_stream():
+    gateway = LLMGateway(SlowStreamBackend(chunks=10, delay=0.05))
+
+    with pytest.raises(LLMTimeout):
+        list(gateway.stream_complete("a", timeout=0.2))
+    assert gateway.get_stats()["timeouts"] == 1
+
+
+class SlowOpenBackend:
+    """Blocks in stream_complete() itself, like a client waiting for the first token."""
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.streams = []
+
+    def stream_complete(self, prompt):
+        time.sleep(self.delay)
+        stream = SlowStreamBackend(chunks=1).stream_complete(prompt)
+        self.streams.append(stream)
+        return stream
+
+
+def test_opening_a_stream_is_bound_by_the_deadline_and_the_breaker():
+    backend = SlowOpenBackend(delay=0.5)
+    gateway = LLMGateway(backend, max_concurrency=1, max_queue=0)
+
+    start = time.monotonic()
+    with pytest.raises(LLMTimeout):
+        next(gateway.stream_complete("a", timeout=0.1))
+    assert time.monotonic() - start < 0.4
+    assert gateway.breaker.failures == 1
+    assert gateway.get_stats()["timeouts"] == 1
+
+    # The slot comes back, and the late stream is closed, once the open finishes
+    time.sleep(0.6)
+    assert backend.streams[0].gi_frame is None
+    assert [chunk.delta for chunk in gateway.stream_complete("b", timeout=5)] == ["0"]
+
+
+def test_stream_open_errors_count_as_failures():
+    class FailingBackend:
+        def stream_complete(self, prompt):
+            raise ConnectionError("upstream down")
+
+    gateway = LLMGateway(FailingBackend())
+
+    with pytest.raises(ConnectionError):
+        next(gateway.stream_complete("a"))
+    assert gateway.breaker.failures == 1
+    assert gateway.get_stats()["failures"] == 1
+
+
+def test_async_stream_deadline_and_slot():
+    gateway = LLMGateway(SlowStreamBackend(chunks=10, delay=0.05), max_async_concurrency=1)
+
+    async def run():
+        with pytest.raises(LLMTimeout):
+            async for _ in gateway.astream_complete("a", timeout=0.2):
+                pass
+        # The timed-out stream gave its only slot back
+        return [chunk.delta async for chunk in gateway.astream_complete("b", timeout=5)]
+
+    assert asyncio.run(run()) == [str(number) for number in range(10)]
+
+
+def test_async_complete():
+    gateway = LLMGateway(StubBackend())
+
+    response = asyncio.run(gateway.acomplete("**USER QUESTION:** budget"))
+
+    assert "budget" in response.text
+
+
+def build_prompt(text):
+    return f"Invoice Text:\n{text}"
+
+
+def build_batch_prompt(invoices):
+    return "JSON array\n" + "\n".join(f"Invoice ID: {invoice_id}\nInvoice Text:\n{text}" for invoice_id, text in invoices)
+
+
+class BatchBackend(StubBackend):
+    """Stub whose batched answers can be shuffled or given wrong ids."""
+
+    def __init__(self, mangle=None, latency=0.0):
+        super().__init__(latency)
+        self.mangle = mangle
+        self.prompts = []
+        self._lock = threading.Lock()
+
+    def complete(self, prompt):
+        with self._lock:
+            self.prompts.append(prompt)
+        response = super().complete(prompt)
+        if self.mangle and "JSON array" in prompt:
+            return TextResponse(json.dumps(self.mangle(json.loads(response.text))))
+        return response
+
+
+def extract_all(batcher, texts):
+    with ThreadPoolExecutor(len(texts)) as pool:
+        return list(pool.map(lambda text: json.loads(batcher.extract(text, timeout=2)), texts))
+
+
+TEXTS = [f"Shop {number}\nTotal {number}0" for number in range(1, 5)]
+
+
+def test_batch_results_are_matched_by_id():
+    backend = BatchBackend(mangle=lambda results: list(reversed(results)))
+    batcher = ExtractionBatcher(LLMGateway(backend), build_prompt, build_batch_prompt, max_batch=4, window=1)
+
+    results = extract_all(batcher, TEXTS)
+
+    assert [result["store_name"] for result in results] == ["Shop 1", "Shop 2", "Shop 3", "Shop 4"]
+    assert len(backend.prompts) == 1
+
+
+def test_batch_with_mismatched_ids_is_rejected_and_retried_in_parallel():
+    def drop_ids(results):
+        for result in results:
+            result["invoice_id"] = "?"
+        return results
+
+    backend = BatchBackend(mangle=drop_ids, latency=0.2)
+    batcher = ExtractionBatcher(LLMGateway(backend), build_prompt, build_batch_prompt, max_batch=4, window=1)
+
+    start = time.monotonic()
+    results = extract_all(batcher, TEXTS)
+
+    assert [result["total_amount"] for result in results] == [10.0, 20.0, 30.0, 40.0]
+    assert len(backend.prompts) == 5
+    # One batched call, then the four single calls side by side
+    assert time.monotonic() - start < 0.2 * 3
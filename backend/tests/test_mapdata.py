@@ -0,0 +1,82 @@
+from datetime import datetime
+
+import mongomock
+import pytest
+
+from mapdata import bbox_polygons, find_page, find_points, parse_bbox, parse_cursor
+
+
+@pytest.fixture
+def expenses():
+    collection = mongomock.MongoClient().expense_tracker.expenses
+    location = {"lat": 12.97, "lon": 77.59}
+    collection.insert_many([
+        {"user_id": "u1", "store_name": "a", "created_at": datetime(2024, 5, 1), "location": location},
+        {"user_id": "u1", "store_name": "b", "created_at": datetime(2024, 5, 3), "location": None},
+        {"user_id": "u1", "store_name": "c", "created_at": datetime(2024, 5, 3), "location": location},
+        {"user_id": "u1", "store_name": "d", "created_at": datetime(2024, 5, 3), "location": {}},
+        {"user_id": "u1", "store_name": "e", "created_at": datetime(2024, 4, 1), "location": location},
+        {"user_id": "u1", "store_name": "f", "created_at": datetime(2024, 6, 1), "location": location},
+        {"user_id": "u1", "store_name": "g", "created_at": datetime(2024, 5, 3), "location": location},
+        {"user_id": "u2", "store_name": "x", "created_at": datetime(2024, 5, 2), "location": location},
+    ])
+    return collection
+
+
+def test_find_points_skips_missing_locations_newest_first(expenses):
+    names = [point["store_name"] for point in find_points(expenses, "u1")]
+
+    assert names == ["f", "g", "c", "a", "e"]
+
+
+@pytest.mark.parametrize("limit", [1, 2, 3, 5])
+def test_pages_cover_every_point_once(expenses, limit):
+    names, cursor = [], None
+    while True:
+        points, next_cursor = find_page(expenses, "u1", cursor=parse_cursor(cursor) if cursor else None, limit=limit)
+        names += [point["store_name"] for point in points]
+        if next_cursor is None:
+            break
+        assert len(points) == limit
+        cursor = next_cursor
+
+    assert names == ["f", "g", "c", "a", "e"]
+
+
+def test_page_with_undated_expenses(expenses):
+    expenses.insert_one({"user_id": "u1", "store_name": "old", "location": {"lat": 1, "lon": 2}})
+
+    points, cursor = find_page(expenses, "u1", limit=5)
+    rest, last = find_page(expenses, "u1", cursor=parse_cursor(cursor), limit=5)
+
+    assert [point["store_name"] for point in rest] == ["old"]
+    assert last is None
+
+
+@pytest.mark.parametrize("value", ["abc", "12:zzz", "x:5f0000000000000000000000", ""])
+def test_parse_cursor_rejects_garbage(value):
+    with pytest.raises(ValueError):
+        parse_cursor(value)
+
+
+def test_parse_bbox_rejects_zero_width():
+    with pytest.raises(ValueError):
+        parse_bbox("10,0,10,5")
+
+
+def test_bbox_crossing_antimeridian_is_split():
+    polygons = bbox_polygons(parse_bbox("170,-10,-170,10"))
+
+    lons = [[lon for lon, _ in polygon["coordinates"][0]] for polygon in polygons]
+    assert [(min(ring), max(ring)) for ring in lons] == [(170, 180), (-180, -170)]
+
+
+def test_wide_bbox_follows_parallels():
+    polygons = bbox_polygons((-180, -60, 180, 90))
+
+    assert len(polygons) == 4
+    for polygon in polygons:
+        ring = polygon["coordinates"][0]
+        assert ring[0] == ring[-1]
+        assert {lat for _, lat in ring} == {-60, 89.999}
+        assert max(abs(a[0] - b[0]) for a, b in zip(ring, ring[1:])) <= 1.0
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+
+import ocr
+from ocr import OCREngine, autocrop, binarize, deskew
+
+
+def text_lines(size=(400, 300), rows=range(40, 260, 30)):
+    """White page with dark horizontal bars standing in for lines of text."""
+    img = Image.new("L", size, 255)
+    draw = ImageDraw.Draw(img)
+    for top in rows:
+        draw.rectangle((40, top, size[0] - 40, top + 8), fill=0)
+    return img
+
+
+def row_profile_variance(img):
+    return float(np.var((255 - np.asarray(img, dtype=np.float64)).sum(axis=1)))
+
+
+def test_binarize_leaves_only_black_and_white():
+    gray = Image.fromarray(np.tile(np.arange(0, 256, dtype=np.uint8), (10, 1)))
+
+    assert set(np.unique(np.asarray(binarize(gray)))) == {0, 255}
+
+
+def test_autocrop_removes_a_blank_border():
+    img = Image.new("L", (300, 200), 255)
+    ImageDraw.Draw(img).rectangle((100, 50, 199, 149), fill=0)
+
+    assert autocrop(img, margin=10).size == (120, 120)
+    assert autocrop(Image.new("L", (50, 50), 255)).size == (50, 50)
+
+
+def test_deskew_straightens_a_skewed_page():
+    skewed = text_lines().rotate(3, expand=True, fillcolor=255)
+
+    straightened = deskew(skewed)
+
+    assert row_profile_variance(straightened) > 2 * row_profile_variance(skewed)
+    # A page that is already straight is returned untouched
+    assert deskew(text_lines()).size == text_lines().size
+
+
+@pytest.fixture
+def fake_tesseract(monkeypatch):
+    # Each "page" is just its (path, index) label; the pool workers are forked and inherit the patches
+    monkeypatch.setattr(ocr, "load_pages", lambda path: 3 if path.endswith(".pdf") else 1)
+    monkeypatch.setattr(ocr, "open_page", lambda path, page_index=0: f"{path}#{page_index}")
+    monkeypatch.setattr(ocr, "preprocess", lambda img, timings, target_dpi=300: img)
+    monkeypatch.setattr(ocr.pytesseract, "image_to_string", lambda img, config="": img)
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_multi_page_uploads_keep_page_order(fake_tesseract, workers):
+    engine = OCREngine(workers=workers)
+    timings = {}
+    try:
+        text = engine.extract(["a.pdf", "b.png"], timings)
+    finally:
+        engine.close()
+
+    assert text.split("\n\n") == ["a.pdf#0", "a.pdf#1", "a.pdf#2", "b.png#0"]
+    assert timings["pages"] == 4
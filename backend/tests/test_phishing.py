@@ -0,0 +1,39 @@
+import pytest
+
+from phishing_index import MmapPhishingIndex, build_index
+from spam import PhishingIndex, extract_links
+
+FEED = ["http://evil.example/", "https://sites.example.com/attacker/login", "www.scam.test"]
+
+
+@pytest.fixture(params=["memory", "mmap"])
+def index(request, tmp_path):
+    if request.param == "memory":
+        return PhishingIndex(FEED)
+    csv_path = tmp_path / "feed.csv"
+    csv_path.write_text("url\n" + "\n".join(FEED) + "\n", encoding="utf-8")
+    build_index(str(csv_path), str(tmp_path / "index.bin"))
+    return MmapPhishingIndex(str(tmp_path / "index.bin"))
+
+
+def test_bare_domain_entries_block_the_host_and_subdomains(index):
+    assert index.lookup_many([
+        "https://evil.example/anything", "http://login.evil.example", "scam.test/x"
+    ]) == [True, True, True]
+
+
+def test_url_entries_only_block_that_url(index):
+    assert index.lookup_many([
+        "https://sites.example.com/attacker/login/", "https://sites.example.com/someone-else", "sites.example.com"
+    ]) == [True, False, False]
+
+
+@pytest.mark.parametrize("message", ["meet at 3pm.Thanks", "see file.txt"])
+def test_dotted_words_are_not_links(message):
+    assert extract_links(message) == []
+
+
+def test_scheme_and_www_links_are_extracted():
+    assert extract_links("Claim at https://evil.example/win, or www.scam.test.") == [
+        "https://evil.example/win", "www.scam.test"
+    ]
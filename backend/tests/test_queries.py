@@ -0,0 +1,83 @@
+from datetime import datetime
+
+import mongomock
+import pytest
+
+from queries import ensure_indexes, summarize_expenses
+from rollups import category_sums, normalize_items
+
+
+@pytest.fixture
+def db():
+    return mongomock.MongoClient().expense_tracker
+
+
+def expense(user_id, created_at, total, items):
+    return {"user_id": user_id, "created_at": created_at, "total_amount": total, "items": items}
+
+
+def test_ensure_indexes_creates_route_indexes(db):
+    ensure_indexes(db)
+
+    expense_keys = [index["key"] for index in db.expenses.index_information().values()]
+    assert [("user_id", 1), ("created_at", -1), ("_id", -1)] in expense_keys
+    assert db.users.index_information()["email_1"]["unique"]
+    assert db.monthly_rollups.index_information()["user_id_1_month_-1"]
+
+
+def test_ensure_indexes_dedupes_gst_details_keeping_newest(db):
+    db.gst_details.insert_many([
+        {"gst_number": "27AAACT2727Q1ZW", "business_name": "old", "updated_at": datetime(2024, 1, 1)},
+        {"gst_number": "27AAACT2727Q1ZW", "business_name": "new", "updated_at": datetime(2024, 6, 1)},
+        {"gst_number": "29AAACT2727Q1ZV", "business_name": "only"},
+    ])
+
+    ensure_indexes(db)
+
+    assert db.gst_details.index_information()["gst_number_1"]["unique"]
+    assert db.gst_details.count_documents({}) == 2
+    assert db.gst_details.find_one({"gst_number": "27AAACT2727Q1ZW"})["business_name"] == "new"
+
+
+def test_ensure_indexes_never_deletes_duplicate_users(db):
+    db.users.insert_many([{"email": "a@example.com"}, {"email": "a@example.com"}])
+
+    ensure_indexes(db)
+
+    assert db.users.count_documents({}) == 2
+    assert "email_1" not in db.users.index_information()
+
+
+def test_summarize_expenses_groups_by_user_and_month(db):
+    db.expenses.insert_many([
+        expense("u1", datetime(2024, 5, 3), 150.0, [{"category": "Food", "price": 100}, {"category": "Fuel", "price": 50}]),
+        expense("u1", datetime(2024, 5, 20), 40.0, [{"category": "Food", "price": 40}]),
+        expense("u1", datetime(2024, 6, 1), 10.0, [{"price": 10}]),
+        expense("u2", datetime(2024, 5, 9), 99.0, [{"category": "Food", "price": None}]),
+    ])
+
+    summaries = summarize_expenses(db.expenses, {"created_at": {"$type": "date"}})
+
+    assert summaries[("u1", "2024-05")] == {
+        "total_spent": 190.0, "expense_count": 2, "categories": {"Food": 140, "Fuel": 50}
+    }
+    assert summaries[("u1", "2024-06")]["categories"] == {"Other": 10}
+    assert summaries[("u2", "2024-05")]["categories"] == {"Food": 0}
+
+
+def test_summarize_expenses_applies_match(db):
+    db.expenses.insert_many([
+        expense("u1", datetime(2024, 5, 3), 10.0, []),
+        expense("u2", datetime(2024, 5, 3), 20.0, []),
+    ])
+
+    assert list(summarize_expenses(db.expenses, {"user_id": "u2"})) == [("u2", "2024-05")]
+
+
+def test_summarize_expenses_matches_rollup_for_normalized_items(db):
+    items = normalize_items([{"category": "Food", "price": "50"}, {"category": "Food", "price": "bad"}])
+    db.expenses.insert_one(expense("u1", datetime(2024, 5, 3), 50.0, items))
+
+    summary = summarize_expenses(db.expenses, {})[("u1", "2024-05")]
+
+    assert summary["categories"] == category_sums({"items": items}) == {"Food": 50.0}
@@ -0,0 +1,100 @@
+import importlib
+import os
+import runpy
+import sys
+
+import flask
+import pytest
+
+import resources
+from resources import Resource, preload
+
+
+class Counter:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return object()
+
+
+@pytest.fixture
+def pid(monkeypatch):
+    current = {"pid": 100}
+    monkeypatch.setattr(resources.os, "getpid", lambda: current["pid"])
+    return current
+
+
+def test_resource_is_built_once_per_process(pid):
+    factory = Counter()
+    resource = Resource("client", factory)
+
+    first = resource.get()
+    assert resource.get() is first
+    assert factory.calls == 1
+
+    pid["pid"] = 101
+    assert not resource.loaded
+    assert resource.get() is not first
+    assert factory.calls == 2
+
+
+def test_fork_safe_resources_are_inherited(pid):
+    factory = Counter()
+    resource = Resource("model", factory, fork_safe=True)
+    preload([resource], hooks=[])
+    value = resource.get()
+
+    pid["pid"] = 101
+    assert resource.get() is value
+    assert factory.calls == 1
+    assert resource.stats()["inherited"]
+
+
+def test_preload_rejects_per_process_resources():
+    with pytest.raises(ValueError):
+        preload([Resource("mongo", Counter())])
+
+
+@pytest.fixture
+def flask_apps(monkeypatch, tmp_path):
+    """Records every Flask app constructed while the fixture is active."""
+    monkeypatch.setenv("LLM_BACKEND", "stub")
+    monkeypatch.chdir(tmp_path)
+    built = []
+    init = flask.Flask.__init__
+
+    def recording_init(self, *args, **kwargs):
+        init(self, *args, **kwargs)
+        built.append(self)
+
+    monkeypatch.setattr(flask.Flask, "__init__", recording_init)
+    return built
+
+
+def test_importing_app_builds_no_app(flask_apps):
+    import app
+
+    importlib.reload(app)
+
+    assert flask_apps == []
+    assert not hasattr(app, "app")
+
+
+def test_asgi_builds_the_flask_app_once(flask_apps):
+    sys.modules.pop("asgi", None)
+    try:
+        asgi = importlib.import_module("asgi")
+    finally:
+        sys.modules.pop("asgi", None)
+
+    assert flask_apps == [asgi.flask_app]
+
+
+def test_running_app_py_builds_one_app(flask_apps, monkeypatch):
+    monkeypatch.setattr(flask.Flask, "run", lambda self, **kwargs: None)
+
+    runpy.run_path(os.path.join(os.path.dirname(resources.__file__), "app.py"), run_name="__main__")
+
+    assert len(flask_apps) == 1
@@ -0,0 +1,58 @@
+from datetime import datetime
+
+import mongomock
+import pytest
+
+from rollups import apply_expense, get_rollup, rebuild
+
+
+@pytest.fixture
+def db():
+    return mongomock.MongoClient().expense_tracker
+
+
+EXPENSES = [
+    {"user_id": "u1", "store_name": "Bakery", "total_amount": 120.0, "created_at": datetime(2024, 5, 2),
+     "items": [{"name": "bread", "price": 70.0, "category": "Food"},
+               {"name": "soap", "price": 50.0, "category": "Home.Care"}]},
+    {"user_id": "u1", "store_name": "Grocer", "total_amount": 80.5, "created_at": datetime(2024, 5, 20),
+     "items": [{"name": "milk", "price": 80.5, "category": "Food"}]},
+    {"user_id": "u1", "store_name": "Cafe", "total_amount": 40.0, "created_at": datetime(2024, 6, 1),
+     "items": [{"name": "coffee", "price": 40.0, "category": "Food"}]},
+]
+
+
+def insert(db, expenses):
+    for expense in expenses:
+        db.expenses.insert_one(dict(expense))
+        apply_expense(db.monthly_rollups, expense)
+
+
+def test_expenses_in_one_month_accumulate_in_one_rollup(db):
+    insert(db, EXPENSES[:2])
+
+    assert db.monthly_rollups.count_documents({}) == 1
+    rollup = get_rollup(db.monthly_rollups, "u1", datetime(2024, 5, 31))
+    assert rollup["total_spent"] == 200.5
+    assert rollup["expense_count"] == 2
+    # Category names with "." survive the field-name encoding
+    assert rollup["categories"] == {"Food": 150.5, "Home.Care": 50.0}
+    assert rollup["recent_stores"] == ["Bakery", "Grocer"]
+
+
+def test_months_without_expenses_read_as_empty(db):
+    insert(db, EXPENSES[:1])
+
+    assert get_rollup(db.monthly_rollups, "u1", datetime(2024, 4, 1))["expense_count"] == 0
+    assert get_rollup(db.monthly_rollups, "u2", datetime(2024, 5, 1))["total_spent"] == 0
+
+
+def test_incremental_rollups_match_a_rebuild_from_raw_expenses(db):
+    insert(db, EXPENSES)
+
+    rebuild(db.expenses, db.rebuilt_rollups)
+
+    for when in (datetime(2024, 5, 1), datetime(2024, 6, 1)):
+        incremental = get_rollup(db.monthly_rollups, "u1", when)
+        recomputed = get_rollup(db.rebuilt_rollups, "u1", when)
+        assert incremental == recomputed
@@ -0,0 +1,121 @@
+import asyncio
+import json
+
+import pytest
+
+from streaming import astream_completion, stream_completion
+
+
+class Chunk:
+    def __init__(self, delta):
+        self.delta = delta
+
+
+class FakeLLM:
+    """Yields the given deltas, then raises `error` if set."""
+
+    def __init__(self, deltas, error=None):
+        self.deltas = deltas
+        self.error = error
+        self.closed = False
+
+    def stream_complete(self, prompt):
+        try:
+            for delta in self.deltas:
+                yield Chunk(delta)
+            if self.error:
+                raise self.error
+        finally:
+            self.closed = True
+
+    async def astream_complete(self, prompt):
+        try:
+            for delta in self.deltas:
+                yield Chunk(delta)
+            if self.error:
+                raise self.error
+        finally:
+            self.closed = True
+
+
+def parse_sse(events):
+    parsed = []
+    for event in events:
+        name, data = event.rstrip("\n").split("\n")
+        assert name.startswith("event: ") and data.startswith("data: ")
+        parsed.append((name[len("event: "):], json.loads(data[len("data: "):])))
+    return parsed
+
+
+def parse_ndjson(events):
+    parsed = []
+    for line in events:
+        data = json.loads(line)
+        parsed.append((data.pop("event"), data))
+    return parsed
+
+
+async def collect(generator):
+    return [event async for event in generator]
+
+
+def run_stream(llm, fmt, asynchronous):
+    if asynchronous:
+        return asyncio.run(collect(astream_completion(llm, "prompt", fmt)))
+    return list(stream_completion(llm, "prompt", fmt))
+
+
+@pytest.mark.parametrize("asynchronous", [False, True])
+def test_sse_tokens_then_done(asynchronous):
+    llm = FakeLLM(["Hello", "", " world"])
+
+    events = parse_sse(run_stream(llm, "sse", asynchronous))
+
+    assert events[:2] == [("token", {"token": "Hello"}), ("token", {"token": " world"})]
+    name, done = events[2]
+    assert name == "done" and len(events) == 3
+    assert done["response"] == "Hello world"
+    assert done["stats"]["tokens"] == 2
+    assert done["stats"]["time_to_first_token_ms"] is not None
+    assert llm.closed
+
+
+@pytest.mark.parametrize("asynchronous", [False, True])
+def test_ndjson_uses_the_same_events(asynchronous):
+    events = parse_ndjson(run_stream(FakeLLM(["a", "b"]), "ndjson", asynchronous))
+
+    assert [name for name, _ in events] == ["token", "token", "done"]
+    assert events[-1][1]["response"] == "ab"
+
+
+@pytest.mark.parametrize("asynchronous", [False, True])
+def test_upstream_error_ends_with_error_event(asynchronous):
+    llm = FakeLLM(["partial"], error=RuntimeError("upstream went away"))
+
+    events = parse_sse(run_stream(llm, "sse", asynchronous))
+
+    assert events == [
+        ("token", {"token": "partial"}),
+        ("error", {"error": "Failed to get response from assistant"})
+    ]
+    assert llm.closed
+
+
+def test_error_before_first_token():
+    class FailingLLM:
+        def stream_complete(self, prompt):
+            raise RuntimeError("no connection")
+
+    assert parse_sse(stream_completion(FailingLLM(), "prompt")) == [
+        ("error", {"error": "Failed to get response from assistant"})
+    ]
+
+
+def test_client_disconnect_closes_upstream():
+    llm = FakeLLM(["a", "b", "c"])
+    stream = stream_completion(llm, "prompt")
+
+    next(stream)
+    stream.close()
+
+    assert llm.closed
@@ -0,0 +1,16 @@
+import os
+
+from spam import latest_model_version
+from train_spam import CLASSES, make_classifier, make_vectorizer, save_version
+
+
+def test_versions_saved_in_the_same_second_do_not_collide(tmp_path):
+    vectorizer = make_vectorizer(hash_bits=8)
+    classifier = make_classifier("nb")
+    classifier.partial_fit(vectorizer.transform(["win a prize", "lunch at 1"]), ["spam", "ham"], classes=CLASSES)
+
+    versions = [save_version(str(tmp_path), vectorizer, classifier, {}) for _ in range(3)]
+
+    assert len(set(versions)) == 3
+    assert latest_model_version(str(tmp_path)) == versions[-1]
+    assert sorted(name for name in os.listdir(tmp_path) if not name.startswith(".") and name != "LATEST") == sorted(versions)
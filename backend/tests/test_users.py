@@ -0,0 +1,106 @@
+import asyncio
+
+import mongomock
+import pytest
+
+from users import HasherBusy, PasswordHasher, UserCache
+
+METHOD = "pbkdf2:sha256:1000"
+
+
+@pytest.fixture
+def client(backend, monkeypatch):
+    # A cheap hash keeps the tests fast; the pool and its bound are the real ones
+    monkeypatch.setattr(backend.password_hasher, "method", METHOD)
+    return backend.create_app().test_client()
+
+
+def signup(client, email="a@example.com", password="secret"):
+    return client.post("/api/signup", json={"email": email, "password": password})
+
+
+def auth(response):
+    return {"Authorization": "Bearer " + response.get_json()["access_token"]}
+
+
+def test_signup_and_login_hash_through_the_pool(backend, client):
+    assert signup(client).status_code == 200
+    stored = backend.users_collection.find_one({"email": "a@example.com"})["password"]
+    assert stored.startswith(METHOD + "$")
+
+    assert client.post("/api/login", json={"email": "a@example.com", "password": "secret"}).status_code == 200
+    assert client.post("/api/login", json={"email": "a@example.com", "password": "wrong"}).status_code == 401
+    assert signup(client).status_code == 400
+    assert backend.password_hasher._pending == 0
+
+
+def test_a_full_hashing_backlog_answers_503(backend, client, monkeypatch):
+    monkeypatch.setattr(backend.password_hasher, "max_pending", 0)
+
+    response = signup(client)
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "2"
+
+
+def test_login_upgrades_hashes_made_with_an_older_method(backend, client, monkeypatch):
+    signup(client)
+    monkeypatch.setattr(backend.password_hasher, "method", "pbkdf2:sha256:2000")
+
+    assert client.post("/api/login", json={"email": "a@example.com", "password": "secret"}).status_code == 200
+
+    stored = backend.users_collection.find_one({"email": "a@example.com"})["password"]
+    assert stored.startswith("pbkdf2:sha256:2000$")
+
+
+def test_profile_update_invalidates_the_cached_user(client):
+    headers = auth(signup(client))
+    assert client.get("/api/user", headers=headers).get_json()["name"] is None
+
+    profile = {"name": "Asha", "age": 30, "income": 50000}
+    assert client.post("/api/profile", json=profile, headers=headers).status_code == 200
+
+    user = client.get("/api/user", headers=headers).get_json()
+    assert (user["name"], user["income"], user["profile_completed"]) == ("Asha", 50000.0, True)
+
+
+def test_async_hash_and_verify_await_the_pool():
+    hasher = PasswordHasher(method=METHOD)
+
+    async def roundtrip():
+        hashed = await hasher.ahash("secret")
+        return await hasher.averify(hashed, "secret"), await hasher.averify(hashed, "wrong")
+
+    assert asyncio.run(roundtrip()) == (True, False)
+
+
+def test_hasher_rejects_work_beyond_its_backlog():
+    with pytest.raises(HasherBusy):
+        PasswordHasher(method=METHOD, max_pending=0).hash("secret")
+
+
+class CountingCollection:
+    def __init__(self, collection):
+        self.collection = collection
+        self.reads = 0
+
+    def find_one(self, *args, **kwargs):
+        self.reads += 1
+        return self.collection.find_one(*args, **kwargs)
+
+
+def test_user_cache_serves_hits_and_reloads_after_invalidate():
+    users = mongomock.MongoClient().expense_tracker.users
+    users.insert_one({"_id": "u1", "email": "a@example.com", "password": "hash", "name": "old"})
+    collection = CountingCollection(users)
+    cache = UserCache(collection)
+
+    assert cache.get("u1") == {"_id": "u1", "email": "a@example.com", "name": "old"}
+    cache.get("u1")
+    assert collection.reads == 1
+
+    users.update_one({"_id": "u1"}, {"$set": {"name": "new"}})
+    cache.invalidate("u1")
+
+    assert cache.get("u1")["name"] == "new"
+    assert collection.reads == 2
@@ -0,0 +1,266 @@
+# Out-of-core training for the spam classifier.
+# Labeled messages are streamed from CSV or JSONL files (optionally gzipped) in
+# fixed-size chunks, hashed into a fixed feature space by a stateless
+# HashingVectorizer and fed to the classifier's partial_fit, so memory stays
+# flat however large the corpus is and a model can be updated with new data
+# (--resume) without revisiting the old. A stable hash of each message decides
+# whether it is held out, so evaluation rows are never trained on, even across
+# resumed runs.
+#
+# Each run writes a new version directory under --out and then points LATEST
+# at it:
+#   model.joblib           vectorizer + prediction-only classifier (float32),
+#                          uncompressed so spam.load_spam_model can mmap it
+#   training_state.joblib  the full classifier for --resume, compressed
+#   meta.json              hashing parameters, row counts, throughput, metrics
+#
+# Usage: python train_spam.py messages.csv [more.jsonl.gz ...] [--text-column text] [--label-column label]
+#        [--classifier nb|sgd] [--chunk-size 50000] [--holdout 5] [--resume latest] [--out spam_models]
+import argparse
+import copy
+import csv
+import gzip
+import itertools
+import json
+import os
+import secrets
+import sys
+import time
+import zlib
+from datetime import datetime
+
+import joblib
+import numpy as np
+import sklearn
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.linear_model import SGDClassifier
+from sklearn.naive_bayes import MultinomialNB
+from sklearn.pipeline import Pipeline
+
+from spam import LATEST_FILE, MODEL_FILE, SPAM_MODEL_DIR, latest_model_version
+
+CLASSES = np.array(["ham", "spam"])
+STATE_FILE = "training_state.joblib"
+META_FILE = "meta.json"
+# Label spellings found in public SMS corpora; anything else is skipped
+LABELS = {
+    "spam": "spam", "scam": "spam", "1": "spam", "true": "spam",
+    "ham": "ham", "safe": "ham", "0": "ham", "false": "ham",
+}
+
+
+def make_vectorizer(hash_bits=20, ngram_max=2):
+    # alternate_sign=False keeps counts non-negative, which MultinomialNB requires
+    return HashingVectorizer(
+        n_features=2 ** hash_bits, ngram_range=(1, ngram_max), alternate_sign=False, norm=None, dtype=np.float32
+    )
+
+
+def make_classifier(kind):
+    if kind == "sgd":
+        return SGDClassifier(loss="log_loss", alpha=1e-6, random_state=0)
+    return MultinomialNB(alpha=0.1)
+
+
+def iter_messages(paths, text_column="text", label_column="label", counters=None):
+    """Yield (text, label) from CSV/JSONL files; rows without text or a known label are counted and skipped."""
+    counters = counters if counters is not None else {}
+    csv.field_size_limit(sys.maxsize)
+    for path in paths:
+        opener = gzip.open if path.endswith(".gz") else open
+        jsonl = path.removesuffix(".gz").endswith((".jsonl", ".ndjson"))
+        with opener(path, "rt", encoding="utf-8", newline="") as f:
+            rows = (json.loads(line) for line in f if line.strip()) if jsonl else csv.DictReader(f)
+            for row in rows:
+                text = row.get(text_column)
+                label = LABELS.get(str(row.get(label_column, "")).strip().lower())
+                if not text or label is None:
+                    counters["skipped"] = counters.get("skipped", 0) + 1
+                    continue
+                yield text, label
+
+
+def is_held_out(text, percent):
+    return zlib.crc32(text.encode("utf-8")) % 100 < percent
+
+
+def evaluate(model, texts, labels, batch_size=50000):
+    """Accuracy and spam precision/recall/F1 on the held-out rows."""
+    if not texts:
+        return None
+    predicted = np.concatenate([model.predict(texts[i:i + batch_size]) for i in range(0, len(texts), batch_size)])
+    actual = np.array(labels)
+    true_positive = int(np.sum((predicted == "spam") & (actual == "spam")))
+    predicted_spam = int(np.sum(predicted == "spam"))
+    actual_spam = int(np.sum(actual == "spam"))
+    precision = true_positive / predicted_spam if predicted_spam else 0.0
+    recall = true_positive / actual_spam if actual_spam else 0.0
+    return {
+        "rows": len(texts),
+        "spam_rows": actual_spam,
+        "accuracy": round(float(np.mean(predicted == actual)), 4),
+        "precision": round(precision, 4),
+        "recall": round(recall, 4),
+        "f1": round(2 * precision * recall / (precision + recall), 4) if precision + recall else 0.0
+    }
+
+
+def serving_classifier(classifier):
+    """Copy of the classifier with only what predict() reads, as float32 (half the size to map)."""
+    slim = copy.copy(classifier)
+    if isinstance(classifier, MultinomialNB):
+        del slim.feature_count_
+        slim.feature_log_prob_ = classifier.feature_log_prob_.astype(np.float32)
+    else:
+        slim.coef_ = classifier.coef_.astype(np.float32)
+    return slim
+
+
+def load_state(model_dir, version):
+    path = os.path.join(model_dir, version)
+    with open(os.path.join(path, META_FILE), encoding="utf-8") as f:
+        meta = json.load(f)
+    return joblib.load(os.path.join(path, STATE_FILE)), meta
+
+
+def save_version(model_dir, vectorizer, classifier, meta):
+    """Write a new version directory, then switch LATEST to it; returns the version."""
+    # Sortable by time; the random suffix keeps runs started in the same second apart
+    version = f"{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}-{secrets.token_hex(3)}"
+    final = os.path.join(model_dir, version)
+    staging = os.path.join(model_dir, f".{version}.tmp")
+    os.makedirs(staging)
+
+    model = Pipeline([("hashing", vectorizer), ("classifier", serving_classifier(classifier))])
+    joblib.dump(model, os.path.join(staging, MODEL_FILE))
+    joblib.dump(classifier, os.path.join(staging, STATE_FILE), compress=3)
+    with open(os.path.join(staging, META_FILE), "w", encoding="utf-8") as f:
+        json.dump({**meta, "version": version}, f, indent=2)
+    # Never replaces another run's directory: fails instead of merging into it
+    os.rename(staging, final)
+
+    # Readers either see the old version or the new one, never a partial directory
+    pointer = os.path.join(model_dir, f".{LATEST_FILE}.tmp")
+    with open(pointer, "w", encoding="utf-8") as f:
+        f.write(version + "\n")
+    os.replace(pointer, os.path.join(model_dir, LATEST_FILE))
+    return version
+
+
+def train(paths, model_dir=SPAM_MODEL_DIR, text_column="text", label_column="label", classifier_kind="nb",
+          chunk_size=50000, holdout_percent=5, holdout_max=200000, hash_bits=20, ngram_max=2, resume=None):
+    """Stream `paths` through partial_fit and save a new model version; returns its meta."""
+    parent = None
+    if resume:
+        parent = latest_model_version(model_dir) if resume == "latest" else resume
+        if not parent:
+            raise SystemExit(f"No model to resume in {model_dir}")
+        classifier, parent_meta = load_state(model_dir, parent)
+        # The hashing space must match the one the classifier was trained in
+        hash_bits, ngram_max = parent_meta["hash_bits"], parent_meta["ngram_max"]
+        classifier_kind = parent_meta["classifier"]
+        total_trained = parent_meta["trained_rows"]
+    else:
+        classifier = make_classifier(classifier_kind)
+        total_trained = 0
+    vectorizer = make_vectorizer(hash_bits, ngram_max)
+
+    counters = {"skipped": 0}
+    holdout_texts, holdout_labels = [], []
+    holdout_seen = trained = 0
+    vectorize_seconds = fit_seconds = 0.0
+    start = time.perf_counter()
+    messages = iter_messages(paths, text_column, label_column, counters)
+    for number in itertools.count(1):
+        chunk = list(itertools.islice(messages, chunk_size))
+        if not chunk:
+            break
+        texts, labels = [], []
+        for text, label in chunk:
+            if is_held_out(text, holdout_percent):
+                holdout_seen += 1
+                if len(holdout_texts) < holdout_max:
+                    holdout_texts.append(text)
+                    holdout_labels.append(label)
+            else:
+                texts.append(text)
+                labels.append(label)
+        if not texts:
+            continue
+
+        t0 = time.perf_counter()
+        features = vectorizer.transform(texts)
+        t1 = time.perf_counter()
+        classifier.partial_fit(features, labels, classes=CLASSES)
+        vectorize_seconds += t1 - t0
+        fit_seconds += time.perf_counter() - t1
+        trained += len(texts)
+
+        elapsed = time.perf_counter() - start
+        print(f"chunk {number}: {trained} trained, {holdout_seen} held out, {trained / elapsed:,.0f} rows/s")
+
+    if not trained:
+        raise SystemExit("No labeled rows to train on")
+    train_seconds = time.perf_counter() - start
+
+    model = Pipeline([("hashing", vectorizer), ("classifier", classifier)])
+    t0 = time.perf_counter()
+    metrics = evaluate(model, holdout_texts, holdout_labels)
+    eval_seconds = time.perf_counter() - t0
+
+    meta = {
+        "created_at": datetime.utcnow().isoformat(),
+        "parent": parent,
+        "classifier": classifier_kind,
+        "hash_bits": hash_bits,
+        "ngram_max": ngram_max,
+        "sklearn_version": sklearn.__version__,
+        "sources": [os.path.abspath(path) for path in paths],
+        "trained_rows": total_trained + trained,
+        "run": {
+            "trained_rows": trained,
+            "held_out_rows": holdout_seen,
+            "skipped_rows": counters["skipped"],
+            "seconds": round(train_seconds, 2),
+            "rows_per_second": round((trained + holdout_seen) / train_seconds),
+            "vectorize_seconds": round(vectorize_seconds, 2),
+            "fit_seconds": round(fit_seconds, 2),
+            "eval_seconds": round(eval_seconds, 2)
+        },
+        "holdout": metrics
+    }
+    os.makedirs(model_dir, exist_ok=True)
+    meta["version"] = save_version(model_dir, vectorizer, classifier, meta)
+    return meta
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the spam classifier incrementally from CSV/JSONL")
+    parser.add_argument("paths", nargs="+", help="CSV or JSONL files, optionally .gz")
+    parser.add_argument("--text-column", default="text")
+    parser.add_argument("--label-column", default="label", help="spam/ham (also 1/0, scam/safe)")
+    parser.add_argument("--classifier", choices=["nb", "sgd"], default="nb",
+                        help="MultinomialNB or logistic regression by SGD")
+    parser.add_argument("--chunk-size", type=int, default=50000)
+    parser.add_argument("--holdout", type=int, default=5, help="Percent of messages held out for evaluation")
+    parser.add_argument("--holdout-max", type=int, default=200000, help="Cap on held-out rows kept in memory")
+    parser.add_argument("--hash-bits", type=int, default=20, help="Feature space of 2**bits hashed n-grams")
+    parser.add_argument("--ngram-max", type=int, default=2)
+    parser.add_argument("--resume", help="Continue training from a version ('latest' for the current one)")
+    parser.add_argument("--out", default=SPAM_MODEL_DIR, help="Model directory (SPAM_MODEL_DIR)")
+    args = parser.parse_args()
+
+    meta = train(
+        args.paths, args.out, args.text_column, args.label_column, args.classifier, args.chunk_size,
+        args.holdout, args.holdout_max, args.hash_bits, args.ngram_max, args.resume
+    )
+    run = meta["run"]
+    print(f"Trained {run['trained_rows']} rows in {run['seconds']}s ({run['rows_per_second']:,} rows/s; "
+          f"vectorize {run['vectorize_seconds']}s, fit {run['fit_seconds']}s), skipped {run['skipped_rows']}")
+    if meta["holdout"]:
+        print("Held out: " + ", ".join(f"{key} {value}" for key, value in meta["holdout"].items()))
+    print(f"Saved version {meta['version']} to {args.out} (total {meta['trained_rows']} rows)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+# User accounts: a bounded per-process profile cache and password hashing off
+# the request thread.
+# Profiles are read on most authenticated requests but change rarely, so they
+# are kept in a small LRU, invalidated on profile writes and bounded in
+# staleness by a TTL (writes handled by other workers). Password hashing is
+# deliberately slow, so it runs on a small dedicated pool with a bounded
+# backlog; a login storm queues there instead of starving every other route.
+# hash()/verify() still block the calling Flask thread until the pool is done;
+# the async server awaits ahash()/averify() and holds no thread meanwhile.
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+# Never cached, never sent to the frontend
+PROFILE_FIELDS = {"password": 0}
+
+
+class UserCache:
+    def __init__(self, collection, ttl=60, max_entries=10000):
+        self.collection = collection
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        """Return the user's profile (without the password hash) or None; treat it as read-only."""
+        version, user = self._lookup(user_id)
+        if user is not None:
+            return user
+        user = self.collection.find_one({"_id": user_id}, PROFILE_FIELDS)
+        self._store(user_id, version, user)
+        return user
+
+    async def aget(self, user_id, fetch):
+        """Like get(), with a coroutine `fetch(user_id)` for the async server."""
+        version, user = self._lookup(user_id)
+        if user is not None:
+            return user
+        user = await fetch(user_id)
+        self._store(user_id, version, user)
+        return user
+
+    def put(self, user):
+        user = {key: value for key, value in user.items() if key != "password"}
+        with self._lock:
+            self._remember(user["_id"], user)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+            self._entries.pop(user_id, None)
+
+    def _lookup(self, user_id):
+        with self._lock:
+            version = self._versions.get(user_id, 0)
+            entry = self._entries.get(user_id)
+            if entry and time.monotonic() - entry[1] < self.ttl:
+                self._entries.move_to_end(user_id)
+                return version, entry[0]
+            return version, None
+
+    def _store(self, user_id, version, user):
+        # Unknown users are not cached, and neither is a read that raced with an invalidation
+        if user is None:
+            return
+        with self._lock:
+            if self._versions.get(user_id, 0) == version:
+                self._remember(user_id, user)
+
+    def _remember(self, user_id, user):
+        self._entries[user_id] = (user, time.monotonic())
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+class HasherBusy(Exception):
+    pass
+
+
+class PasswordHasher:
+    """Hash and verify passwords on a bounded pool.
+
+    `method` is werkzeug's hash spec (e.g. "scrypt:32768:8:1" or
+    "pbkdf2:sha256:600000"), so the cost can be tuned per deployment; stored
+    hashes carry their own parameters and keep verifying after a change.
+    """
+
+    def __init__(self, method=None, workers=2, max_pending=64):
+        self.method = method or os.getenv("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+        self.max_pending = max_pending
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password")
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def hash(self, password):
+        return self._submit(generate_password_hash, password, self.method).result()
+
+    def verify(self, password_hash, password):
+        return self._submit(check_password_hash, password_hash, password).result()
+
+    async def ahash(self, password):
+        return await asyncio.wrap_future(self._submit(generate_password_hash, password, self.method))
+
+    async def averify(self, password_hash, password):
+        return await asyncio.wrap_future(self._submit(check_password_hash, password_hash, password))
+
+    def needs_rehash(self, password_hash):
+        # werkzeug hashes are "<method>$<salt>$<hash>"
+        return password_hash.split("$", 1)[0] != self.method
+
+    def _submit(self, fn, *args):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise HasherBusy("Too many logins in progress, try again shortly")
+            self._pending += 1
+        future = self._pool.submit(fn, *args)
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, future):
+        with self._lock:
+            self._pending -= 1
@@ -13,8 +13,10 @@ interface ProcessedBill {
   gst_number?: string | null;
   captcha_data?: {
     captcha_image: string;
+    captcha_image_data?: string;
     captcha_cookie: string;
   };
+  gst_cached?: boolean;
   data: {
     gst_number: string | null;
     total_amount: number;
@@ -75,6 +77,7 @@ export default function BillScanner() {
         setProcessedBill({
           gst_number: data.data.gst_number,
           captcha_data: data.captcha_data,
+          gst_cached: data.gst_cached,
           data: data.data
         })
         toast({
@@ -97,7 +100,7 @@ export default function BillScanner() {
   }
 
   const validateGST = async () => {
-    if (!processedBill || !captcha || !processedBill.captcha_data) {
+    if (!processedBill || (!processedBill.gst_cached && (!captcha || !processedBill.captcha_data))) {
       toast({
         title: "Error",
         description: "Please enter the captcha",
@@ -118,7 +121,7 @@ export default function BillScanner() {
         body: JSON.stringify({
           gst_number: processedBill.gst_number,
           captcha: captcha,
-          captcha_cookie: processedBill.captcha_data.captcha_cookie,
+          captcha_cookie: processedBill.captcha_data?.captcha_cookie,
           ai_data: processedBill.data
         }),
       })
@@ -180,14 +183,16 @@ export default function BillScanner() {
       </Card>
 
       {/* GST Validation */}
-      {processedBill?.gst_number && processedBill.captcha_data && !validated && (
+      {processedBill?.gst_number && (processedBill.captcha_data || processedBill.gst_cached) && !validated && (
         <Card>
           <CardHeader>
             <CardTitle className="flex items-center">
               <CheckCircle className="w-5 h-5 mr-2" />
               GST Validation
             </CardTitle>
-            <CardDescription>Complete the captcha to validate the GST number</CardDescription>
+            <CardDescription>
+              {processedBill.gst_cached ? "This GST number is already verified" : "Complete the captcha to validate the GST number"}
+            </CardDescription>
           </CardHeader>
           <CardContent className="space-y-4">
             <div>
@@ -195,26 +200,31 @@ export default function BillScanner() {
               <p className="text-lg font-mono bg-gray-100 p-2 rounded">{processedBill.gst_number}</p>
             </div>
 
-            <div>
-              <Label>Enter Captcha</Label>
-              <div className="flex items-center space-x-4 mt-2">
-                <img
-                  src={`http://localhost:5000/uploads/${processedBill.captcha_data.captcha_image}`}
-                  alt="Captcha"
-                  className="border rounded w-32 h-10"
-                />
-                <Input
-                  type="text"
-                  value={captcha}
-                  onChange={(e) => setCaptcha(e.target.value)}
-                  placeholder="Enter captcha"
-                  className="max-w-32"
-                />
+            {processedBill.captcha_data && (
+              <div>
+                <Label>Enter Captcha</Label>
+                <div className="flex items-center space-x-4 mt-2">
+                  <img
+                    src={
+                      processedBill.captcha_data.captcha_image_data ||
+                      `http://localhost:5000/uploads/${processedBill.captcha_data.captcha_image}`
+                    }
+                    alt="Captcha"
+                    className="border rounded w-32 h-10"
+                  />
+                  <Input
+                    type="text"
+                    value={captcha}
+                    onChange={(e) => setCaptcha(e.target.value)}
+                    placeholder="Enter captcha"
+                    className="max-w-32"
+                  />
+                </div>
               </div>
-            </div>
+            )}
 
-            <Button onClick={validateGST} disabled={!captcha || validating} className="w-full">
-              {validating ? "Validating..." : "Validate GST & Save Expense"}
+            <Button onClick={validateGST} disabled={(!captcha && !processedBill.gst_cached) || validating} className="w-full">
+              {validating ? "Validating..." : processedBill.gst_cached ? "Save Expense" : "Validate GST & Save Expense"}
             </Button>
           </CardContent>
         </Card>